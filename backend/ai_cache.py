@@ -0,0 +1,211 @@
+"""
+Two-tier cache for AI-generated meal ideas
+
+Tier 1 is an in-process LRU (an OrderedDict behind a lock); tier 2 is the
+ai_response_cache table, which survives restarts and is shared by every
+worker using the same database. Both tiers honour a TTL and a maximum size.
+"""
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from models import db, AIResponseCacheEntry
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Only refresh last_accessed_at in the table when it is older than this,
+# so a popular key does not turn every cache hit into a write
+_TOUCH_INTERVAL = timedelta(minutes=1)
+
+# Prune the persistent tier every this many writes
+_PRUNE_EVERY = 50
+
+def normalize_prompt(prompt):
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return _WHITESPACE_RE.sub(' ', str(prompt)).strip().lower().rstrip('.!?').strip()
+
+def make_cache_key(prompt, count, model_name, generation_config):
+    """Hash the normalized prompt, count and generation settings into a cache key"""
+    payload = json.dumps({
+        'prompt': normalize_prompt(prompt),
+        'count': count,
+        'model': model_name,
+        'config': generation_config,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class AIResponseCache:
+    """
+    LRU + persistent cache of validated meal lists
+
+    Usage:
+        ai_cache = AIResponseCache()
+        ai_cache.init_app(app)
+
+        meals = ai_cache.get(key)
+        if meals is None:
+            meals = generate(...)
+            ai_cache.set(key, meals, prompt=prompt, count=count)
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.memory_entries = 256
+        self.persistent_entries = 10000
+        self.ttl = timedelta(hours=24)
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (expires_at, meals)
+        self._writes = 0
+        self._stats = {
+            'memory_hits': 0,
+            'persistent_hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'memory_evictions': 0,
+            'persistent_evictions': 0,
+        }
+
+    def init_app(self, app):
+        """Read cache limits from the app config"""
+        self.enabled = app.config.get('AI_CACHE_ENABLED', True)
+        self.memory_entries = app.config.get('AI_CACHE_MEMORY_ENTRIES', 256)
+        self.persistent_entries = app.config.get('AI_CACHE_PERSISTENT_ENTRIES', 10000)
+        self.ttl = timedelta(seconds=app.config.get('AI_CACHE_TTL_SECONDS', 24 * 3600))
+        self.clear_memory()
+
+    def _count(self, stat, amount=1):
+        with self._lock:
+            self._stats[stat] += amount
+
+    def _remember(self, key, expires_at, meals):
+        """Store an entry in the LRU tier, evicting the least recently used ones"""
+        with self._lock:
+            self._memory[key] = (expires_at, meals)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+                self._stats['memory_evictions'] += 1
+
+    def get(self, key):
+        """Return the cached meal list for key, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        now = datetime.utcnow()
+
+        # Tier 1: in-process LRU
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return entry[1]
+                del self._memory[key]
+
+        # Tier 2: persistent table
+        table = AIResponseCacheEntry.__table__
+        with db.engine.begin() as conn:
+            row = conn.execute(
+                db.select(table.c.response, table.c.expires_at, table.c.last_accessed_at)
+                .where(table.c.key == key, table.c.expires_at > now)
+            ).first()
+            if row is not None and now - row.last_accessed_at > _TOUCH_INTERVAL:
+                conn.execute(
+                    db.update(table)
+                    .where(table.c.key == key)
+                    .values(last_accessed_at=now, hits=table.c.hits + 1)
+                )
+
+        if row is None:
+            self._count('misses')
+            return None
+
+        meals = json.loads(row.response)
+        self._remember(key, row.expires_at, meals)
+        self._count('persistent_hits')
+        return meals
+
+    def set(self, key, meals, prompt='', count=0):
+        """Store a validated meal list in both tiers"""
+        if not self.enabled:
+            return
+
+        now = datetime.utcnow()
+        expires_at = now + self.ttl
+        self._remember(key, expires_at, meals)
+
+        values = {
+            'prompt': str(prompt),
+            'count': count,
+            'response': json.dumps(meals),
+            'created_at': now,
+            'expires_at': expires_at,
+            'last_accessed_at': now,
+            'hits': 0,
+        }
+        table = AIResponseCacheEntry.__table__
+        try:
+            with db.engine.begin() as conn:
+                updated = conn.execute(db.update(table).where(table.c.key == key).values(values)).rowcount
+                if not updated:
+                    conn.execute(db.insert(table).values(key=key, **values))
+        except IntegrityError:
+            # Another worker stored the same key concurrently; its value is as good as ours
+            pass
+
+        with self._lock:
+            self._stats['sets'] += 1
+            self._writes += 1
+            prune = self._writes % _PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Drop expired rows and trim the persistent tier to its maximum size"""
+        now = datetime.utcnow()
+        table = AIResponseCacheEntry.__table__
+        with db.engine.begin() as conn:
+            evicted = conn.execute(db.delete(table).where(table.c.expires_at <= now)).rowcount
+            keep = (
+                db.select(table.c.key)
+                .order_by(table.c.last_accessed_at.desc())
+                .limit(self.persistent_entries)
+            )
+            evicted += conn.execute(db.delete(table).where(table.c.key.not_in(keep))).rowcount
+        self._count('persistent_evictions', evicted)
+        return evicted
+
+    def fallback_meals(self, key, count):
+        """
+        Previously generated meals to serve while the AI service is unavailable
+        
+        Only the entry for this key qualifies, even if it has expired: meals
+        generated for another prompt or user would not answer this request.
+        Returns at most count meals; empty if the key was never cached.
+        """
+        table = AIResponseCacheEntry.__table__
+        with db.engine.connect() as conn:
+            response = conn.execute(db.select(table.c.response).where(table.c.key == key)).scalar()
+        return json.loads(response)[:count] if response is not None else []
+    
+    def clear_memory(self):
+        """Empty the in-process tier"""
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self):
+        """Hit/miss counters and current sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_size'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['persistent_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['memory_hits'] + stats['persistent_hits']) / lookups, 4) if lookups else 0.0
+        stats['enabled'] = self.enabled
+        return stats
+
+# Process-wide cache instance, configured in create_app
+ai_cache = AIResponseCache()
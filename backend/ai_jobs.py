@@ -0,0 +1,383 @@
+"""
+Asynchronous AI generation jobs
+
+Jobs are rows in the ai_jobs table, so they survive restarts and are shared
+by every worker process using the same database. Each process runs a small
+pool of threads that claim due jobs with a single conditional UPDATE, run
+the registered handler and store its result. A claimed job carries a lease,
+renewed every third of AI_JOB_LEASE_SECONDS while the handler runs, so a
+generation may take longer than the lease itself; if its worker dies (for
+example on a restart), renewals stop and idle workers requeue the job once
+the lease expires, up to AI_JOB_MAX_ATTEMPTS runs. Every claim records its
+own worker id (host:pid:claim), so only that run can renew or finish the job.
+
+Usage:
+    ai_jobs.init_app(app)
+    ai_jobs.register_handler(run_job)   # run_job(job) -> result dict
+    job_id = ai_jobs.submit(user_id, prompt, count)
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from sqlalchemy.exc import OperationalError
+from models import db, AIJob
+
+class QueueFull(Exception):
+    """Raised by submit() when AI_JOB_MAX_QUEUED jobs are already waiting"""
+
+class RetryJob(Exception):
+    """Raised by a handler to run the job again later, carrying the error body to store if it gives up"""
+
+    def __init__(self, payload, delay=5.0):
+        super().__init__(payload.get('error'))
+        self.payload = payload
+        self.delay = delay
+
+class JobQueue:
+    """SQLite-persisted job queue with a bounded in-process worker pool"""
+
+    def __init__(self):
+        self.app = None
+        self.workers = 4
+        self.poll_interval = 1.0
+        self.lease = timedelta(seconds=120)
+        self.max_attempts = 3
+        self.max_queued = 1000
+        self.result_ttl = timedelta(hours=24)
+        self.autostart = True
+        self._handler = None
+        self._threads = []
+        self._running = False
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._changed = threading.Condition()
+        self._stopping = threading.Event()
+        self._last_prune = 0.0
+        self._orphans_checked = False
+        self._last_error = None
+        self._wait_times = deque(maxlen=500)
+        self._run_times = deque(maxlen=500)
+        self._stats = {'submitted': 0, 'succeeded': 0, 'failed': 0, 'retried': 0, 'reclaimed': 0}
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'  # prefix of each claim's worker id
+
+    def init_app(self, app):
+        """
+        Read pool size and limits from the app config
+
+        With AI_JOB_AUTOSTART the workers start with the first request the
+        process serves (or the first submitted job), so importing the app
+        for scripts and tests does not spawn threads.
+        """
+        self.app = app
+        self.workers = app.config.get('AI_JOB_WORKERS', 4)
+        self.poll_interval = app.config.get('AI_JOB_POLL_SECONDS', 1.0)
+        self.lease = timedelta(seconds=app.config.get('AI_JOB_LEASE_SECONDS', 120))
+        self.max_attempts = app.config.get('AI_JOB_MAX_ATTEMPTS', 3)
+        self.max_queued = app.config.get('AI_JOB_MAX_QUEUED', 1000)
+        self.result_ttl = timedelta(seconds=app.config.get('AI_JOB_RESULT_TTL_SECONDS', 24 * 3600))
+        self.autostart = app.config.get('AI_JOB_AUTOSTART', True)
+        if self.autostart:
+            app.before_request(self._ensure_started)
+
+    def _ensure_started(self):
+        if not self._running:
+            self.start()
+
+    def register_handler(self, handler):
+        """Set the function that runs a claimed job and returns its result dict"""
+        self._handler = handler
+
+    def start(self):
+        """Start the worker threads if they are not running yet"""
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            self._stopping.clear()
+            for index in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._work, name=f'ai-job-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._running = True
+
+    def stop(self, timeout=5.0):
+        """Ask the worker threads to exit after their current job"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._running = False
+
+    def submit(self, user_id, prompt, count, parallel=None):
+        """Persist a new job and wake a worker; returns the job id"""
+        table = AIJob.__table__
+        now = datetime.utcnow()
+        job_id = uuid.uuid4().hex
+        with db.engine.begin() as conn:
+            queued = conn.execute(
+                db.select(db.func.count()).select_from(table).where(table.c.status == 'queued')
+            ).scalar()
+            if queued >= self.max_queued:
+                raise QueueFull(f'{queued} jobs are already waiting')
+            conn.execute(db.insert(table).values(
+                id=job_id, user_id=user_id, prompt=str(prompt), count=count, parallel=parallel,
+                status='queued', attempts=0, created_at=now, run_after=now
+            ))
+        with self._lock:
+            self._stats['submitted'] += 1
+        if self.autostart:
+            self._ensure_started()
+        self._wakeup.set()
+        return job_id
+
+    def claim(self):
+        """
+        Atomically take the oldest due job; returns its row (id, attempts,
+        worker) or None
+
+        The status check is repeated in the UPDATE so two claimers, in this
+        or another process, can never both win the same row. Each claim gets
+        a worker id of its own, as threads of one process share a pid.
+        """
+        table = AIJob.__table__
+        now = datetime.utcnow()
+        runnable = db.and_(table.c.status == 'queued', table.c.run_after <= now)
+        oldest = db.select(table.c.id).where(runnable).order_by(table.c.run_after).limit(1).scalar_subquery()
+        with db.engine.begin() as conn:
+            return conn.execute(
+                db.update(table)
+                .where(table.c.id == oldest, runnable)
+                .values(
+                    status='running',
+                    attempts=table.c.attempts + 1,
+                    worker=f'{self.worker_id}:{uuid.uuid4().hex[:12]}',
+                    started_at=now,
+                    lease_expires_at=now + self.lease
+                )
+                .returning(table.c.id, table.c.attempts, table.c.worker)
+            ).first()
+
+    def reclaim_expired(self):
+        """
+        Requeue running jobs whose lease expired because their worker died
+
+        Jobs that already used AI_JOB_MAX_ATTEMPTS runs are failed instead.
+        Returns the number of jobs requeued.
+        """
+        table = AIJob.__table__
+        now = datetime.utcnow()
+        expired = db.and_(table.c.status == 'running', table.c.lease_expires_at < now)
+        with db.engine.begin() as conn:
+            conn.execute(
+                db.update(table)
+                .where(expired, table.c.attempts >= self.max_attempts)
+                .values(status='failed', finished_at=now, lease_expires_at=None, error=json.dumps({
+                    'error': 'Failed to generate meal ideas',
+                    'details': 'The job was interrupted too many times'
+                }))
+            )
+            requeued = conn.execute(
+                db.update(table).where(expired).values(status='queued', run_after=now, lease_expires_at=None)
+            ).rowcount
+        if requeued:
+            with self._lock:
+                self._stats['reclaimed'] += requeued
+        return requeued
+
+    def requeue_orphans(self):
+        """
+        Requeue running jobs left behind by dead worker processes on this host
+
+        Called once when the workers start so a restart does not have to
+        wait for the old leases to expire. Returns the number of jobs requeued.
+        """
+        table = AIJob.__table__
+        host = self.worker_id.rsplit(':', 1)[0]
+        with db.engine.begin() as conn:
+            rows = conn.execute(
+                db.select(table.c.id, table.c.worker)
+                .where(table.c.status == 'running', table.c.worker.like(f'{host}:%'))
+            ).all()
+            orphans = [row.id for row in rows if not _pid_alive(row.worker.split(':')[1])]
+            if orphans:
+                conn.execute(
+                    db.update(table)
+                    .where(table.c.id.in_(orphans), table.c.status == 'running')
+                    .values(lease_expires_at=datetime.utcnow())
+                )
+        return self.reclaim_expired() if orphans else 0
+
+    def renew_lease(self, job_id, worker):
+        """Extend a running job's lease; returns False if the claim was lost (reclaimed or finished)"""
+        table = AIJob.__table__
+        with db.engine.begin() as conn:
+            return conn.execute(
+                db.update(table)
+                .where(table.c.id == job_id, table.c.worker == worker, table.c.status == 'running')
+                .values(lease_expires_at=datetime.utcnow() + self.lease)
+            ).rowcount == 1
+
+    def _keep_leased(self, job_id, worker, done):
+        """Heartbeat thread: renew the lease every third of its length until done is set"""
+        interval = self.lease.total_seconds() / 3
+        with self.app.app_context():
+            while not done.wait(interval):
+                try:
+                    if not self.renew_lease(job_id, worker):
+                        return
+                except OperationalError as e:
+                    # Database busy: the next beat, still well inside the lease, tries again
+                    self.app.logger.warning(f'AI job worker: could not renew lease: {e.orig}')
+
+    def _finish(self, job_id, worker, values):
+        table = AIJob.__table__
+        with db.engine.begin() as conn:
+            conn.execute(
+                db.update(table)
+                .where(table.c.id == job_id, table.c.worker == worker)
+                .values(lease_expires_at=None, **values)
+            )
+        with self._changed:
+            self._changed.notify_all()
+
+    def run_one(self):
+        """Claim and run a single job in the calling thread; returns False if none was runnable"""
+        row = self.claim()
+        if row is None:
+            return False
+
+        job = db.session.get(AIJob, row.id)
+        # Detach the loaded job so no pooled connection is held during the model call
+        db.session.close()
+        started = time.monotonic()
+        with self._lock:
+            self._wait_times.append((datetime.utcnow() - job.run_after).total_seconds())
+        with self._changed:
+            self._changed.notify_all()
+
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._keep_leased, args=(row.id, row.worker, done),
+                                     name=f'ai-job-lease-{row.id[:8]}', daemon=True)
+        heartbeat.start()
+        try:
+            result = self._handler(job)
+            values = {'status': 'succeeded', 'result': json.dumps(result), 'error': None,
+                      'finished_at': datetime.utcnow()}
+            stat = 'succeeded'
+        except RetryJob as e:
+            if row.attempts < self.max_attempts:
+                values = {'status': 'queued', 'run_after': datetime.utcnow() + timedelta(seconds=e.delay)}
+                stat = 'retried'
+            else:
+                values = {'status': 'failed', 'error': json.dumps(e.payload), 'finished_at': datetime.utcnow()}
+                stat = 'failed'
+        except Exception as e:
+            payload = getattr(e, 'payload', None) or {'error': 'Failed to generate meal ideas', 'details': str(e)}
+            values = {'status': 'failed', 'error': json.dumps(payload), 'finished_at': datetime.utcnow()}
+            stat = 'failed'
+        finally:
+            done.set()
+            heartbeat.join()
+            db.session.remove()
+
+        self._finish(row.id, row.worker, values)
+        with self._lock:
+            self._stats[stat] += 1
+            self._run_times.append(time.monotonic() - started)
+        return True
+
+    def _work(self):
+        """Worker thread loop: run jobs until none is runnable, then sleep until woken or polled"""
+        while not self._stopping.is_set():
+            ran = check_orphans = False
+            try:
+                with self.app.app_context():
+                    with self._lock:
+                        check_orphans, self._orphans_checked = not self._orphans_checked, True
+                    if check_orphans:
+                        self.requeue_orphans()
+                    ran = self.run_one()
+                    if not ran:
+                        ran = self.reclaim_expired() > 0
+                        self._prune()
+            except OperationalError as e:
+                # Database locked or tables not created yet; try again on the next poll
+                with self._lock:
+                    self._orphans_checked = self._orphans_checked and not check_orphans
+                    repeated, self._last_error = self._last_error == str(e.orig), str(e.orig)
+                if not repeated:
+                    self.app.logger.warning(f'AI job worker: {e.orig}')
+            except Exception:
+                self.app.logger.exception('AI job worker failed')
+            if not ran:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _prune(self):
+        """Delete finished jobs older than the result TTL, at most once a minute"""
+        if time.monotonic() - self._last_prune < 60:
+            return
+        self._last_prune = time.monotonic()
+        table = AIJob.__table__
+        with db.engine.begin() as conn:
+            conn.execute(
+                db.delete(table)
+                .where(table.c.status.in_(['succeeded', 'failed']),
+                       table.c.finished_at < datetime.utcnow() - self.result_ttl)
+            )
+
+    def wait_for_change(self, timeout):
+        """Block until a job finished or started in this process, or timeout elapsed"""
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def stats(self):
+        """Queue depth by status plus wait/run time summaries in seconds"""
+        table = AIJob.__table__
+        with db.engine.connect() as conn:
+            depth = dict(conn.execute(
+                db.select(table.c.status, db.func.count()).group_by(table.c.status)
+            ).all())
+        with self._lock:
+            stats = dict(self._stats)
+            wait_times = sorted(self._wait_times)
+            run_times = sorted(self._run_times)
+        stats['queued'] = depth.get('queued', 0)
+        stats['running'] = depth.get('running', 0)
+        stats['workers'] = len([thread for thread in self._threads if thread.is_alive()])
+        stats['wait_seconds'] = _summary(wait_times)
+        stats['run_seconds'] = _summary(run_times)
+        return stats
+
+def _pid_alive(pid):
+    """Whether a process with this pid exists on this host"""
+    if os.name == 'nt':
+        return True  # os.kill(pid, 0) would terminate the process on Windows
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _summary(ordered):
+    """count/mean/p50/p95/max of a sorted list of durations"""
+    if not ordered:
+        return {'count': 0}
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 4)
+    return {
+        'count': len(ordered),
+        'mean': round(sum(ordered) / len(ordered), 4),
+        'p50': pick(0.5),
+        'p95': pick(0.95),
+        'max': round(ordered[-1], 4),
+    }
+
+# Process-wide job queue, configured in create_app
+ai_jobs = JobQueue()
@@ -0,0 +1,173 @@
+"""
+Incremental and tolerant parsing of AI responses
+
+The model is asked for a JSON array of meal objects, but real responses
+arrive with prose around the array, markdown fences in odd places, trailing
+commas or a truncated last object. IncrementalArrayParser consumes the
+response text in arbitrary chunks (as it streams from the provider) and
+yields each top-level object of the array as soon as its closing brace
+arrives; extract_objects() applies the same parser to a complete response
+and recovers every complete object it contains.
+"""
+import json
+import re
+
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+_ARRAY_START_RE = re.compile(r'\[\s*[{\]]')
+
+def loads_lenient(text):
+    """json.loads that also accepts trailing commas; returns None if still invalid"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(_TRAILING_COMMA_RE.sub(r'\1', text))
+    except json.JSONDecodeError:
+        return None
+
+class IncrementalArrayParser:
+    """
+    Yield the elements of a streamed JSON array of objects as they complete
+
+    Anything before the opening '[' (such as a ```json fence or prose) is
+    skipped; a '[' only counts as the start of the array when it is followed
+    by '{' or ']', so brackets in prose ("here are [3] ideas") are ignored.
+    With started=True the parser treats the text as already inside the
+    array, which also recovers bare objects that are not wrapped in one.
+
+    Usage:
+        parser = IncrementalArrayParser()
+        for chunk in stream:
+            for obj in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self, started=False):
+        self._buffer = ''
+        self._pos = 0            # next character of _buffer to scan
+        self._started = started  # seen the array's opening '['
+        self._finished = False   # seen the array's closing ']'
+        self._depth = 0          # nesting depth inside the array
+        self._in_string = False
+        self._escape = False
+        self._object_start = None
+
+    @property
+    def started(self):
+        """True once the opening bracket of the array has been seen"""
+        return self._started
+
+    @property
+    def finished(self):
+        """True once the closing bracket of the array has been seen"""
+        return self._finished
+
+    def feed(self, chunk):
+        """Consume a chunk of text and return the list of objects it completed"""
+        if self._finished or not chunk:
+            return []
+
+        self._buffer += chunk
+        completed = []
+        buffer = self._buffer
+        i = self._pos
+
+        while i < len(buffer):
+            char = buffer[i]
+
+            if not self._started:
+                if char == '[':
+                    # Look ahead past whitespace to decide if this opens the array
+                    j = i + 1
+                    while j < len(buffer) and buffer[j].isspace():
+                        j += 1
+                    if j == len(buffer):
+                        break  # wait for more text
+                    if buffer[j] in '{]':
+                        self._started = True
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if self._depth == 0 and char == '{':
+                    self._object_start = i
+                self._depth += 1
+            elif char in '}]':
+                if self._depth == 0 and char == ']':
+                    self._finished = True
+                    i += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._object_start is not None:
+                    parsed = loads_lenient(buffer[self._object_start:i + 1])
+                    if parsed is not None:
+                        completed.append(parsed)
+                    self._object_start = None
+
+            i += 1
+
+        # Drop text that can no longer be part of a pending object
+        keep_from = self._object_start if self._object_start is not None else i
+        self._buffer = buffer[keep_from:]
+        self._pos = i - keep_from
+        if self._object_start is not None:
+            self._object_start = 0
+
+        return completed
+
+def _unwrap(obj):
+    """Expand a wrapper object such as {"meals": [...]} into its elements"""
+    if 'name' in obj:
+        return [obj]
+    elements = []
+    for value in obj.values():
+        if isinstance(value, list):
+            elements.extend(item for item in value if isinstance(item, dict))
+    return elements or [obj]
+
+def extract_objects(text):
+    """
+    Recover every complete top-level object of the meal array in a response
+
+    Handles prose and fences around the array, trailing commas and truncated
+    output (the incomplete last object is dropped). When an object opens
+    before any array, the response is read as bare objects, or as a wrapper
+    object ({"meals": [...]}) whose array is unwrapped.
+    """
+    if not text:
+        return []
+
+    array_match = _ARRAY_START_RE.search(text)
+    first_brace = text.find('{')
+    if first_brace != -1 and (array_match is None or first_brace < array_match.start()):
+        objects = IncrementalArrayParser(started=True).feed(text[first_brace:])
+        elements = [element for obj in objects if isinstance(obj, dict) for element in _unwrap(obj)]
+        if elements:
+            return elements
+
+    if array_match is None:
+        return []
+
+    # Fast path: the common well-formed array parses in one json.loads call
+    end = text.rfind(']')
+    if end > array_match.start():
+        try:
+            objects = json.loads(text[array_match.start():end + 1])
+        except json.JSONDecodeError:
+            pass
+        else:
+            if isinstance(objects, list):
+                return [obj for obj in objects if isinstance(obj, dict)]
+
+    objects = IncrementalArrayParser(started=True).feed(text[array_match.start() + 1:])
+    return [obj for obj in objects if isinstance(obj, dict)]
@@ -0,0 +1,174 @@
+"""
+AI text-generation providers
+
+A provider turns a fully built request (prompt text, system instruction and
+generation settings) into raw model output. The generation pipeline in
+ai_service.py owns prompting, parsing and validation, so providers can be
+swapped without touching it.
+
+- GeminiProvider talks to Google Gemini; the SDK client and model are
+  created once per process and reused by every request.
+- LocalProvider returns deterministic, well-formed meal JSON after a
+  configurable simulated latency, for offline development and load tests.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+
+class AIProvider:
+    """Interface implemented by all providers"""
+
+    name = 'base'
+    model_name = None
+
+    def is_configured(self):
+        """Whether the provider can serve requests"""
+        return True
+
+    def generate(self, request_text, count, system_instruction, generation_config, timeout=None):
+        """Return the raw text produced for one request"""
+        raise NotImplementedError
+
+    def stream(self, request_text, count, system_instruction, generation_config, timeout=None):
+        """Yield the raw text for one request in chunks as it is produced"""
+        yield self.generate(request_text, count, system_instruction, generation_config, timeout=timeout)
+
+class GeminiProvider(AIProvider):
+    """Google Gemini provider with a process-wide client and model"""
+
+    name = 'gemini'
+
+    def __init__(self, api_key, model_name, system_instruction):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self._model = None
+        self._lock = threading.Lock()
+
+    def is_configured(self):
+        return bool(self.api_key)
+
+    def _get_model(self):
+        """Configure the SDK and build the model on first use"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self._genai = genai
+                    self._model = genai.GenerativeModel(
+                        self.model_name,
+                        system_instruction=self.system_instruction
+                    )
+        return self._model
+
+    def generate(self, request_text, count, system_instruction, generation_config, timeout=None):
+        from google.api_core import exceptions as api_exceptions
+        model = self._get_model()
+        try:
+            response = model.generate_content(
+                request_text,
+                generation_config=self._genai.types.GenerationConfig(**generation_config),
+                request_options={'timeout': timeout} if timeout else None
+            )
+        except api_exceptions.DeadlineExceeded as e:
+            raise TimeoutError(str(e)) from e
+        return response.text
+
+    def stream(self, request_text, count, system_instruction, generation_config, timeout=None):
+        from google.api_core import exceptions as api_exceptions
+        model = self._get_model()
+        try:
+            response = model.generate_content(
+                request_text,
+                generation_config=self._genai.types.GenerationConfig(**generation_config),
+                stream=True,
+                request_options={'timeout': timeout} if timeout else None
+            )
+            for chunk in response:
+                yield chunk.text
+        except api_exceptions.DeadlineExceeded as e:
+            raise TimeoutError(str(e)) from e
+
+class LocalProvider(AIProvider):
+    """
+    Deterministic offline provider
+
+    The same request text always yields the same meals. Each call sleeps for
+    latency_ms plus latency_per_meal_ms for every meal to mimic generation
+    time, and produces ingredients_per_meal ingredients per meal.
+    """
+
+    name = 'local'
+    model_name = 'local-deterministic'
+
+    ADJECTIVES = ['Smoky', 'Zesty', 'Creamy', 'Crispy', 'Spiced', 'Herby', 'Golden', 'Rustic', 'Fresh', 'Hearty']
+    BASES = ['Chickpea', 'Lentil', 'Mushroom', 'Tofu', 'Chicken', 'Salmon', 'Halloumi', 'Bean', 'Paneer', 'Aubergine']
+    DISHES = ['Curry', 'Stir Fry', 'Tacos', 'Risotto', 'Traybake', 'Salad', 'Pasta', 'Soup', 'Bowl', 'Stew']
+    INGREDIENTS = [
+        ('Onion', '1'), ('Garlic', '2 cloves'), ('Olive Oil', '2 tbsp'), ('Rice', '200g'), ('Spinach', '100g'),
+        ('Tomatoes', '400g'), ('Lemon', '1'), ('Coconut Milk', '400 ml'), ('Cumin', '1 tsp'), ('Pasta', '250g'),
+        ('Peppers', '2'), ('Feta', '100g'), ('Broccoli', '1 head'), ('Stock', '500 ml'), ('Basil', '1 bunch'),
+    ]
+
+    def __init__(self, latency_ms=0, latency_per_meal_ms=0, ingredients_per_meal=5):
+        self.latency_ms = latency_ms
+        self.latency_per_meal_ms = latency_per_meal_ms
+        self.ingredients_per_meal = ingredients_per_meal
+
+    def build_meals(self, request_text, count):
+        """Deterministically derive count meals from the request text"""
+        seed = int(hashlib.sha256(request_text.encode()).hexdigest()[:16], 16)
+        rng = random.Random(seed)
+        meals = []
+        for _ in range(count):
+            name = f'{rng.choice(self.ADJECTIVES)} {rng.choice(self.BASES)} {rng.choice(self.DISHES)}'
+            ingredients = rng.sample(self.INGREDIENTS, min(self.ingredients_per_meal, len(self.INGREDIENTS)))
+            meals.append({
+                'name': name,
+                'notes': f'A {name.lower()} ready in about {rng.randint(15, 60)} minutes.',
+                'ingredients': [{'name': n, 'quantity': q} for n, q in ingredients],
+            })
+        return meals
+
+    def generate(self, request_text, count, system_instruction, generation_config, timeout=None):
+        delay = (self.latency_ms + self.latency_per_meal_ms * count) / 1000.0
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError('Local provider simulated latency exceeded the timeout')
+        if delay:
+            time.sleep(delay)
+        return '```json\n' + json.dumps(self.build_meals(request_text, count), indent=2) + '\n```'
+
+    def stream(self, request_text, count, system_instruction, generation_config, timeout=None):
+        """Emit the same text as generate(), one meal at a time with the per-meal delay"""
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        yield '```json\n['
+        for index, meal in enumerate(self.build_meals(request_text, count)):
+            if self.latency_per_meal_ms:
+                time.sleep(self.latency_per_meal_ms / 1000.0)
+            text = (',' if index else '') + json.dumps(meal, indent=2)
+            # Split each meal so consumers see objects straddling chunk boundaries
+            middle = len(text) // 2
+            yield text[:middle]
+            yield text[middle:]
+        yield ']\n```'
+
+def create_provider(config, system_instruction):
+    """Build the provider selected by AI_PROVIDER"""
+    provider_name = config.get('AI_PROVIDER', 'gemini')
+
+    if provider_name == 'local':
+        return LocalProvider(
+            latency_ms=config.get('AI_LOCAL_LATENCY_MS', 0),
+            latency_per_meal_ms=config.get('AI_LOCAL_LATENCY_PER_MEAL_MS', 0),
+            ingredients_per_meal=config.get('AI_LOCAL_INGREDIENTS_PER_MEAL', 5),
+        )
+
+    if provider_name == 'gemini':
+        return GeminiProvider(config.get('GEMINI_API_KEY'), config.get('AI_MODEL'), system_instruction)
+
+    raise ValueError(f'Unknown AI provider: {provider_name}')
@@ -1,24 +1,494 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context, url_for
+from flask_jwt_extended import jwt_required, get_jwt_identity
 import json
 import os
-from config import Config
+import threading
+import time
+from ai_cache import ai_cache, make_cache_key
+from ai_jobs import ai_jobs, QueueFull, RetryJob
+from ai_parsing import IncrementalArrayParser, extract_objects
+from ai_providers import create_provider
+from resilience import ai_calls, CircuitOpenError, DeadlineExceeded, UpstreamUnavailable
+from models import db, AIJob
+from rate_limit import ai_rate_limited, limiter
+from recipe_library import recipe_library
+from singleflight import ai_singleflight
 
 # Create AI service blueprint
 ai_bp = Blueprint('ai', __name__, url_prefix='/api')
 
-# Configure Gemini AI
-if Config.GEMINI_API_KEY:
-    genai.configure(api_key=Config.GEMINI_API_KEY)
-else:
-    print("Warning: GEMINI_API_KEY not found in environment variables")
+GENERATION_CONFIG = {
+    'temperature': 0.7,
+    'top_p': 0.8,
+    'top_k': 40,
+    'max_output_tokens': 2048,
+}
+
+class AIServiceError(Exception):
+    """Error raised by the generation pipeline, carrying the JSON error response"""
+    
+    def __init__(self, error, details=None, status=500, **extra):
+        super().__init__(error)
+        self.status = status
+        self.payload = {'error': error}
+        if details is not None:
+            self.payload['details'] = details
+        self.payload.update(extra)
+
+def build_system_instruction():
+    """Create system instruction for consistent JSON output"""
+    return """You are a creative chef who generates meal ideas. The user will provide their preferences.
+        
+        You must return a valid JSON array with exactly the number of meal objects requested. Each object must have these exact keys:
+        1. "name" (string): The name of the meal
+        2. "notes" (string): A brief, enticing description of the meal
+        3. "ingredients" (array): Each object in this array must have "name" (string) and "quantity" (string)
+        
+        Example format:
+        [
+            {
+                "name": "Meal Name",
+                "notes": "Description of the meal",
+                "ingredients": [
+                    {"name": "Ingredient 1", "quantity": "100g"},
+                    {"name": "Ingredient 2", "quantity": "2 pieces"}
+                ]
+            }
+        ]
+        
+        Do not include any other text, explanations, or markdown formatting outside of the JSON array.
+        Ensure the response is valid JSON that can be parsed directly."""
+
+# Provider created once per process by init_provider()
+_provider = None
+
+def init_provider(app):
+    """Create the AI provider selected in the config and reuse it for every request"""
+    global _provider
+    _provider = create_provider(app.config, build_system_instruction())
+    if not _provider.is_configured():
+        print("Warning: GEMINI_API_KEY not found in environment variables")
+
+def get_provider():
+    """Return the process-wide AI provider"""
+    return _provider
+
+def call_model(prompt, count, variant=None, timeout=None, exclude=None):
+    """
+    Send one generation request to the configured provider and return the raw response text
+    
+    variant is an optional (index, total) pair used by fan-out so each
+    sub-request is asked for dishes distinct from its siblings; exclude is
+    an optional list of meal names the model must not repeat.
+    
+    The call runs under the process-wide deadline, circuit breaker and
+    hedging policy (see resilience.py); raises UpstreamUnavailable when the
+    breaker is open or the deadline passes.
+    """
+    request_text = build_request_text(prompt, count, variant, exclude)
+    return ai_calls.call(
+        lambda: _provider.generate(
+            request_text,
+            count,
+            build_system_instruction(),
+            GENERATION_CONFIG,
+            timeout=timeout
+        ),
+        timeout=timeout
+    )
+
+def build_request_text(prompt, count, variant=None, exclude=None):
+    """Build the user message sent to the model"""
+    request_text = f"Generate exactly {count} meal ideas based on this request: \"{prompt}\""
+    if variant:
+        index, total = variant
+        request_text += f" This is idea set {index + 1} of {total}; suggest dishes that differ from the other sets."
+    if exclude:
+        request_text += " Do not suggest any of these meals again: " + ', '.join(f'"{name}"' for name in exclude) + "."
+    return request_text
+
+def parse_meals(response_text):
+    """
+    Recover and validate every complete meal object in the model output
+    
+    Tolerates prose or markdown fences around the array, trailing commas and
+    a truncated final object; invalid objects are dropped. Returns a
+    (possibly empty) list of meals.
+    """
+    return [meal for meal in map(validate_meal, extract_objects(response_text)) if meal is not None]
+
+def validate_meal(meal):
+    """Return a cleaned meal dict, or None if the object is not a valid meal"""
+    if not isinstance(meal, dict):
+        return None
+    
+    # Check required fields
+    if not all(key in meal for key in ['name', 'notes', 'ingredients']):
+        return None
+    
+    # Validate ingredients
+    if not isinstance(meal['ingredients'], list):
+        return None
+    
+    valid_ingredients = []
+    for ingredient in meal['ingredients']:
+        if isinstance(ingredient, dict) and 'name' in ingredient and 'quantity' in ingredient:
+            valid_ingredients.append({
+                'name': str(ingredient['name']),
+                'quantity': str(ingredient['quantity'])
+            })
+    
+    return {
+        'name': str(meal['name']),
+        'notes': str(meal['notes']),
+        'ingredients': valid_ingredients
+    }
+
+_fanout_executor = None
+_fanout_lock = threading.Lock()
+
+def _get_fanout_executor():
+    """Bounded thread pool shared by all fan-out requests in this process"""
+    global _fanout_executor
+    with _fanout_lock:
+        if _fanout_executor is None:
+            _fanout_executor = ThreadPoolExecutor(
+                max_workers=current_app.config['AI_FANOUT_MAX_WORKERS'],
+                thread_name_prefix='ai-fanout'
+            )
+        return _fanout_executor
+
+def _split_count(count, chunk_size):
+    """Split count into chunk sizes, e.g. 7 by 2 -> [2, 2, 2, 1]"""
+    chunks = [chunk_size] * (count // chunk_size)
+    if count % chunk_size:
+        chunks.append(count % chunk_size)
+    return chunks
+
+def _meal_key(meal):
+    return ' '.join(meal['name'].lower().split())
+
+def _add_unique(meals, seen, new_meals, limit):
+    """Append meals whose names are not in seen, up to limit meals in total"""
+    for meal in new_meals:
+        if len(meals) >= limit:
+            break
+        key = _meal_key(meal)
+        if key not in seen:
+            seen.add(key)
+            meals.append(meal)
+
+def _generate_single(prompt, count, variant=None, timeout=None, continuations=1):
+    """
+    Generate count meals with one model call, salvaging malformed output
+    
+    Every complete meal is kept from a response with stray text or a
+    truncated end. If fewer than count meals were recovered, up to
+    continuations follow-up calls ask only for the missing meals, excluding
+    the ones already generated. Returns (meals, partial); raises
+    AIServiceError if no valid meal could be recovered.
+    """
+    response_text = call_model(prompt, count, variant=variant, timeout=timeout)
+    meals = []
+    seen = set()
+    _add_unique(meals, seen, parse_meals(response_text), count)
+    
+    for _ in range(continuations):
+        missing = count - len(meals)
+        if missing <= 0:
+            break
+        try:
+            continuation_text = call_model(
+                prompt, missing, variant=variant, timeout=timeout,
+                exclude=[meal['name'] for meal in meals]
+            )
+        except Exception:
+            if meals:
+                break  # keep what we salvaged rather than failing the request
+            raise
+        _add_unique(meals, seen, parse_meals(continuation_text), count)
+    
+    if not meals:
+        raise AIServiceError(
+            'Failed to parse AI response',
+            'AI response did not contain valid meal data',
+            raw_response=response_text[:2000]
+        )
+    
+    return meals, len(meals) < count
+
+def generate_fanout(prompt, count):
+    """
+    Generate count meals as several smaller concurrent model calls
+    
+    Each call gets the same deadline; results are merged and deduplicated by
+    meal name. Returns (meals, partial) where partial is True if some calls
+    failed or timed out. If every call failed, re-raises UpstreamUnavailable
+    when the provider was unreachable and AIServiceError otherwise.
+    """
+    chunk_size = current_app.config['AI_FANOUT_CHUNK_SIZE']
+    timeout = current_app.config['AI_CALL_TIMEOUT_SECONDS']
+    continuations = current_app.config['AI_CONTINUATION_ATTEMPTS']
+    chunks = _split_count(count, chunk_size)
+    
+    executor = _get_fanout_executor()
+    futures = [
+        executor.submit(_generate_single, prompt, size, (index, len(chunks)), timeout, continuations)
+        for index, size in enumerate(chunks)
+    ]
+    
+    deadline = time.monotonic() + timeout
+    meals = []
+    seen = set()
+    errors = []
+    for future in futures:
+        try:
+            chunk_meals, _ = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            errors.append(DeadlineExceeded('Timed out waiting for the AI service'))
+            continue
+        except Exception as e:
+            errors.append(e)
+            continue
+        
+        _add_unique(meals, seen, chunk_meals, count)
+    
+    if not meals:
+        if errors and all(isinstance(e, UpstreamUnavailable) for e in errors):
+            raise errors[0]
+        details = [e.payload.get('details') or e.payload['error'] if isinstance(e, AIServiceError) else str(e) for e in errors]
+        raise AIServiceError('Failed to generate meal ideas', '; '.join(details) or 'No meals generated')
+    
+    return meals[:count], bool(errors) or len(meals) < count
+
+def generate_ideas(prompt, count, parallel=None, user_id=None):
+    """
+    Run the generation pipeline: cache lookup, recipe library match, model
+    call, parsing and validation
+    
+    parallel forces fan-out on or off; by default it is used when enabled in
+    the config and count exceeds AI_FANOUT_CHUNK_SIZE. The library match
+    includes meals saved by user_id besides the shared generated ones.
+    
+    Returns (meals, partial); raises AIServiceError on failure. Partial
+    results are returned to the caller but never cached.
+    """
+    cache_key = make_cache_key(prompt, count, _provider.model_name, GENERATION_CONFIG)
+    
+    cached = ai_cache.get(cache_key)
+    if cached is not None:
+        return cached, False
+    
+    # Prompts close enough to earlier ones are answered from the recipe library
+    library_meals = recipe_library.match(prompt, count, user_id=user_id)
+    if library_meals is not None:
+        return library_meals, False
+    
+    if parallel is None:
+        parallel = current_app.config['AI_FANOUT_ENABLED']
+    parallel = parallel and count > current_app.config['AI_FANOUT_CHUNK_SIZE']
+    
+    def generate_uncached():
+        # Re-check: a leader in another worker may have filled the cache while we waited
+        cached = ai_cache.get(cache_key)
+        if cached is not None:
+            return cached, False
+        
+        if parallel:
+            validated_meals, partial = generate_fanout(prompt, count)
+        else:
+            validated_meals, partial = _generate_single(
+                prompt, count,
+                timeout=current_app.config['AI_CALL_TIMEOUT_SECONDS'],
+                continuations=current_app.config['AI_CONTINUATION_ATTEMPTS']
+            )
+        
+        if not partial:
+            ai_cache.set(cache_key, validated_meals, prompt=prompt, count=count)
+        recipe_library.add_meals(validated_meals, source='ai', prompt=prompt)
+        return validated_meals, partial
+    
+    # Identical concurrent requests wait on a single upstream call
+    result, _ = ai_singleflight.do(cache_key, generate_uncached)
+    return result
+
+def fallback_ideas(prompt, count, user_id=None):
+    """
+    Previously generated meals to serve while the AI provider is unavailable
+    
+    Serves the cached result for the same request, even if expired, or else
+    recipe library matches at the relaxed AI_FALLBACK_LIBRARY_THRESHOLD.
+    Returns an empty list when AI_FALLBACK_ENABLED is off or neither has an
+    answer, so the caller responds 503.
+    """
+    if not current_app.config['AI_FALLBACK_ENABLED']:
+        return []
+    cache_key = make_cache_key(prompt, count, _provider.model_name, GENERATION_CONFIG)
+    meals = ai_cache.fallback_meals(cache_key, count)
+    if meals:
+        return meals
+    threshold = current_app.config['AI_FALLBACK_LIBRARY_THRESHOLD']
+    return recipe_library.match(prompt, count, threshold=threshold, user_id=user_id) or []
+
+def generate_ideas_response(prompt, count, parallel=None, user_id=None):
+    """
+    Generate meals and build the generate-ideas response body
+    
+    Serves previously generated meals, flagged as a fallback, when the
+    provider is unavailable. Raises UpstreamUnavailable if there is nothing
+    to fall back on and AIServiceError on any other failure.
+    """
+    try:
+        validated_meals, partial = generate_ideas(prompt, count, parallel=parallel, user_id=user_id)
+        fallback = False
+    except UpstreamUnavailable:
+        validated_meals = fallback_ideas(prompt, count, user_id=user_id)
+        if not validated_meals:
+            raise
+        partial = len(validated_meals) < count
+        fallback = True
+    
+    response = {'meals': validated_meals}
+    if fallback:
+        response['fallback'] = True
+    if partial:
+        response['partial'] = True
+        response['requested'] = count
+    return response
+
+def _run_job(job):
+    """Job handler: generate ideas for a queued job, retrying later while the provider is unavailable"""
+    try:
+        return generate_ideas_response(job.prompt, job.count, parallel=job.parallel, user_id=job.user_id)
+    except UpstreamUnavailable as e:
+        raise RetryJob(
+            {'error': 'AI service is temporarily unavailable', 'details': str(e)},
+            delay=max(1.0, getattr(e, 'retry_after', 5.0))
+        )
+
+ai_jobs.register_handler(_run_job)
+
+def _unavailable_response(error):
+    """503 response for an unreachable provider, with Retry-After when the breaker is open"""
+    response = jsonify({
+        'error': 'AI service is temporarily unavailable',
+        'details': str(error)
+    })
+    if isinstance(error, CircuitOpenError):
+        response.headers['Retry-After'] = str(max(1, int(error.retry_after + 0.999)))
+    return response, 503
+
+def stream_ideas(prompt, count):
+    """
+    Yield validated meals one by one as the provider streams its output
+    
+    Each meal is emitted as soon as its JSON object is complete. If the
+    stream ends short of count meals, up to AI_CONTINUATION_ATTEMPTS
+    follow-up calls ask for the missing ones. Cached results are replayed immediately, and a complete
+    result is cached at the end. Raises AIServiceError if no valid meal
+    arrives.
+    """
+    cache_key = make_cache_key(prompt, count, _provider.model_name, GENERATION_CONFIG)
+    
+    cached = ai_cache.get(cache_key)
+    if cached is not None:
+        yield from cached
+        return
+    
+    parser = IncrementalArrayParser()
+    meals = []
+    seen = set()
+    received = []
+    timeout = current_app.config['AI_CALL_TIMEOUT_SECONDS']
+    chunks = ai_calls.stream(
+        lambda: _provider.stream(
+            build_request_text(prompt, count),
+            count,
+            build_system_instruction(),
+            GENERATION_CONFIG,
+            timeout=timeout
+        ),
+        timeout=timeout
+    )
+    try:
+        for chunk in chunks:
+            received.append(chunk)
+            for parsed in parser.feed(chunk):
+                meal = validate_meal(parsed)
+                if meal is not None and len(meals) < count and _meal_key(meal) not in seen:
+                    seen.add(_meal_key(meal))
+                    meals.append(meal)
+                    yield meal
+    except UpstreamUnavailable:
+        if not meals:
+            raise
+        # Keep the meals already sent; the continuation below asks for the rest
+    
+    if not meals:
+        # Nothing usable streamed (e.g. bare objects or a wrapper object); salvage the full text
+        salvaged = []
+        _add_unique(salvaged, seen, parse_meals(''.join(received)), count)
+        meals.extend(salvaged)
+        yield from salvaged
+    
+    for _ in range(current_app.config['AI_CONTINUATION_ATTEMPTS']):
+        missing = count - len(meals)
+        if missing <= 0:
+            break
+        try:
+            continuation_text = call_model(
+                prompt, missing, timeout=timeout,
+                exclude=[meal['name'] for meal in meals]
+            )
+        except Exception:
+            if meals:
+                break
+            raise
+        extra = []
+        _add_unique(extra, seen, parse_meals(continuation_text), missing)
+        meals.extend(extra)
+        yield from extra
+    
+    if not meals:
+        raise AIServiceError('No valid meals generated', 'AI response did not contain valid meal data')
+    
+    if len(meals) == count:
+        ai_cache.set(cache_key, meals, prompt=prompt, count=count)
+    recipe_library.add_meals(meals, source='ai', prompt=prompt)
+
+def _read_generation_request(data):
+    """Validate a generate-ideas request body; returns (prompt, count, error_response)"""
+    # Validate required fields
+    if not data or not data.get('prompt'):
+        return None, None, (jsonify({'error': 'Prompt is required'}), 400)
+    
+    prompt = data['prompt']
+    count = data.get('count', 3)  # Default to 3 meals
+    
+    # Validate count
+    if not isinstance(count, int) or count < 1 or count > 10:
+        return None, None, (jsonify({'error': 'Count must be between 1 and 10'}), 400)
+    
+    return prompt, count, None
+
+def _format_stream_event(event, payload, sse):
+    """Encode one streamed event as Server-Sent Events or NDJSON"""
+    if sse:
+        return f'event: {event}\ndata: {json.dumps(payload)}\n\n'
+    return json.dumps({'type': event, 'data': payload}) + '\n'
 
 @ai_bp.route('/generate-ideas', methods=['POST'])
 @jwt_required()
+@ai_rate_limited
 def generate_meal_ideas():
     """
-    Generate meal ideas using Gemini AI
+    Generate meal ideas using the configured AI provider (Gemini by default)
+    
+    Identical requests (same normalized prompt and count) are answered from
+    the meal-idea cache without calling the model, and identical requests
+    that arrive while one is in flight share its result.
     
     Headers:
     Authorization: Bearer <jwt_token>
@@ -26,7 +496,9 @@ def generate_meal_ideas():
     Request Body:
     {
         "prompt": "I want vegetarian meals for dinner this week",
-        "count": 3
+        "count": 3,
+        "parallel": true,  (optional, split into concurrent smaller generations)
+        "async": true      (optional, queue the generation and return a job id)
     }
     
     Response:
@@ -46,137 +518,279 @@ def generate_meal_ideas():
                     }
                 ]
             }
-        ]
+        ],
+        "fallback": true,  (only when the AI service is unavailable and
+                            previously generated meals are served instead)
+        "partial": true,   (only when fewer meals than requested are returned)
+        "requested": 3
+    }
+    
+    Responds 503 with a Retry-After header when the AI service is
+    unavailable and there is nothing to fall back on, and 429 with a
+    Retry-After header when the user's or the global rate limit is exceeded.
+    
+    Response (async, 202):
+    {
+        "job_id": "3f2b...",
+        "status": "queued",
+        "status_url": "/api/generate-ideas/3f2b...",
+        "events_url": "/api/generate-ideas/3f2b.../events"
     }
     """
     try:
-        # Check if API key is configured
-        if not Config.GEMINI_API_KEY:
+        # Check if the AI provider is configured
+        if not _provider.is_configured():
             return jsonify({
                 'error': 'AI service is not configured. Please contact administrator.'
             }), 503
         
         data = request.get_json()
         
-        # Validate required fields
-        if not data or not data.get('prompt'):
-            return jsonify({'error': 'Prompt is required'}), 400
+        prompt, count, error = _read_generation_request(data)
+        if error:
+            return error
         
-        prompt = data['prompt']
-        count = data.get('count', 3)  # Default to 3 meals
+        parallel = data.get('parallel')
+        if parallel is not None and not isinstance(parallel, bool):
+            return jsonify({'error': 'Parallel must be a boolean'}), 400
         
-        # Validate count
-        if not isinstance(count, int) or count < 1 or count > 10:
-            return jsonify({'error': 'Count must be between 1 and 10'}), 400
+        run_async = data.get('async', False)
+        if not isinstance(run_async, bool):
+            return jsonify({'error': 'Async must be a boolean'}), 400
         
-        # Create system instruction for consistent JSON output
-        system_instruction = f"""You are a creative chef who generates meal ideas. The user will provide their preferences.
+        if run_async:
+            try:
+                job_id = ai_jobs.submit(int(get_jwt_identity()), prompt, count, parallel=parallel)
+            except QueueFull as e:
+                response = jsonify({'error': 'Too many queued AI jobs, please retry later', 'details': str(e)})
+                response.headers['Retry-After'] = '5'
+                return response, 503
+            
+            status_url = url_for('ai.get_generation_job', job_id=job_id)
+            response = jsonify({
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': status_url,
+                'events_url': url_for('ai.stream_generation_job', job_id=job_id)
+            })
+            response.headers['Location'] = status_url
+            return response, 202
         
-        You must return a valid JSON array of exactly {count} meal objects. Each object must have these exact keys:
-        1. "name" (string): The name of the meal
-        2. "notes" (string): A brief, enticing description of the meal
-        3. "ingredients" (array): Each object in this array must have "name" (string) and "quantity" (string)
+        try:
+            response = generate_ideas_response(prompt, count, parallel=parallel, user_id=int(get_jwt_identity()))
+        except UpstreamUnavailable as e:
+            return _unavailable_response(e)
         
-        Example format:
-        [
-            {{
-                "name": "Meal Name",
-                "notes": "Description of the meal",
-                "ingredients": [
-                    {{"name": "Ingredient 1", "quantity": "100g"}},
-                    {{"name": "Ingredient 2", "quantity": "2 pieces"}}
-                ]
-            }}
-        ]
+        return jsonify(response), 200
         
-        Do not include any other text, explanations, or markdown formatting outside of the JSON array.
-        Ensure the response is valid JSON that can be parsed directly."""
+    except AIServiceError as e:
+        return jsonify(e.payload), e.status
+    
+    except Exception as e:
+        return jsonify({
+            'error': 'Failed to generate meal ideas',
+            'details': str(e)
+        }), 500
+
+@ai_bp.route('/generate-ideas/stream', methods=['POST'])
+@jwt_required()
+@ai_rate_limited
+def stream_meal_ideas():
+    """
+    Generate meal ideas and stream each meal as soon as it is parsed
+    
+    Responds with Server-Sent Events when the client sends
+    "Accept: text/event-stream", otherwise with NDJSON (one JSON object per line).
+    
+    Headers:
+    Authorization: Bearer <jwt_token>
+    Accept: text/event-stream (optional)
+    
+    Request Body:
+    {
+        "prompt": "I want vegetarian meals for dinner this week",
+        "count": 3
+    }
+    
+    Response (NDJSON):
+    {"type": "meal", "data": {"name": "...", "notes": "...", "ingredients": [...]}}
+    {"type": "meal", "data": {...}}
+    {"type": "done", "data": {"count": 3, "partial": false}}
+    
+    Response (SSE):
+    event: meal
+    data: {"name": "...", "notes": "...", "ingredients": [...]}
+    
+    event: done
+    data: {"count": 3, "partial": false}
+    
+    Failures after the stream has started are reported as an "error" event.
+    While the AI service is unavailable, previously generated meals are
+    streamed instead and the "done" event carries "fallback": true.
+    """
+    try:
+        # Check if the AI provider is configured
+        if not _provider.is_configured():
+            return jsonify({
+                'error': 'AI service is not configured. Please contact administrator.'
+            }), 503
         
-        # Generate content using Gemini
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        response = model.generate_content(
-            f"Generate {count} meal ideas based on this request: \"{prompt}\"",
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.7,
-                top_p=0.8,
-                top_k=40,
-                max_output_tokens=2048,
-            ),
-            system_instruction=system_instruction
-        )
+        data = request.get_json()
         
-        # Extract and clean the response text
-        response_text = response.text.strip()
+        prompt, count, error = _read_generation_request(data)
+        if error:
+            return error
         
-        # Remove markdown code blocks if present
-        if response_text.startswith('```json'):
-            response_text = response_text[7:]
-        if response_text.startswith('```'):
-            response_text = response_text[3:]
-        if response_text.endswith('```'):
-            response_text = response_text[:-3]
+        sse = 'text/event-stream' in request.headers.get('Accept', '')
+        user_id = int(get_jwt_identity())
         
-        response_text = response_text.strip()
+        def events():
+            sent = 0
+            try:
+                for meal in stream_ideas(prompt, count):
+                    sent += 1
+                    yield _format_stream_event('meal', meal, sse)
+                yield _format_stream_event('done', {'count': sent, 'partial': sent < count}, sse)
+            except UpstreamUnavailable as e:
+                fallback_meals = fallback_ideas(prompt, count, user_id=user_id)
+                if not fallback_meals:
+                    payload = {'error': 'AI service is temporarily unavailable', 'details': str(e)}
+                    if isinstance(e, CircuitOpenError):
+                        payload['retry_after'] = round(e.retry_after, 1)
+                    yield _format_stream_event('error', payload, sse)
+                    return
+                for meal in fallback_meals:
+                    yield _format_stream_event('meal', meal, sse)
+                yield _format_stream_event('done', {
+                    'count': len(fallback_meals),
+                    'partial': len(fallback_meals) < count,
+                    'fallback': True
+                }, sse)
+            except AIServiceError as e:
+                yield _format_stream_event('error', e.payload, sse)
+            except Exception as e:
+                yield _format_stream_event('error', {
+                    'error': 'Failed to generate meal ideas',
+                    'details': str(e)
+                }, sse)
         
-        # Parse JSON response
-        try:
-            parsed_data = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            return jsonify({
-                'error': 'Failed to parse AI response',
-                'details': f'Invalid JSON: {str(e)}',
-                'raw_response': response_text
-            }), 500
+        return Response(
+            stream_with_context(events()),
+            mimetype='text/event-stream' if sse else 'application/x-ndjson',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
         
-        # Validate response structure
-        if not isinstance(parsed_data, list):
-            return jsonify({
-                'error': 'Invalid AI response format',
-                'details': 'Expected array of meals'
-            }), 500
-        
-        # Validate each meal object
-        validated_meals = []
-        for i, meal in enumerate(parsed_data):
-            if not isinstance(meal, dict):
-                continue
-            
-            # Check required fields
-            if not all(key in meal for key in ['name', 'notes', 'ingredients']):
-                continue
-            
-            # Validate ingredients
-            if not isinstance(meal['ingredients'], list):
-                continue
-            
-            valid_ingredients = []
-            for ingredient in meal['ingredients']:
-                if isinstance(ingredient, dict) and 'name' in ingredient and 'quantity' in ingredient:
-                    valid_ingredients.append({
-                        'name': str(ingredient['name']),
-                        'quantity': str(ingredient['quantity'])
-                    })
-            
-            validated_meals.append({
-                'name': str(meal['name']),
-                'notes': str(meal['notes']),
-                'ingredients': valid_ingredients
-            })
+    except Exception as e:
+        return jsonify({
+            'error': 'Failed to generate meal ideas',
+            'details': str(e)
+        }), 500
+
+def _load_job(job_id, user_id):
+    """Fetch a job owned by the user, bypassing any stale copy in the session"""
+    return db.session.execute(
+        db.select(AIJob)
+        .where(AIJob.id == job_id, AIJob.user_id == user_id)
+        .execution_options(populate_existing=True)
+    ).scalar_one_or_none()
+
+@ai_bp.route('/generate-ideas/<job_id>', methods=['GET'])
+@jwt_required()
+def get_generation_job(job_id):
+    """
+    Get the status, and once finished the result, of an async generation job
+    
+    Headers:
+    Authorization: Bearer <jwt_token>
+    
+    Response:
+    {
+        "job_id": "3f2b...",
+        "status": "succeeded",  (queued, running, succeeded or failed)
+        "prompt": "...",
+        "count": 3,
+        "attempts": 1,
+        "created_at": "...",
+        "started_at": "...",
+        "finished_at": "...",
+        "meals": [...]          (when succeeded; "error" and "details" when failed)
+    }
+    """
+    try:
+        job = _load_job(job_id, int(get_jwt_identity()))
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
         
-        if not validated_meals:
-            return jsonify({
-                'error': 'No valid meals generated',
-                'details': 'AI response did not contain valid meal data'
-            }), 500
+        response = jsonify(job.to_dict())
+        if job.status in ('queued', 'running'):
+            response.headers['Retry-After'] = '1'
+        return response, 200
         
+    except Exception as e:
         return jsonify({
-            'meals': validated_meals
-        }), 200
+            'error': 'Failed to fetch job',
+            'details': str(e)
+        }), 500
+
+@ai_bp.route('/generate-ideas/<job_id>/events', methods=['GET'])
+@jwt_required()
+def stream_generation_job(job_id):
+    """
+    Push status changes of an async generation job as Server-Sent Events
+    
+    Headers:
+    Authorization: Bearer <jwt_token>
+    
+    Response:
+    event: status
+    data: {"job_id": "3f2b...", "status": "running"}
+    
+    event: result
+    data: {"job_id": "3f2b...", "status": "succeeded", "meals": [...], ...}
+    
+    The stream ends after the "result" event, or with a "timeout" event
+    after AI_JOB_STREAM_SECONDS.
+    """
+    try:
+        user_id = int(get_jwt_identity())
+        if not _load_job(job_id, user_id):
+            return jsonify({'error': 'Job not found'}), 404
+        
+        poll_interval = current_app.config['AI_JOB_POLL_SECONDS']
+        deadline = time.monotonic() + current_app.config['AI_JOB_STREAM_SECONDS']
+        
+        def events():
+            last_status = None
+            last_sent = time.monotonic()
+            while time.monotonic() < deadline:
+                job = _load_job(job_id, user_id)
+                db.session.rollback()
+                if job is None:
+                    yield _format_stream_event('error', {'error': 'Job not found'}, True)
+                    return
+                if job.status in ('succeeded', 'failed'):
+                    yield _format_stream_event('result', job.to_dict(), True)
+                    return
+                if job.status != last_status:
+                    last_status = job.status
+                    last_sent = time.monotonic()
+                    yield _format_stream_event('status', {'job_id': job.id, 'status': job.status}, True)
+                elif time.monotonic() - last_sent > 15:
+                    last_sent = time.monotonic()
+                    yield ': keep-alive\n\n'
+                # Woken early when a worker in this process finishes a job
+                ai_jobs.wait_for_change(poll_interval)
+            yield _format_stream_event('timeout', {'job_id': job_id, 'status': last_status}, True)
+        
+        return Response(
+            stream_with_context(events()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
         
     except Exception as e:
         return jsonify({
-            'error': 'Failed to generate meal ideas',
+            'error': 'Failed to stream job',
             'details': str(e)
         }), 500
 
@@ -188,15 +802,35 @@ def ai_health_check():
     Response:
     {
         "status": "healthy",
-        "configured": true
+        "configured": true,
+        "provider": "gemini",
+        "cache": {"memory_hits": 10, "persistent_hits": 2, "misses": 5, ...},
+        "singleflight": {"calls": 17, "leaders": 12, "coalesced": 5, ...},
+        "calls": {"calls": 12, "timeouts": 0, "hedged": 1, ...},
+        "breaker": {"state": "closed", "consecutive_failures": 0, ...},
+        "jobs": {"queued": 2, "running": 4, "wait_seconds": {"p50": 0.4, ...}, "run_seconds": {...}, ...},
+        "rate_limit": {"allowed": 120, "waited": 4, "rejected": 2},
+        "library": {"indexed": 5120, "hits": 40, "misses": 75, "stored": 210, ...}
     }
+    
+    status is "degraded" while the circuit breaker is open or half-open.
     """
     try:
-        is_configured = bool(Config.GEMINI_API_KEY)
+        is_configured = _provider.is_configured()
+        call_stats = ai_calls.stats()
+        breaker = call_stats.pop('breaker')
         
         return jsonify({
-            'status': 'healthy',
-            'configured': is_configured
+            'status': 'healthy' if breaker['state'] == 'closed' else 'degraded',
+            'configured': is_configured,
+            'provider': _provider.name,
+            'cache': ai_cache.stats(),
+            'singleflight': ai_singleflight.stats(),
+            'calls': call_stats,
+            'breaker': breaker,
+            'jobs': ai_jobs.stats(),
+            'rate_limit': limiter.stats(),
+            'library': recipe_library.stats()
         }), 200
         
     except Exception as e:
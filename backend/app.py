@@ -7,7 +7,19 @@ from models import db
 from auth import auth_bp
 from meals import meals_bp
 from groceries import groceries_bp
-from ai_service import ai_bp
+from ai_service import ai_bp, init_provider
+from ai_cache import ai_cache
+from singleflight import ai_singleflight
+from resilience import ai_calls
+from ai_jobs import ai_jobs
+from recipe_library import recipe_library
+from passwords import password_hasher
+from identity import init_identity, user_cache, token_blocklist
+from metrics import metrics
+from sqlite_profile import init_sqlite
+from json_provider import init_json
+from rate_limit import limiter
+from bulk_import import import_data_command, seed_data_command
 
 def create_app(config_name='default'):
     """
@@ -17,11 +29,36 @@ def create_app(config_name='default'):
     
     # Load configuration
     app.config.from_object(config[config_name])
+    init_json(app)
     
     # Initialize extensions
     db.init_app(app)
+    init_sqlite(app)
+    metrics.init_app(app)
     jwt = JWTManager(app)
-    migrate = Migrate(app, db)
+    init_identity(app, jwt)
+    migrate = Migrate(app, db, render_as_batch=True)  # SQLite alters tables by copying them
+    password_hasher.init_app(app)
+    ai_cache.init_app(app)
+    ai_singleflight.init_app(app)
+    ai_calls.init_app(app)
+    init_provider(app)
+    ai_jobs.init_app(app)
+    recipe_library.init_app(app)
+    
+    # Component counters exported at /metrics
+    for name, collect in {
+        'ai_calls': ai_calls.stats,
+        'ai_cache': ai_cache.stats,
+        'ai_singleflight': ai_singleflight.stats,
+        'ai_jobs': ai_jobs.stats,
+        'rate_limit': limiter.stats,
+        'recipe_library': recipe_library.stats,
+        'passwords': password_hasher.stats,
+        'user_cache': user_cache.stats,
+        'token_blocklist': token_blocklist.stats,
+    }.items():
+        metrics.register_collector(name, collect)
     
     # Configure CORS
     CORS(app, origins=app.config.get('CORS_ORIGINS', ['http://localhost:5173']))
@@ -32,6 +69,10 @@ def create_app(config_name='default'):
     app.register_blueprint(groceries_bp)
     app.register_blueprint(ai_bp)
     
+    # Bulk data commands: flask import-data, flask seed-data
+    app.cli.add_command(import_data_command)
+    app.cli.add_command(seed_data_command)
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
@@ -90,10 +131,12 @@ def create_app(config_name='default'):
                 'auth': {
                     'register': 'POST /api/auth/register',
                     'login': 'POST /api/auth/login',
-                    'profile': 'GET /api/auth/profile'
+                    'profile': 'GET /api/auth/profile',
+                    'logout': 'POST /api/auth/logout'
                 },
                 'meals': {
                     'get_plan': 'GET /api/plan',
+                    'save_plan': 'PUT /api/plan',
                     'add_meal': 'POST /api/meals',
                     'update_meal': 'PUT /api/meals/{id}',
                     'delete_meal': 'DELETE /api/meals/{id}'
@@ -103,12 +146,18 @@ def create_app(config_name='default'):
                     'add_item': 'POST /api/groceries',
                     'update_item': 'PUT /api/groceries/{id}',
                     'delete_item': 'DELETE /api/groceries/{id}',
+                    'batch': 'POST /api/groceries/batch',
+                    'generate': 'POST /api/groceries/generate',
                     'clear_purchased': 'DELETE /api/groceries/clear-purchased'
                 },
                 'ai': {
                     'generate_ideas': 'POST /api/generate-ideas',
+                    'stream_ideas': 'POST /api/generate-ideas/stream',
+                    'job_status': 'GET /api/generate-ideas/{job_id}',
+                    'job_events': 'GET /api/generate-ideas/{job_id}/events',
                     'health_check': 'GET /api/health'
-                }
+                },
+                'metrics': 'GET /metrics'
             }
         }), 200
     
@@ -1,12 +1,19 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
 from models import db, User
+from passwords import password_hasher, HasherBusy, MAX_PASSWORD_BYTES
+from identity import user_cache, token_blocklist
 import re
 
 # Create authentication blueprint
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+def _busy_response():
+    """503 telling the client to retry when the password hashing queue is full"""
+    response = jsonify({'error': 'Too many sign-in requests, please try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """
@@ -46,14 +53,21 @@ def register():
         # Validate password strength
         if len(password) < 8:
             return jsonify({'error': 'Password must be at least 8 characters long'}), 400
+        if len(password.encode()) > MAX_PASSWORD_BYTES:
+            return jsonify({'error': f'Password must be at most {MAX_PASSWORD_BYTES} bytes long'}), 400
         
         # Check if user already exists
         existing_user = User.query.filter_by(email=email).first()
         if existing_user:
             return jsonify({'error': 'User with this email already exists'}), 409
         
-        # Create new user
-        password_hash = generate_password_hash(password)
+        # End the read transaction before the slow hash: on SQLite an insert in a
+        # transaction whose snapshot another worker has since written past fails
+        # at once instead of waiting for the lock
+        db.session.commit()
+        
+        # Create new user (hashed on the password hashing pool)
+        password_hash = password_hasher.hash(password)
         new_user = User(email=email, password_hash=password_hash)
         
         db.session.add(new_user)
@@ -71,6 +85,8 @@ def register():
             'user': user_data
         }), 201
         
+    except HasherBusy:
+        return _busy_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Registration failed', 'details': str(e)}), 500
@@ -110,11 +126,20 @@ def login():
         user = User.query.filter_by(email=email).first()
         
         # Check if user exists and password is correct
-        if not user or not check_password_hash(user.password_hash, password):
+        if not user or not password_hasher.verify(user.password_hash, password):
             return jsonify({'error': 'Invalid email or password'}), 401
         
+        # Upgrade hashes made with an older algorithm or cost while the password is at hand
+        if password_hasher.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = password_hasher.rehash(password)
+                db.session.commit()
+                user_cache.invalidate(user.id)
+            except HasherBusy:
+                pass  # keep the old hash; the next login upgrades it
+        
         # Create JWT token
-        access_token = create_access_token(identity=user.id)
+        access_token = create_access_token(identity=str(user.id))
         
         # Return token and user data
         user_data = {
@@ -128,7 +153,10 @@ def login():
             'user': user_data
         }), 200
         
+    except HasherBusy:
+        return _busy_response()
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': 'Login failed', 'details': str(e)}), 500
 
 @auth_bp.route('/profile', methods=['GET'])
@@ -150,19 +178,42 @@ def get_profile():
     }
     """
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        current_user_id = int(get_jwt_identity())
         
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
+        # Served from the per-process user cache after the first request
+        user_data = user_cache.get(current_user_id)
         
-        user_data = {
-            'id': user.id,
-            'email': user.email,
-            'created_at': user.created_at.isoformat() if user.created_at else None
-        }
+        if not user_data:
+            return jsonify({'error': 'User not found'}), 404
         
         return jsonify({'user': user_data}), 200
         
     except Exception as e:
-        return jsonify({'error': 'Failed to get profile', 'details': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': 'Failed to get profile', 'details': str(e)}), 500
+
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    """
+    Revoke the access token used for this request
+    
+    Headers:
+    Authorization: Bearer <jwt_token>
+    
+    Response:
+    {
+        "message": "Logged out successfully"
+    }
+    
+    The token is rejected from then on by every worker (within
+    TOKEN_REVOCATION_SYNC_SECONDS for other processes).
+    """
+    try:
+        claims = get_jwt()
+        token_blocklist.revoke(claims['jti'], int(get_jwt_identity()), expires=claims.get('exp'))
+        
+        return jsonify({'message': 'Logged out successfully'}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Logout failed', 'details': str(e)}), 500 
\ No newline at end of file
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Measure how many meals are recovered from malformed AI responses
+
+Runs every response in tests/fixtures/ai_responses.json through the
+original strict parser (strip fences, json.loads) and the tolerant
+extraction stage, and reports the recovery rate, the number of responses
+that would still need a continuation call, and parsing throughput.
+
+Usage:
+    python benchmarks/bench_ai_parsing.py [--iterations 200]
+"""
+import argparse
+import json
+import os
+import time
+
+from common import BACKEND_DIR
+from ai_service import parse_meals, validate_meal
+
+CORPUS_PATH = os.path.join(BACKEND_DIR, 'tests', 'fixtures', 'ai_responses.json')
+
+def strict_parse(text):
+    """The parser used before tolerant extraction: fences stripped, then json.loads"""
+    text = text.strip()
+    if text.startswith('```json'):
+        text = text[7:]
+    if text.startswith('```'):
+        text = text[3:]
+    if text.endswith('```'):
+        text = text[:-3]
+    try:
+        data = json.loads(text.strip())
+    except json.JSONDecodeError:
+        return []
+    if not isinstance(data, list):
+        return []
+    return [meal for meal in map(validate_meal, data) if meal is not None]
+
+def evaluate(corpus, parser, iterations):
+    """Return (recovered, expected, short responses, microseconds per response)"""
+    recovered = expected = short = 0
+    for case in corpus:
+        names = [meal['name'] for meal in parser(case['text'])]
+        recovered += len(set(names) & set(case['expected']))
+        expected += len(case['expected'])
+        short += len(names) < case['requested']
+    
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for case in corpus:
+            parser(case['text'])
+    per_response = (time.perf_counter() - start) / (iterations * len(corpus)) * 1e6
+    return recovered, expected, short, per_response
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+    
+    with open(CORPUS_PATH, encoding='utf-8') as corpus_file:
+        corpus = json.load(corpus_file)
+    
+    print(f'{len(corpus)} responses, {sum(len(c["expected"]) for c in corpus)} recoverable meals')
+    print(f'{"parser":<10} {"recovered":>12} {"rate":>8} {"need retry":>11} {"us/resp":>9}')
+    for name, parse in (('strict', strict_parse), ('tolerant', parse_meals)):
+        recovered, expected, short, per_response = evaluate(corpus, parse, args.iterations)
+        print(f'{name:<10} {recovered:>5}/{expected:<6} {recovered / expected:>8.1%} {short:>11} {per_response:>9.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark the generate-ideas pipeline offline with the local AI provider
+
+Drives POST /api/generate-ideas (prompting, provider call, parsing and
+validation) from several threads and reports throughput and latency. Every
+request uses a distinct prompt unless --repeat is given, so the cache only
+helps when asked to. With --async the requests are queued as jobs: latency
+is then the time to get a job id, and throughput counts completed jobs.
+
+Usage:
+    python benchmarks/bench_ai_pipeline.py [--requests 200] [--concurrency 1,4,16]
+        [--latency-ms 50] [--per-meal-ms 20] [--count 3] [--parallel] [--repeat 0.0]
+        [--async] [--job-workers 16]
+"""
+import argparse
+import random
+import threading
+import time
+
+from common import make_app, auth_headers, create_user, percentile, temp_database_uri
+from ai_cache import ai_cache
+from ai_jobs import ai_jobs
+from models import db, AIJob
+
+def wait_for_jobs(app, poll=0.02):
+    """Block until no job is queued or running"""
+    with app.app_context():
+        while db.session.scalar(
+            db.select(db.func.count()).select_from(AIJob).where(AIJob.status.in_(['queued', 'running']))
+        ):
+            db.session.rollback()
+            time.sleep(poll)
+
+def run(app, headers, requests, concurrency, count, parallel, repeat, rng, run_async=False):
+    """Send requests from concurrency threads; return latencies and wall time"""
+    prompts = []
+    for i in range(requests):
+        if prompts and rng.random() < repeat:
+            prompts.append(rng.choice(prompts))
+        else:
+            prompts.append(f'quick dinner idea number {i} {rng.random()}')
+    
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    queue = list(enumerate(prompts))
+    
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                if not queue:
+                    return
+                _, prompt = queue.pop()
+            start = time.perf_counter()
+            response = client.post('/api/generate-ideas', headers=headers, json={
+                'prompt': prompt, 'count': count, 'parallel': parallel, 'async': run_async
+            })
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code != (202 if run_async else 200):
+                    errors.append(response.status_code)
+    
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if run_async:
+        wait_for_jobs(app)
+    return latencies, errors, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', default='1,4,16')
+    parser.add_argument('--latency-ms', type=int, default=50, help='Simulated fixed latency per provider call')
+    parser.add_argument('--per-meal-ms', type=int, default=20, help='Simulated latency per generated meal')
+    parser.add_argument('--count', type=int, default=3)
+    parser.add_argument('--parallel', action='store_true', help='Use parallel fan-out')
+    parser.add_argument('--repeat', type=float, default=0.0, help='Fraction of requests reusing an earlier prompt')
+    parser.add_argument('--async', dest='run_async', action='store_true', help='Queue requests as async jobs')
+    parser.add_argument('--job-workers', type=int, default=16, help='Job worker threads with --async')
+    args = parser.parse_args()
+    
+    app = make_app(
+        AI_PROVIDER='local',
+        AI_LOCAL_LATENCY_MS=args.latency_ms,
+        AI_LOCAL_LATENCY_PER_MEAL_MS=args.per_meal_ms,
+        AI_FANOUT_MAX_WORKERS=32,
+        AI_JOB_WORKERS=args.job_workers,
+        AI_JOB_AUTOSTART=args.run_async,
+        AI_JOB_POLL_SECONDS=0.05,
+        AI_RATE_LIMIT_ENABLED=False,
+        SQLALCHEMY_DATABASE_URI=temp_database_uri(),
+    )
+    
+    with app.app_context():
+        user_id = create_user('bench@example.com')
+    headers = auth_headers(app, user_id)
+    rng = random.Random(7)
+    
+    print(f"{'threads':>7} {'req/s':>8} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for concurrency in [int(value) for value in args.concurrency.split(',')]:
+        ai_cache.clear_memory()
+        latencies, errors, wall = run(app, headers, args.requests, concurrency, args.count,
+                                      args.parallel, args.repeat, rng, args.run_async)
+        print(f"{concurrency:>7} {len(latencies) / wall:>8.1f} {sum(latencies) / len(latencies):>9.2f} "
+              f"{percentile(latencies, 50):>9.2f} {percentile(latencies, 99):>9.2f} {len(errors):>7}")
+    
+    if args.run_async:
+        with app.app_context():
+            stats = ai_jobs.stats()
+        print(f"job wait p50/p95 s: {stats['wait_seconds'].get('p50')}/{stats['wait_seconds'].get('p95')}  "
+              f"run p50/p95 s: {stats['run_seconds'].get('p50')}/{stats['run_seconds'].get('p95')}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Measure bulk import throughput against row-at-a-time ORM inserts
+
+Writes --users synthetic user documents (meals with ingredients and a
+grocery history) to an NDJSON file, then loads them into fresh SQLite file
+databases:
+- orm: one ORM object per row and a commit per user, like init_db.py, on
+  the first --orm-users documents only;
+- import: bulk_import reading the NDJSON file, with indexes deferred and
+  with them kept, the second time into a database that already holds a
+  copy of the data.
+
+Usage:
+    python benchmarks/bench_bulk_import.py [--users 10000] [--orm-users 500] [--batch-size 50000]
+"""
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import time
+
+from common import make_app, temp_database_uri
+from bulk_import import import_documents, read_ndjson, synthetic_documents
+from models import db, User, Meal, Ingredient, GroceryItem
+
+def rows_in(document):
+    return 1 + len(document['groceries']) + sum(1 + len(meal['ingredients']) for meal in document['meals'])
+
+def orm_insert(documents):
+    """init_db.py style: ORM objects, committed user by user"""
+    for document in documents:
+        user = User(email=document['email'], password_hash='!')
+        db.session.add(user)
+        db.session.flush()
+        for meal_data in document['meals']:
+            meal = Meal(user_id=user.id, day_of_week=meal_data['day_of_week'], name=meal_data['name'],
+                        notes=meal_data['notes'])
+            db.session.add(meal)
+            db.session.flush()
+            for ingredient in meal_data['ingredients']:
+                db.session.add(Ingredient(meal_id=meal.id, name=ingredient['name'], quantity=ingredient['quantity']))
+        for item in document['groceries']:
+            db.session.add(GroceryItem(user_id=user.id, name=item['name'], quantity=item['quantity'],
+                                       purchased=item['purchased'], created_at=item['created_at']))
+        db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--orm-users', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=50000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='mealmate-import-'), 'users.ndjson')
+    total_rows = 0
+    with open(path, 'w') as output:
+        for _, document in synthetic_documents(args.users):
+            total_rows += rows_in(document)
+            output.write(json.dumps(document, default=str) + '\n')
+    print(f'{args.users} users, {total_rows} rows, {os.path.getsize(path) / 1e6:.0f} MB of NDJSON')
+
+    print(f"{'method':<24} {'rows':>10} {'seconds':>8} {'rows/s':>9}")
+
+    app = make_app(SQLALCHEMY_DATABASE_URI=temp_database_uri())
+    documents = [document for _, document in itertools.islice(synthetic_documents(args.orm_users), args.orm_users)]
+    rows = sum(rows_in(document) for document in documents)
+    with app.app_context():
+        start = time.perf_counter()
+        orm_insert(documents)
+        seconds = time.perf_counter() - start
+    print(f"{'orm, row at a time':<24} {rows:>10} {seconds:>8.2f} {rows / seconds:>9.0f}")
+
+    app = make_app(SQLALCHEMY_DATABASE_URI=temp_database_uri())
+    with app.app_context():
+        for label, defer in (('import, defer indexes', True), ('import, keep indexes', False)):
+            start = time.perf_counter()
+            importer = import_documents(read_ndjson(path), args.batch_size, defer_indexes=defer)
+            seconds = time.perf_counter() - start
+            print(f"{label:<24} {importer.rows:>10} {seconds:>8.2f} {importer.rows / seconds:>9.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark grocery list generation from meal plans with hundreds of ingredients
+
+Measures the in-memory parse/merge step on its own and the full
+POST /api/groceries/generate request (query count and latency).
+
+Usage:
+    python benchmarks/bench_grocery_generation.py [--iterations 20]
+"""
+import argparse
+import random
+import time
+
+from common import make_app, auth_headers, create_user, QueryCounter, time_calls, DAYS
+from sqlalchemy import insert
+from models import db, Meal, Ingredient, GroceryItem
+from quantities import QuantityAggregator, parse_quantity
+
+INGREDIENT_COUNTS = [100, 500, 2000]
+NAMES = [
+    'Onion', 'Onions', 'Garlic', 'Tomato', 'Tomatoes', 'Flour', 'Milk', 'Eggs', 'Egg', 'Butter',
+    'Olive Oil', 'Salt', 'Pepper', 'Rice', 'Chicken Breast', 'Carrots', 'Potatoes', 'Spinach',
+    'Lettuce', 'Cheddar', 'Basil', 'Lemon', 'Sugar', 'Cream', 'Pasta', 'Beef Mince', 'Tofu',
+    'Broccoli', 'Cucumber', 'Yoghurt',
+]
+QUANTITIES = [
+    '200g', '1 kg', '0.5 kg', '2', '3 pieces', '1 head', '2 cloves', '1 cup', '1/2 cup',
+    '1 1/2 cups', '2 tbsp', '1 tsp', '250 ml', '1 l', '1-2', 'a pinch', 'to taste', '½ tsp', '1 can',
+]
+
+def seed_plan(user_id, ingredient_count, rng):
+    """Insert a week of meals holding ingredient_count ingredients in total"""
+    meal_count = len(DAYS)
+    meal_ids = db.session.scalars(insert(Meal).returning(Meal.id), [
+        {'user_id': user_id, 'day_of_week': DAYS[i], 'name': f'Meal {i}', 'notes': ''}
+        for i in range(meal_count)
+    ]).all()
+    db.session.execute(insert(Ingredient), [
+        {'meal_id': meal_ids[i % meal_count], 'name': rng.choice(NAMES), 'quantity': rng.choice(QUANTITIES)}
+        for i in range(ingredient_count)
+    ])
+    db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+    
+    rng = random.Random(42)
+    app = make_app()
+    client = app.test_client()
+    
+    print(f"{'ingredients':>11} {'items':>6} {'merge ms':>9} {'queries':>8} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for ingredient_count in INGREDIENT_COUNTS:
+        with app.app_context():
+            user_id = create_user(f'bench{ingredient_count}@example.com')
+            seed_plan(user_id, ingredient_count, rng)
+            rows = db.session.execute(
+                db.select(Ingredient.name, Ingredient.quantity).join(Meal).where(Meal.user_id == user_id)
+            ).all()
+        headers = auth_headers(app, user_id)
+        
+        # In-memory parse and merge only, with a cold parser cache
+        parse_quantity.cache_clear()
+        start = time.perf_counter()
+        aggregator = QuantityAggregator()
+        for name, quantity in rows:
+            aggregator.add(name, quantity)
+        items = list(aggregator.items())
+        merge_ms = (time.perf_counter() - start) * 1000
+        
+        def generate():
+            response = client.post('/api/groceries/generate', json={'mode': 'replace'}, headers=headers)
+            assert response.status_code == 200, response.get_json()
+            return response
+        
+        with app.app_context():
+            with QueryCounter(db.engine) as counter:
+                generate()
+        
+        stats = time_calls(generate, args.iterations)
+        print(f"{ingredient_count:>11} {len(items):>6} {merge_ms:>9.2f} {counter.count:>8} "
+              f"{stats['mean_ms']:>9.2f} {stats['p50_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+
+if __name__ == '__main__':
+    main()
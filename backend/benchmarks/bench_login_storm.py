@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Measure login throughput and plan latency during a login storm
+
+Storm threads post logins back to back while one thread keeps requesting
+GET /api/plan, as a signed-in user browsing would. Each mode runs for a
+fixed duration and reports successful and rejected (503) logins per second
+and the plan request latency, for password hashing in the request threads
+(--workers 0, the behaviour before the hashing pool) and on a process pool.
+
+Usage:
+    python benchmarks/bench_login_storm.py [--storm 16] [--seconds 5] [--cost 12] [--workers 0,2]
+"""
+import argparse
+import os
+import threading
+import time
+
+from common import auth_headers, create_user, make_app, seed_meals, temp_database_uri
+from models import db, User
+from passwords import password_hasher
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else float('nan')
+
+def run(workers, args):
+    app = make_app(
+        SQLALCHEMY_DATABASE_URI=temp_database_uri(),
+        PASSWORD_HASH_WORKERS=workers,
+        PASSWORD_HASH_COST=args.cost,
+        PASSWORD_HASH_MAX_PENDING=args.max_pending,
+    )
+    with app.app_context():
+        db.session.add(User(email='storm@example.com', password_hash=password_hasher.hash('password123')))
+        db.session.commit()
+        reader_id = create_user('reader@example.com')
+        seed_meals(reader_id, 7)
+    headers = auth_headers(app, reader_id)
+
+    # Start the pool processes before measuring
+    with app.app_context():
+        password_hasher.verify(password_hasher.hash('warm-up'), 'warm-up')
+
+    stop = threading.Event()
+    logins = {200: 0, 503: 0}
+    plan_latencies = []
+    lock = threading.Lock()
+
+    def storm():
+        client = app.test_client()
+        while not stop.is_set():
+            response = client.post('/api/auth/login', json={'email': 'storm@example.com', 'password': 'password123'})
+            with lock:
+                logins[response.status_code] = logins.get(response.status_code, 0) + 1
+
+    def browse():
+        client = app.test_client()
+        while not stop.is_set():
+            start = time.perf_counter()
+            client.get('/api/plan', headers=headers)
+            plan_latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=storm) for _ in range(args.storm)] + [threading.Thread(target=browse)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    password_hasher.shutdown()
+
+    plan_latencies.sort()
+    return {
+        'ok': logins.get(200, 0) / args.seconds,
+        'rejected': logins.get(503, 0) / args.seconds,
+        'plans': len(plan_latencies) / args.seconds,
+        'p50': percentile(plan_latencies, 0.5),
+        'p99': percentile(plan_latencies, 0.99),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--storm', type=int, default=16, help='concurrent login threads')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--cost', type=int, default=12, help='bcrypt log2 rounds')
+    parser.add_argument('--workers', default=f'0,{os.cpu_count() or 1}', help='comma-separated pool sizes; 0 hashes inline')
+    parser.add_argument('--max-pending', type=int, default=32)
+    args = parser.parse_args()
+
+    print(f'{args.storm} storm threads, bcrypt cost {args.cost}, {os.cpu_count()} CPUs')
+    print(f'{"workers":>8} {"logins/s":>9} {"503/s":>7} {"plans/s":>8} {"plan p50 ms":>12} {"plan p99 ms":>12}')
+    for workers in (int(value) for value in args.workers.split(',')):
+        result = run(workers, args)
+        label = 'inline' if workers == 0 else str(workers)
+        print(f'{label:>8} {result["ok"]:>9.1f} {result["rejected"]:>7.1f} {result["plans"]:>8.1f} '
+              f'{result["p50"]:>12.1f} {result["p99"]:>12.1f}')
+
+if __name__ == '__main__':
+    main()
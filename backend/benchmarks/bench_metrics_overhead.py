@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Measure the per-request cost of the metrics instrumentation
+
+Times GET /health (no SQL) and GET /api/plan (a few SQL statements) with
+METRICS_ENABLED off and then on, and reports the mean time per request and
+the difference. The uninstrumented app runs first because the SQL event
+listeners, once registered, stay on the Engine class for the process.
+Each figure is the best of several rounds to damp scheduler noise.
+
+Because that difference is small next to run-to-run noise, the hooks
+themselves are also timed directly: one request's before/after hooks plus
+the SQL listeners for a given number of statements.
+
+Usage:
+    python benchmarks/bench_metrics_overhead.py [--requests 500] [--rounds 5]
+"""
+import argparse
+import time
+
+from flask import Response
+
+from common import auth_headers, create_user, make_app, seed_meals
+from metrics import metrics, _before_cursor_execute, _after_cursor_execute
+
+def measure(enabled, args):
+    app = make_app(METRICS_ENABLED=enabled)
+    with app.app_context():
+        user_id = create_user('metrics@example.com')
+        seed_meals(user_id, 7)
+    headers = auth_headers(app, user_id)
+    client = app.test_client()
+
+    results = {}
+    for path, request_headers in (('/health', None), ('/api/plan', headers)):
+        for _ in range(200):
+            client.get(path, headers=request_headers)
+        best = float('inf')
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                client.get(path, headers=request_headers)
+            best = min(best, (time.perf_counter() - start) / args.requests)
+        results[path] = best * 1e6
+    return results
+
+class _Connection:
+    info = {}
+
+def hook_cost(app, queries, iterations=20000):
+    """Microseconds spent in the metrics hooks for one request running this many statements"""
+    response = Response('')
+    connection = _Connection()
+    with app.test_request_context('/api/plan'):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            metrics._start_request()
+            for _ in range(queries):
+                _before_cursor_execute(connection, None, None, None, None, False)
+                _after_cursor_execute(connection, None, None, None, None, False)
+            metrics._finish_request(response)
+        return (time.perf_counter() - start) / iterations * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    disabled = measure(False, args)
+    enabled = measure(True, args)
+
+    print(f'{"endpoint":<12} {"off us/req":>11} {"on us/req":>10} {"overhead us":>12} {"overhead":>9}')
+    for path in disabled:
+        delta = enabled[path] - disabled[path]
+        print(f'{path:<12} {disabled[path]:>11.1f} {enabled[path]:>10.1f} {delta:>12.1f} {delta / disabled[path]:>9.1%}')
+
+    app = make_app(METRICS_ENABLED=True)
+    print()
+    print(f'{"statements":>10} {"hook us/req":>12}')
+    for queries in (0, 3, 10, 30):
+        print(f'{queries:>10} {hook_cost(app, queries):>12.2f}')
+
+if __name__ == '__main__':
+    main()
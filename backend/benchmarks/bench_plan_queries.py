@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Benchmark GET /api/plan query count and latency per ingredient loading strategy
+
+'core' is the column-row read path; the other strategies load model objects.
+A user has at most one meal per day, so each size is the number of meals
+stored across users (a week each); the request reads one full week.
+
+Usage:
+    python benchmarks/bench_plan_queries.py [--iterations 50]
+"""
+import argparse
+
+from common import make_app, auth_headers, seed_meal_plans, QueryCounter, time_calls, DAYS
+from models import db
+
+MEAL_COUNTS = [7, 50, 500]
+STRATEGIES = ['lazy', 'selectin', 'joined', 'subquery', 'core']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--ingredients', type=int, default=8, help='Ingredients per meal')
+    args = parser.parse_args()
+    
+    print(f"{'strategy':<10} {'meals':>6} {'users':>6} {'queries':>8} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for meal_count in MEAL_COUNTS:
+        # A fresh database per size
+        app = make_app()
+        client = app.test_client()
+        with app.app_context():
+            user_ids = seed_meal_plans(meal_count, args.ingredients)
+        headers = auth_headers(app, user_ids[0])
+        
+        def fetch():
+            response = client.get('/api/plan', headers=headers)
+            assert response.status_code == 200, response.get_json()
+            return response
+        
+        for strategy in STRATEGIES:
+            if strategy == 'core':
+                app.config['READ_PATH'] = 'core'
+            else:
+                app.config['READ_PATH'] = 'orm'
+                app.config['MEAL_INGREDIENT_LOADING'] = strategy
+            
+            with app.app_context():
+                with QueryCounter(db.engine) as counter:
+                    meals = fetch().get_json()['meals']
+                assert len(meals) == len(DAYS)
+            
+            stats = time_calls(fetch, args.iterations)
+            print(f"{strategy:<10} {meal_count:>6} {len(user_ids):>6} {counter.count:>8} "
+                  f"{stats['mean_ms']:>9.2f} {stats['p50_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+
+if __name__ == '__main__':
+    main()
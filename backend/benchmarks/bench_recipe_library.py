@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Measure recipe library loading and query latency at catalogue scale
+
+Seeds the recipes table with synthetic meals built from the local
+provider's vocabulary (each generated for a synthetic prompt), then reports
+how long the index takes to load from the database, query latency
+percentiles for prompts that hit and miss, and the share of paraphrased
+prompts the library answers without a model call.
+
+Usage:
+    python benchmarks/bench_recipe_library.py [--recipes 100000] [--queries 500]
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime
+
+from common import make_app
+from ai_providers import LocalProvider
+from models import db, Recipe
+from recipe_library import RecipeLibrary, recipe_hash
+
+STYLES = ['quick', 'vegetarian', 'family', 'spicy', 'budget', 'high protein', 'comfort', 'summer', 'winter', 'low carb']
+OCCASIONS = ['dinners', 'lunches', 'weeknight meals', 'batch cooking', 'date night', 'packed lunches']
+
+def synthetic_recipes(count, seed=7):
+    """Yield (prompt, meal) pairs with three meals per prompt"""
+    rng = random.Random(seed)
+    provider = LocalProvider
+    for i in range(0, count, 3):
+        prompt = f'{rng.choice(STYLES)} {rng.choice(STYLES)} {rng.choice(OCCASIONS)} with {rng.choice(provider.BASES).lower()} {i}'
+        for j in range(min(3, count - i)):
+            name = f'{rng.choice(provider.ADJECTIVES)} {rng.choice(provider.BASES)} {rng.choice(provider.DISHES)} {i + j}'
+            ingredients = rng.sample(provider.INGREDIENTS, 5)
+            yield prompt, {
+                'name': name,
+                'notes': f'A {name.lower()} ready in about {rng.randint(15, 60)} minutes.',
+                'ingredients': [{'name': n, 'quantity': q} for n, q in ingredients],
+            }
+
+def seed(count):
+    rows = []
+    now = datetime.utcnow()
+    prompts = []
+    for prompt, meal in synthetic_recipes(count):
+        if not prompts or prompts[-1] != prompt:
+            prompts.append(prompt)
+        rows.append({
+            'content_hash': recipe_hash(meal), 'name': meal['name'], 'notes': meal['notes'],
+            'ingredients': json.dumps(meal['ingredients']), 'prompt': prompt, 'source': 'ai', 'created_at': now,
+        })
+    for start in range(0, len(rows), 10000):
+        db.session.execute(db.insert(Recipe), rows[start:start + 10000])
+    db.session.commit()
+    return prompts
+
+def paraphrase(prompt, rng):
+    """Reorder the words and add filler, as a user retyping the request would"""
+    words = prompt.split()
+    rng.shuffle(words)
+    return 'please suggest some ' + ' '.join(words)
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipes', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    app = make_app()
+    rng = random.Random(11)
+    with app.app_context():
+        start = time.perf_counter()
+        prompts = seed(args.recipes)
+        print(f'seeded {args.recipes} recipes in {time.perf_counter() - start:.2f}s')
+
+        library = RecipeLibrary()
+        library.init_app(app)
+        start = time.perf_counter()
+        library.refresh(force=True)
+        stats = library.stats()
+        print(f'index load: {time.perf_counter() - start:.2f}s ({stats["indexed"]} recipes, {stats["vocabulary"]} terms)')
+
+        queries = [('hit', paraphrase(rng.choice(prompts), rng)) for _ in range(args.queries)]
+        queries += [('miss', f'{rng.choice(STYLES)} {rng.choice(OCCASIONS)} with tempeh') for _ in range(args.queries)]
+        latencies = {'hit': [], 'miss': []}
+        answered = {'hit': 0, 'miss': 0}
+        for kind, query in queries:
+            start = time.perf_counter()
+            meals = library.match(query, 3)
+            latencies[kind].append((time.perf_counter() - start) * 1000)
+            answered[kind] += meals is not None
+
+    print(f'{"queries":<10} {"n":>6} {"answered":>9} {"p50 ms":>8} {"p99 ms":>8}')
+    for kind, values in latencies.items():
+        values.sort()
+        print(f'{kind:<10} {len(values):>6} {answered[kind] / len(values):>9.1%} '
+              f'{percentile(values, 0.5):>8.2f} {percentile(values, 0.99):>8.2f}')
+
+if __name__ == '__main__':
+    main()
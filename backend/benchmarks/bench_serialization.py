@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark building and encoding a large grocery list per read path and JSON encoder
+
+For each READ_PATH ('orm': model objects and to_dict(), 'core': column
+rows) and JSON_PROVIDER ('stdlib', 'orjson'), measures:
+- build: fetching the list and turning it into response dicts;
+- encode: the JSON response for those dicts;
+- the full GET /api/groceries request, in-process.
+
+Usage:
+    python benchmarks/bench_serialization.py [--items 1000] [--iterations 50]
+"""
+import argparse
+import time
+
+from common import make_app, auth_headers, create_user, seed_grocery_items, time_calls
+from groceries import _grocery_page, _items_data
+from json_provider import init_json, orjson
+
+READ_PATHS = ['orm', 'core']
+
+def mean_ms(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) * 1000 / iterations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    app = make_app()
+    client = app.test_client()
+    with app.app_context():
+        user_id = create_user('bench@example.com')
+        seed_grocery_items(user_id, args.items)
+    headers = auth_headers(app, user_id)
+
+    providers = ['stdlib', 'orjson'] if orjson is not None else ['stdlib']
+    print(f"{args.items} grocery items")
+    print(f"{'read path':<10} {'encoder':<8} {'build ms':>9} {'encode ms':>10} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for read_path in READ_PATHS:
+        for provider in providers:
+            app.config['READ_PATH'] = read_path
+            app.config['JSON_PROVIDER'] = provider
+            init_json(app)
+
+            with app.test_request_context():
+                data = _items_data(_grocery_page(user_id))
+                build = mean_ms(lambda: _items_data(_grocery_page(user_id)), args.iterations)
+                encode = mean_ms(lambda: app.json.response({'grocery_items': data}), args.iterations)
+
+            def fetch():
+                response = client.get('/api/groceries', headers=headers)
+                assert response.status_code == 200, response.get_json()
+
+            stats = time_calls(fetch, args.iterations)
+            print(f"{read_path:<10} {provider:<8} {build:>9.2f} {encode:>10.2f} "
+                  f"{stats['mean_ms']:>9.2f} {stats['p50_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+
+if __name__ == '__main__':
+    main()
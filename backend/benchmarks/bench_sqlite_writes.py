@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Measure write throughput on one SQLite file from several worker processes
+
+Seeds --users users with a week of meals and a grocery list into a fresh
+SQLite file, then starts N worker processes (like gunicorn workers), each
+with its own app and engine. Every worker runs a mix of grocery toggles and
+meal edits as random users for --duration seconds. Runs once per worker
+count and SQLite profile:
+- default: the sqlite3 driver's deferred transactions, rollback journal;
+- production: WAL, synchronous=NORMAL, busy_timeout and BEGIN IMMEDIATE
+  for write endpoints (see sqlite_profile.py).
+
+Failed writes (500s, almost always "database is locked") are counted
+separately and excluded from the throughput and latency figures.
+
+Usage:
+    python benchmarks/bench_sqlite_writes.py [--workers 1,2,4,8,16] [--duration 5] [--users 50]
+"""
+import argparse
+import logging
+import multiprocessing
+import random
+import time
+
+from common import (make_app, temp_database_uri, auth_headers, create_user, seed_meals,
+                    seed_grocery_items, percentile)
+from models import db, Meal, GroceryItem
+
+PROFILES = ['default', 'production']
+
+def seed(uri, users):
+    app = make_app(SQLALCHEMY_DATABASE_URI=uri)
+    with app.app_context():
+        for i in range(users):
+            user_id = create_user(f'writer{i}@example.com')
+            seed_meals(user_id, 7, ingredients_per_meal=4)
+            seed_grocery_items(user_id, 20)
+        meals = {}
+        for meal_id, user_id in db.session.execute(db.select(Meal.id, Meal.user_id)):
+            meals.setdefault(user_id, []).append(meal_id)
+        items = {}
+        for item_id, user_id in db.session.execute(db.select(GroceryItem.id, GroceryItem.user_id)):
+            items.setdefault(user_id, []).append(item_id)
+        db.engine.dispose()
+    return meals, items
+
+def worker(uri, profile, meals, items, start_at, duration, results, seed_value):
+    app = make_app(SQLALCHEMY_DATABASE_URI=uri, SQLITE_PROFILE=profile, AI_PROVIDER='local')
+    app.logger.setLevel(logging.ERROR)  # recipe library lock warnings would flood the table
+    client = app.test_client()
+    rng = random.Random(seed_value)
+    headers = {user_id: auth_headers(app, user_id) for user_id in meals}
+    user_ids = list(meals)
+    latencies, errors = [], 0
+
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        user_id = rng.choice(user_ids)
+        start = time.perf_counter()
+        if rng.random() < 0.7:
+            response = client.put(f'/api/groceries/{rng.choice(items[user_id])}',
+                                  json={'purchased': rng.random() < 0.5}, headers=headers[user_id])
+        else:
+            response = client.put(f'/api/meals/{rng.choice(meals[user_id])}',
+                                  json={'notes': f'edited {rng.random():.6f}'}, headers=headers[user_id])
+        if response.status_code == 200:
+            latencies.append((time.perf_counter() - start) * 1000)
+        else:
+            errors += 1
+    results.put((latencies, errors))
+
+def run(uri, profile, workers, meals, items, duration):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    # Leave time for the workers to import and build their apps before the clock starts
+    start_at = time.time() + 2.0 + 0.2 * workers
+    processes = [context.Process(target=worker, args=(uri, profile, meals, items, start_at, duration, results, n))
+                 for n in range(workers)]
+    for process in processes:
+        process.start()
+    latencies, errors = [], 0
+    for _ in processes:
+        worker_latencies, worker_errors = results.get()
+        latencies.extend(worker_latencies)
+        errors += worker_errors
+    for process in processes:
+        process.join()
+    return latencies, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4,8,16', help='comma separated worker process counts')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds of load per run')
+    parser.add_argument('--users', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'profile':<12} {'workers':>7} {'writes/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for count in [int(value) for value in args.workers.split(',')]:
+        for profile in PROFILES:
+            uri = temp_database_uri()
+            meals, items = seed(uri, args.users)
+            latencies, errors = run(uri, profile, count, meals, items, args.duration)
+            print(f'{profile:<12} {count:>7} {len(latencies) / args.duration:>9.0f} '
+                  f'{percentile(latencies, 50):>8.1f} {percentile(latencies, 99):>8.1f} {errors:>7}')
+
+if __name__ == '__main__':
+    main()
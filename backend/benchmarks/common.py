@@ -0,0 +1,151 @@
+"""
+Shared helpers for the MealMate benchmark scripts
+
+The benchmarks run the Flask app in-process against an in-memory SQLite
+database, so they need no running server and no network access.
+"""
+import os
+import sys
+import tempfile
+import time
+
+# Benchmarks live one level below the backend modules
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, insert
+from app import create_app
+from config import config
+from models import db, User, Meal, Ingredient, GroceryItem
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+def make_app(config_name='testing', **overrides):
+    """
+    Create an app with empty tables and optional config overrides
+    
+    Overrides are applied through a config subclass so that extensions
+    initialised in create_app (database engine, AI provider, caches) see them.
+    """
+    base = config[config_name]
+    config['benchmark'] = type('BenchmarkConfig', (base,), overrides)
+    app = create_app('benchmark')
+    with app.app_context():
+        db.create_all()
+    return app
+
+def temp_database_uri():
+    """SQLite file URI in a fresh temporary directory, for multi-threaded benchmarks"""
+    return 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='mealmate-bench-'), 'bench.db')
+
+def auth_headers(app, user_id):
+    """Build Authorization headers for the given user id"""
+    with app.app_context():
+        token = create_access_token(identity=str(user_id))
+    return {'Authorization': f'Bearer {token}'}
+
+def create_user(email):
+    """Insert a user row and return its id (requires an app context)"""
+    user = User(email=email, password_hash='benchmark')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def seed_meals(user_id, meal_count, ingredients_per_meal=8):
+    """Bulk insert meals with ingredients for a user, one per day from Monday (requires an app context)"""
+    if meal_count > len(DAYS):
+        raise ValueError(f'A user has at most {len(DAYS)} meals, one per day')
+    meal_rows = [
+        {
+            'user_id': user_id,
+            'day_of_week': DAYS[i % len(DAYS)],
+            'name': f'Meal {i}',
+            'notes': f'Benchmark meal number {i}',
+        }
+        for i in range(meal_count)
+    ]
+    meal_ids = db.session.scalars(insert(Meal).returning(Meal.id), meal_rows).all()
+    ingredient_rows = [
+        {'meal_id': meal_id, 'name': f'Ingredient {j}', 'quantity': f'{(j + 1) * 50}g'}
+        for meal_id in meal_ids
+        for j in range(ingredients_per_meal)
+    ]
+    if ingredient_rows:
+        db.session.execute(insert(Ingredient), ingredient_rows)
+    db.session.commit()
+    return meal_ids
+
+def seed_meal_plans(meal_count, ingredients_per_meal=8, prefix='bench'):
+    """
+    Spread meal_count meals over as many users as needed, a week each
+    (requires an app context); returns the user ids, fullest week first
+    """
+    user_ids = []
+    for start in range(0, meal_count, len(DAYS)):
+        user_id = create_user(f'{prefix}{len(user_ids)}@example.com')
+        seed_meals(user_id, min(len(DAYS), meal_count - start), ingredients_per_meal)
+        user_ids.append(user_id)
+    return user_ids
+
+def seed_grocery_items(user_id, item_count):
+    """Bulk insert grocery items for a user (requires an app context)"""
+    rows = [
+        {
+            'user_id': user_id,
+            'name': f'Item {i}',
+            'quantity': f'{i % 5 + 1}',
+            'purchased': i % 3 == 0,
+        }
+        for i in range(item_count)
+    ]
+    if rows:
+        db.session.execute(insert(GroceryItem), rows)
+    db.session.commit()
+
+class QueryCounter:
+    """Count SQL statements and the time spent executing them on the app engine"""
+    
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self.elapsed = 0.0
+        self._started = []
+    
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        self._started.append(time.perf_counter())
+    
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.elapsed += time.perf_counter() - self._started.pop()
+    
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._before)
+        event.listen(self.engine, 'after_cursor_execute', self._after)
+        return self
+    
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._before)
+        event.remove(self.engine, 'after_cursor_execute', self._after)
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def time_calls(func, iterations):
+    """Call func repeatedly and return latency statistics in milliseconds"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'mean_ms': sum(samples) / len(samples),
+        'p50_ms': percentile(samples, 50),
+        'p99_ms': percentile(samples, 99),
+    }
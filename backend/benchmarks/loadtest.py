@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Load test the API with a synthetic data set and a mix of user actions
+
+Seeds --users users through bulk inserts. Each user gets a week of meals
+with ingredients and a grocery history spread over the last few months,
+most of it already purchased. Then --concurrency threads send a weighted
+mix of requests as random users until --duration seconds have passed:
+
+    plan       GET  /api/plan
+    groceries  GET  /api/groceries
+    toggle     PUT  /api/groceries/<id>    (purchased on or off)
+    edit       PUT  /api/meals/<id>        (new name and ingredients)
+    ai         POST /api/generate-ideas    (local provider, prompts from a fixed pool)
+
+Targets:
+    inprocess  the app in this process through the Flask test client (default)
+    gunicorn   a gunicorn server started for the run (--gunicorn-workers, --gunicorn-threads)
+    <URL>      a running server. It must use the same --database-url, AI_PROVIDER=local,
+               METRICS_SERVER_TIMING=true and the JWT_SECRET_KEY from this environment
+
+Throughput and latency percentiles are reported overall and per action.
+DB time per action comes from each response's Server-Timing header
+(METRICS_SERVER_TIMING). Samples from the first --warmup seconds are
+dropped. The JSON report, which includes the git commit, goes to --output.
+--compare prints the changes against an earlier report.
+
+Usage:
+    python benchmarks/loadtest.py [--users 200] [--concurrency 8] [--duration 20] [--warmup 2]
+        [--mix plan=50,groceries=15,toggle=15,edit=15,ai=5] [--ai-latency-ms 50]
+        [--target inprocess|gunicorn|http://host:port] [--gunicorn-workers 2] [--gunicorn-threads 1]
+        [--database-url sqlite:///...] [--output report.json] [--compare baseline.json] [--seed 1]
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from common import BACKEND_DIR, DAYS, auth_headers, make_app, percentile, temp_database_uri
+from sqlalchemy import insert
+from ai_providers import LocalProvider
+from models import db, User, Meal, Ingredient, GroceryItem
+
+ACTIONS = {
+    'plan': 'GET /api/plan',
+    'groceries': 'GET /api/groceries',
+    'toggle': 'PUT /api/groceries/<id>',
+    'edit': 'PUT /api/meals/<id>',
+    'ai': 'POST /api/generate-ideas',
+}
+DEFAULT_MIX = 'plan=50,groceries=15,toggle=15,edit=15,ai=5'
+
+PROMPTS = [
+    'quick vegetarian dinners', 'high protein lunches', 'meals for a family of four', 'cheap student meals',
+    'dairy free comfort food', 'spicy weeknight curries', 'light summer salads', 'batch cooking for the week',
+    'one pot meals', 'kid friendly dinners', 'low carb dinners', 'meals with leftover chicken',
+]
+SERVER_TIMING_RE = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+USERS_PER_BATCH = 500
+
+def parse_mix(text):
+    """Parse 'plan=50,ai=5' into {action: weight}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ACTIONS:
+            raise SystemExit(f'Unknown action {name!r}; choose from {", ".join(ACTIONS)}')
+        mix[name] = float(weight or 1)
+    return mix
+
+def meal_name(rng):
+    return f'{rng.choice(LocalProvider.ADJECTIVES)} {rng.choice(LocalProvider.BASES)} {rng.choice(LocalProvider.DISHES)}'
+
+def ingredient_list(rng):
+    return [{'name': name, 'quantity': quantity}
+            for name, quantity in rng.sample(LocalProvider.INGREDIENTS, rng.randint(4, 10))]
+
+def seed_dataset(app, users, rng, tag):
+    """
+    Bulk insert users with a week of meals and a grocery history
+
+    Returns one dict per user with its id, meal ids and grocery item ids.
+    Users are inserted in batches so memory stays flat for large runs.
+    """
+    seeded = []
+    counts = {'users': 0, 'meals': 0, 'ingredients': 0, 'grocery_items': 0}
+    now = datetime.utcnow()
+    with app.app_context():
+        for first in range(0, users, USERS_PER_BATCH):
+            user_rows = [{'email': f'load-{tag}-{i}@example.com', 'password_hash': 'loadtest'}
+                         for i in range(first, min(users, first + USERS_PER_BATCH))]
+            user_ids = db.session.scalars(
+                insert(User).returning(User.id, sort_by_parameter_order=True), user_rows
+            ).all()
+
+            meal_rows = []
+            for user_id in user_ids:
+                for day in rng.sample(DAYS, rng.randint(4, 7)):
+                    meal_rows.append({'user_id': user_id, 'day_of_week': day, 'name': meal_name(rng),
+                                      'notes': rng.choice(['', 'Make extra for lunch', 'Prep the night before'])})
+            meals = db.session.execute(
+                insert(Meal).returning(Meal.id, Meal.user_id, sort_by_parameter_order=True), meal_rows
+            ).all()
+            ingredient_rows = [dict(ingredient, meal_id=meal.id) for meal in meals for ingredient in ingredient_list(rng)]
+            db.session.execute(insert(Ingredient), ingredient_rows)
+
+            grocery_rows = []
+            for user_id in user_ids:
+                for _ in range(rng.randint(20, 80)):
+                    age = timedelta(days=rng.uniform(0, 90))
+                    name, quantity = rng.choice(LocalProvider.INGREDIENTS)
+                    grocery_rows.append({'user_id': user_id, 'name': name, 'quantity': quantity,
+                                         'purchased': age > timedelta(days=7) or rng.random() < 0.3,
+                                         'created_at': now - age, 'updated_at': now - age})
+            groceries = db.session.execute(
+                insert(GroceryItem).returning(GroceryItem.id, GroceryItem.user_id, sort_by_parameter_order=True),
+                grocery_rows
+            ).all()
+            db.session.commit()
+
+            by_user = {user_id: {'id': user_id, 'meals': [], 'groceries': []} for user_id in user_ids}
+            for meal in meals:
+                by_user[meal.user_id]['meals'].append(meal.id)
+            for item in groceries:
+                by_user[item.user_id]['groceries'].append(item.id)
+            seeded.extend(by_user.values())
+            counts['users'] += len(user_ids)
+            counts['meals'] += len(meals)
+            counts['ingredients'] += len(ingredient_rows)
+            counts['grocery_items'] += len(groceries)
+    return seeded, counts
+
+def build_request(action, user, rng):
+    """(method, path, JSON body) for one action by one user"""
+    if action == 'plan':
+        return 'GET', '/api/plan', None
+    if action == 'groceries':
+        return 'GET', '/api/groceries', None
+    if action == 'toggle':
+        return 'PUT', f"/api/groceries/{rng.choice(user['groceries'])}", {'purchased': rng.random() < 0.5}
+    if action == 'edit':
+        return 'PUT', f"/api/meals/{rng.choice(user['meals'])}", {
+            'name': meal_name(rng), 'notes': 'Edited during load test', 'ingredients': ingredient_list(rng)}
+    return 'POST', '/api/generate-ideas', {'prompt': rng.choice(PROMPTS), 'count': 3}
+
+class InProcessTarget:
+    """Sends requests to the app through a Flask test client per thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def send(self, method, path, body, headers):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body, headers=headers)
+        response.get_data()
+        return response.status_code, response.headers.get('Server-Timing')
+
+class HTTPTarget:
+    """Sends requests over HTTP with one connection per thread"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self._local = threading.local()
+
+    def send(self, method, path, body, headers):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        headers = dict(headers, **{'Content-Type': 'application/json'})
+        try:
+            connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self._local.connection = None
+            return 0, None
+        return response.status, response.getheader('Server-Timing')
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_until_healthy(target, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if target.send('GET', '/health', None, {})[0] == 200:
+            return
+        time.sleep(0.2)
+    raise SystemExit('Server did not become healthy')
+
+def start_gunicorn(args, environment):
+    port = free_port()
+    command = [
+        sys.executable, '-m', 'gunicorn', 'wsgi:app',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(args.gunicorn_workers),
+        '--threads', str(args.gunicorn_threads),
+        '--log-level', 'warning',
+    ]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=dict(os.environ, **environment))
+    return process, f'http://127.0.0.1:{port}'
+
+def run_load(target, users, headers, mix, args):
+    """Drive the mix from args.concurrency threads; return the samples after warm-up and the measured seconds"""
+    actions = list(mix)
+    weights = [mix[action] for action in actions]
+    samples = []
+    lock = threading.Lock()
+    started = time.perf_counter()
+    measure_from = started + args.warmup
+    stop_at = measure_from + args.duration
+
+    def worker(index):
+        rng = random.Random(args.seed * 1000 + index)
+        recorded = []
+        while True:
+            request_started = time.perf_counter()
+            if request_started >= stop_at:
+                break
+            user = rng.choice(users)
+            action = rng.choices(actions, weights)[0]
+            method, path, body = build_request(action, user, rng)
+            status, server_timing = target.send(method, path, body, headers[user['id']])
+            latency = time.perf_counter() - request_started
+            if request_started >= measure_from:
+                match = SERVER_TIMING_RE.fullmatch(server_timing or '')
+                recorded.append((action, status, latency * 1000,
+                                 float(match.group(1)) if match else None,
+                                 int(match.group(2)) if match else None))
+        with lock:
+            samples.extend(recorded)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, min(time.perf_counter(), stop_at) - measure_from
+
+def summarize(samples, seconds):
+    """Throughput, latency and DB time statistics for a list of samples"""
+    latencies = [sample[2] for sample in samples]
+    db_times = [sample[3] for sample in samples if sample[3] is not None]
+    queries = [sample[4] for sample in samples if sample[4] is not None]
+    errors = sum(1 for sample in samples if not 200 <= sample[1] < 400)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'throughput_rps': round(len(samples) / seconds, 2) if seconds > 0 else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p90_ms': round(percentile(latencies, 90), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(max(latencies), 3) if latencies else None,
+        'db_mean_ms': round(sum(db_times) / len(db_times), 3) if db_times else None,
+        'db_p99_ms': round(percentile(db_times, 99), 3) if db_times else None,
+        'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_table(report):
+    print(f"{'action':<10} {'route':<26} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+          f"{'db ms':>7} {'queries':>7} {'errors':>6}")
+    rows = list(report['actions'].items()) + [('all', report['summary'])]
+    for action, stats in rows:
+        db_ms = f"{stats['db_mean_ms']:.2f}" if stats['db_mean_ms'] is not None else '-'
+        queries = f"{stats['queries_mean']:.1f}" if stats['queries_mean'] is not None else '-'
+        print(f"{action:<10} {ACTIONS.get(action, ''):<26} {stats['throughput_rps']:>8.1f} {stats['p50_ms']:>8.2f} "
+              f"{stats['p90_ms']:>8.2f} {stats['p99_ms']:>8.2f} {db_ms:>7} {queries:>7} {stats['errors']:>6}")
+
+def print_comparison(report, baseline):
+    """Per-action change in throughput and latency against an earlier report"""
+    print(f"\nagainst {baseline['meta'].get('commit') or 'baseline'}:")
+    print(f"{'action':<10} {'req/s':>16} {'p50 ms':>18} {'p99 ms':>18}")
+    rows = [(action, stats, baseline['actions'].get(action)) for action, stats in report['actions'].items()]
+    rows.append(('all', report['summary'], baseline['summary']))
+    for action, stats, old in rows:
+        if not old:
+            continue
+        cells = []
+        for key, width in (('throughput_rps', 16), ('p50_ms', 18), ('p99_ms', 18)):
+            change = (stats[key] - old[key]) / old[key] if old[key] else 0.0
+            cells.append(f'{old[key]:.1f}->{stats[key]:.1f} {change:+.0%}'.rjust(width))
+        print(f"{action:<10} {' '.join(cells)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=2, help='Seconds of load before measuring')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Action weights')
+    parser.add_argument('--ai-latency-ms', type=int, default=50, help='Simulated latency per local provider call')
+    parser.add_argument('--target', default='inprocess', help='inprocess, gunicorn or the URL of a running server')
+    parser.add_argument('--gunicorn-workers', type=int, default=2)
+    parser.add_argument('--gunicorn-threads', type=int, default=1)
+    parser.add_argument('--database-url', help='Database to seed (default: a new SQLite file)')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--compare', help='Earlier JSON report to compare against')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    external = args.target not in ('inprocess', 'gunicorn')
+    if external and not args.database_url:
+        raise SystemExit('--database-url (the server\'s database) is required with a server URL')
+    database_url = args.database_url or temp_database_uri()
+    jwt_secret = os.environ.get('JWT_SECRET_KEY') if external else secrets.token_hex(16)
+    if not jwt_secret:
+        raise SystemExit('Set JWT_SECRET_KEY to the server\'s secret to sign tokens for it')
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'JWT_SECRET_KEY': jwt_secret,
+        'AI_PROVIDER': 'local',
+        'AI_LOCAL_LATENCY_MS': args.ai_latency_ms,
+        'AI_RATE_LIMIT_ENABLED': False,
+        'AI_JOB_AUTOSTART': False,
+        'METRICS_SERVER_TIMING': True,
+        'METRICS_TOKEN': secrets.token_hex(16),  # production refuses to start metrics without one
+        'PASSWORD_HASH_WORKERS': 0,
+    }
+    app = make_app('production', **settings)
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    users, counts = seed_dataset(app, args.users, rng, secrets.token_hex(4))
+    seed_seconds = time.perf_counter() - started
+    headers = {user['id']: auth_headers(app, user['id']) for user in users}
+    print(f"seeded {counts['users']} users, {counts['meals']} meals, {counts['ingredients']} ingredients, "
+          f"{counts['grocery_items']} grocery items in {seed_seconds:.1f}s", file=sys.stderr)
+
+    server = None
+    if args.target == 'inprocess':
+        target = InProcessTarget(app)
+    else:
+        url = args.target
+        if args.target == 'gunicorn':
+            server, url = start_gunicorn(args, {
+                'DATABASE_URL': database_url,
+                'JWT_SECRET_KEY': jwt_secret,
+                'AI_PROVIDER': 'local',
+                'AI_LOCAL_LATENCY_MS': str(args.ai_latency_ms),
+                'AI_RATE_LIMIT_ENABLED': 'false',
+                'AI_JOB_AUTOSTART': 'false',
+                'METRICS_SERVER_TIMING': 'true',
+            })
+        target = HTTPTarget(url)
+    try:
+        wait_until_healthy(target)
+        samples, seconds = run_load(target, users, headers, mix, args)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'config': {
+            'target': 'url' if external else args.target,
+            'gunicorn_workers': args.gunicorn_workers if args.target == 'gunicorn' else None,
+            'gunicorn_threads': args.gunicorn_threads if args.target == 'gunicorn' else None,
+            'database': database_url.split(':', 1)[0],
+            'users': args.users,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'mix': mix,
+            'ai_latency_ms': args.ai_latency_ms,
+            'seed': args.seed,
+        },
+        'dataset': dict(counts, seed_seconds=round(seed_seconds, 2)),
+        'summary': summarize(samples, seconds),
+        'actions': {action: summarize([sample for sample in samples if sample[0] == action], seconds)
+                    for action in mix},
+    }
+
+    print_table(report)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+            output.write('\n')
+    if args.compare:
+        with open(args.compare) as baseline:
+            print_comparison(report, json.load(baseline))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,496 @@
+"""
+Bulk import of users, meals and grocery items
+
+Streams NDJSON or CSV records into the database in large batches through
+SQLAlchemy Core executemany, instead of one ORM object per row:
+- users and meals need their new ids for the rows that follow them. On
+  SQLite the batch takes the write lock (BEGIN IMMEDIATE) and numbers them
+  from the current maximum, because SQLAlchemy can only return ordered ids
+  there one row per statement; elsewhere they use ordered RETURNING;
+- ingredients and grocery items, most of the rows, go to the DB-API
+  cursor's executemany directly, skipping SQLAlchemy's per-row parameter
+  handling, which costs more than the insert itself at these volumes;
+- every batch is one transaction, so memory and the journal stay bounded
+  and an interrupted import keeps the batches already committed.
+
+Records are matched to users by email. A record for an email that already
+exists (in the database or earlier in the input) adds its meals and grocery
+items to that user, and bumps the user's plan and grocery versions so
+cached responses are refreshed. A user has at most one meal per day: meals
+for a day that is already taken are skipped and reported.
+
+NDJSON lines are user documents:
+    {"email": "a@example.com", "password_hash": "$2b$12$...",
+     "meals": [{"day_of_week": "Monday", "name": "Curry", "notes": "",
+                "ingredients": [{"name": "Rice", "quantity": "200g"}]}],
+     "groceries": [{"name": "Milk", "quantity": "1L", "purchased": false}]}
+
+CSV files hold one kind of row, chosen with --kind:
+    users:     email,password_hash
+    meals:     email,day_of_week,name,notes,ingredients   (ingredients as "Rice=200g;Onion=1")
+    groceries: email,name,quantity,purchased
+
+A plain-text "password" is hashed with the configured password hasher,
+which is slow; migrations should carry the existing "password_hash".
+Users with neither cannot log in until they reset their password.
+
+Usage:
+    flask --app app import-data customers.ndjson.gz
+    flask --app app import-data meals.csv --kind meals
+    flask --app app seed-data --users 100000
+"""
+import csv
+import gzip
+import io
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert, select, update
+
+from meals import VALID_DAYS
+from models import db, User, Meal, Ingredient, GroceryItem
+from passwords import password_hasher
+from sqlite_profile import immediate_transaction
+
+UNUSABLE_PASSWORD_HASH = '!'  # matches no password
+
+USER_COLUMNS = ('email', 'password_hash', 'created_at', 'plan_version', 'plan_modified_at',
+                'groceries_version', 'groceries_modified_at')
+MEAL_COLUMNS = ('user_id', 'day_of_week', 'name', 'notes', 'created_at', 'updated_at')
+
+# Bit per day, for the days on which each user already has a meal
+DAY_BITS = {day: 1 << position for position, day in enumerate(VALID_DAYS)}
+
+# Tables whose secondary indexes are dropped during the load and rebuilt after it
+DEFERRED_INDEX_TABLES = (Meal.__table__, Ingredient.__table__, GroceryItem.__table__)
+
+class InvalidRecord(ValueError):
+    """A record that cannot be imported"""
+
+def _parse_datetime(value):
+    """ISO 8601 timestamp to a naive UTC datetime, as the columns store them"""
+    if not value:
+        return None
+    if not isinstance(value, datetime):
+        value = str(value)
+        try:
+            value = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+        except ValueError:
+            raise InvalidRecord(f'invalid timestamp {value!r}')
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+def _require(record, field):
+    value = record.get(field)
+    value = value.strip() if isinstance(value, str) else str(value).strip() if value is not None else ''
+    if not value:
+        raise InvalidRecord(f'missing {field}')
+    return value
+
+def deferred_indexes():
+    """Non-unique indexes of the bulk-loaded tables (unique ones keep enforcing their constraint)"""
+    return [index for table in DEFERRED_INDEX_TABLES for index in table.indexes if not index.unique]
+
+class BulkImporter:
+    """
+    Buffers user documents and writes them in batches of about batch_size rows
+
+    Call add() for each record and finish() at the end; progress(rows,
+    seconds) is called after every committed batch.
+    """
+
+    def __init__(self, connection, batch_size=50000, progress=None):
+        self.connection = connection
+        self.reserve_ids = connection.dialect.name == 'sqlite'
+        self.batch_size = batch_size
+        self.progress = progress
+        self.counts = {'users': 0, 'meals': 0, 'ingredients': 0, 'grocery_items': 0, 'skipped': 0}
+        self.errors = []  # (source position, message) of skipped records, first 20 only
+        with connection.begin():
+            self._user_ids = dict(connection.execute(select(User.email, User.id)).all())
+        self._meal_days = {}  # user id -> DAY_BITS of the days taken, for users seen so far
+        self._pending = []
+        self._pending_rows = 0
+        self._started = time.perf_counter()
+
+    @property
+    def rows(self):
+        return sum(count for name, count in self.counts.items() if name != 'skipped')
+
+    def add(self, record, position=None):
+        """Validate one user document and queue it; invalid records are counted and skipped"""
+        try:
+            document = self._normalize(record)
+        except (InvalidRecord, AttributeError, TypeError) as e:  # the latter two for wrongly shaped JSON
+            self._skip(position, str(e))
+            return
+        document['position'] = position
+        self._pending.append(document)
+        self._pending_rows += 1 + len(document['groceries']) + sum(1 + len(meal['ingredients']) for meal in document['meals'])
+        if self._pending_rows >= self.batch_size:
+            self.flush()
+
+    def _skip(self, position, message):
+        self.counts['skipped'] += 1
+        if len(self.errors) < 20:
+            self.errors.append((position, message))
+
+    def _normalize(self, record):
+        if isinstance(record, ValueError):
+            raise InvalidRecord(f'invalid JSON: {record}')
+        if not isinstance(record, dict):
+            raise InvalidRecord('record is not an object')
+        email = _require(record, 'email').lower()
+        meals = []
+        for meal in record.get('meals') or []:
+            day = _require(meal, 'day_of_week')
+            if day not in VALID_DAYS:
+                raise InvalidRecord(f'invalid day_of_week {day!r}')
+            if any(other['day_of_week'] == day for other in meals):
+                raise InvalidRecord(f'more than one meal on {day}')
+            ingredients = []
+            for ingredient in meal.get('ingredients') or []:
+                # Inlined string fast path: this loop sees most of the rows of an import
+                name, quantity = ingredient.get('name'), ingredient.get('quantity')
+                name = name.strip() if type(name) is str else _require(ingredient, 'name')
+                quantity = quantity.strip() if type(quantity) is str else _require(ingredient, 'quantity')
+                if not name or not quantity:
+                    raise InvalidRecord('missing ingredient name or quantity')
+                ingredients.append((name, quantity))
+            meals.append({'day_of_week': day, 'name': _require(meal, 'name'), 'notes': meal.get('notes') or '',
+                          'created_at': _parse_datetime(meal.get('created_at')), 'ingredients': ingredients})
+        groceries = []
+        for item in record.get('groceries') or []:
+            name, quantity, purchased = item.get('name'), item.get('quantity'), item.get('purchased', False)
+            name = name.strip() if type(name) is str else _require(item, 'name')
+            quantity = quantity.strip() if type(quantity) is str else _require(item, 'quantity')
+            if not name or not quantity:
+                raise InvalidRecord('missing grocery item name or quantity')
+            groceries.append((name, quantity, purchased if type(purchased) is bool else _parse_bool(purchased),
+                              _parse_datetime(item.get('created_at'))))
+        return {'email': email, 'password_hash': record.get('password_hash'), 'password': record.get('password'),
+                'created_at': _parse_datetime(record.get('created_at')), 'meals': meals, 'groceries': groceries}
+
+    def flush(self):
+        """Write the queued documents in one transaction"""
+        if not self._pending:
+            return
+        documents, self._pending, self._pending_rows = self._pending, [], 0
+        now = datetime.utcnow()
+        # On SQLite no other writer may take ids between reading the maximum and inserting
+        with immediate_transaction(self.connection) if self.reserve_ids else self.connection.begin():
+            new_users = {}
+            for document in documents:
+                if document['email'] not in self._user_ids and document['email'] not in new_users:
+                    new_users[document['email']] = self._user_row(document, now)
+            if new_users:
+                ids = self._insert_with_ids(User.__table__, USER_COLUMNS, list(new_users.values()))
+                self._user_ids.update(zip(new_users, ids))
+                self.counts['users'] += len(ids)
+
+            self._load_meal_days([self._user_ids[email] for email in {document['email'] for document in documents}
+                                  if email not in new_users])
+
+            meal_rows, meal_ingredients, grocery_rows = [], [], []
+            touched = {'plan': set(), 'groceries': set()}
+            for document in documents:
+                user_id = self._user_ids[document['email']]
+                existing = document['email'] not in new_users
+                for meal in document['meals']:
+                    taken = self._meal_days.get(user_id, 0)
+                    if taken & DAY_BITS[meal['day_of_week']]:
+                        self._skip(document['position'], f"{document['email']} already has a meal on {meal['day_of_week']}")
+                        continue
+                    self._meal_days[user_id] = taken | DAY_BITS[meal['day_of_week']]
+                    created_at = meal['created_at'] or now
+                    meal_rows.append((user_id, meal['day_of_week'], meal['name'], meal['notes'], created_at, created_at))
+                    meal_ingredients.append(meal['ingredients'])
+                    if existing:
+                        touched['plan'].add(user_id)
+                for name, quantity, purchased, created_at in document['groceries']:
+                    created_at = created_at or now
+                    grocery_rows.append((user_id, name, quantity, purchased, created_at, created_at))
+                if existing and document['groceries']:
+                    touched['groceries'].add(user_id)
+
+            if meal_rows:
+                meal_ids = self._insert_with_ids(Meal.__table__, MEAL_COLUMNS, meal_rows)
+                ingredient_rows = [
+                    (meal_id, name, quantity)
+                    for meal_id, ingredients in zip(meal_ids, meal_ingredients)
+                    for name, quantity in ingredients
+                ]
+                if ingredient_rows:
+                    self._insert_rows(Ingredient.__table__, ('meal_id', 'name', 'quantity'), ingredient_rows)
+                self.counts['meals'] += len(meal_rows)
+                self.counts['ingredients'] += len(ingredient_rows)
+            if grocery_rows:
+                self._insert_rows(GroceryItem.__table__,
+                                  ('user_id', 'name', 'quantity', 'purchased', 'created_at', 'updated_at'),
+                                  grocery_rows)
+                self.counts['grocery_items'] += len(grocery_rows)
+
+            for scope, user_ids in touched.items():
+                if user_ids:
+                    version_col = getattr(User, f'{scope}_version')
+                    modified_col = getattr(User, f'{scope}_modified_at')
+                    self.connection.execute(
+                        update(User).where(User.id.in_(user_ids))
+                        .values({version_col: version_col + 1, modified_col: now})
+                    )
+        if self.progress:
+            self.progress(self.rows, time.perf_counter() - self._started)
+
+    def _load_meal_days(self, user_ids):
+        """Read the days already taken by users that existed before the import"""
+        user_ids = [user_id for user_id in user_ids if user_id not in self._meal_days]
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            self._meal_days.update(dict.fromkeys(chunk, 0))
+            for user_id, day in self.connection.execute(
+                select(Meal.user_id, Meal.day_of_week).where(Meal.user_id.in_(chunk))
+            ):
+                self._meal_days[user_id] |= DAY_BITS.get(day, 0)
+
+    def _insert_rows(self, table, columns, rows):
+        """executemany of value tuples on the DB-API cursor, with the column types' bind processors applied"""
+        dialect = self.connection.dialect
+        placeholder = {'qmark': '?', 'format': '%s', 'pyformat': '%s'}.get(dialect.paramstyle)
+        if placeholder is None:
+            self.connection.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+            return
+        processors, by_type = [], {}
+        for position, column in enumerate(columns):
+            impl = table.c[column].type.dialect_impl(dialect)
+            if repr(impl) not in by_type:  # one function per type, so equal values can share a result
+                by_type[repr(impl)] = impl.bind_processor(dialect)
+            if by_type[repr(impl)]:
+                processors.append((position, by_type[repr(impl)]))
+        if processors:
+            processed = []
+            for row in rows:
+                row = list(row)
+                last = None  # (processor, value, result): created_at and updated_at are usually one object
+                for position, processor in processors:
+                    value = row[position]
+                    if value is None:
+                        continue
+                    if last is not None and last[0] is processor and last[1] is value:
+                        row[position] = last[2]
+                    else:
+                        row[position] = processor(value)
+                        last = (processor, value, row[position])
+                processed.append(tuple(row))
+            rows = processed
+        preparer = dialect.identifier_preparer
+        statement = (f'INSERT INTO {preparer.format_table(table)} ({", ".join(preparer.quote(c) for c in columns)}) '
+                     f'VALUES ({", ".join([placeholder] * len(columns))})')
+        self.connection.exec_driver_sql(statement, rows)
+
+    def _insert_with_ids(self, table, columns, rows):
+        """Insert value tuples and return their new ids in row order"""
+        if self.reserve_ids:
+            first = (self.connection.scalar(select(func.max(table.c.id))) or 0) + 1
+            ids = range(first, first + len(rows))
+            self._insert_rows(table, ('id',) + columns, [(row_id,) + row for row_id, row in zip(ids, rows)])
+            return list(ids)
+        return self.connection.scalars(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True),
+            [dict(zip(columns, row)) for row in rows]
+        ).all()
+
+    def _user_row(self, document, now):
+        password_hash = document['password_hash']
+        if not password_hash:
+            password_hash = password_hasher.hash(document['password']) if document['password'] else UNUSABLE_PASSWORD_HASH
+        created_at = document['created_at'] or now
+        return (document['email'], password_hash, created_at, 0, created_at, 0, created_at)
+
+    def finish(self):
+        """Write what is still queued and return the row counts"""
+        self.flush()
+        return dict(self.counts)
+
+def drop_indexes(connection):
+    """Drop the deferred indexes; returns them for restore_indexes()"""
+    indexes = deferred_indexes()
+    with connection.begin():
+        for index in indexes:
+            index.drop(connection, checkfirst=True)
+    return indexes
+
+def restore_indexes(connection, indexes=None):
+    """Create the deferred indexes that are missing"""
+    with connection.begin():
+        for index in indexes if indexes is not None else deferred_indexes():
+            index.create(connection, checkfirst=True)
+
+def import_documents(documents, batch_size=50000, defer_indexes=True, progress=None):
+    """
+    Import an iterable of (position, user document) pairs; returns the importer
+
+    With defer_indexes the secondary indexes of the loaded tables are
+    dropped first and rebuilt at the end, also when the import fails.
+    """
+    with db.engine.connect() as connection:
+        indexes = drop_indexes(connection) if defer_indexes else []
+        try:
+            importer = BulkImporter(connection, batch_size, progress)
+            for position, document in documents:
+                importer.add(document, position)
+            importer.finish()
+        finally:
+            if indexes:
+                restore_indexes(connection, indexes)
+    return importer
+
+def _open_text(path):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+def read_ndjson(path):
+    """Yield ('path:line', document) for every non-blank line"""
+    with _open_text(path) as lines:
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                document = json.loads(line)
+            except ValueError as e:
+                document = e  # reported as an invalid record
+            yield f'{path}:{number}', document
+
+def _parse_ingredients(text):
+    ingredients = []
+    for part in (text or '').split(';'):
+        if part.strip():
+            name, _, quantity = part.partition('=')
+            ingredients.append({'name': name.strip(), 'quantity': quantity.strip()})
+    return ingredients
+
+def read_csv(path, kind):
+    """Yield ('path:line', document) for every row of a users, meals or groceries CSV file"""
+    with _open_text(path) as rows:
+        for number, row in enumerate(csv.DictReader(rows), 2):
+            document = {'email': row.get('email')}
+            if kind == 'users':
+                document.update(password_hash=row.get('password_hash'), password=row.get('password'),
+                                created_at=row.get('created_at'))
+            elif kind == 'meals':
+                document['meals'] = [{'day_of_week': row.get('day_of_week'), 'name': row.get('name'),
+                                      'notes': row.get('notes'), 'created_at': row.get('created_at'),
+                                      'ingredients': _parse_ingredients(row.get('ingredients'))}]
+            else:
+                document['groceries'] = [{'name': row.get('name'), 'quantity': row.get('quantity'),
+                                          'purchased': row.get('purchased') or False,
+                                          'created_at': row.get('created_at')}]
+            yield f'{path}:{number}', document
+
+def synthetic_documents(users, seed=1, meals_per_user=7, ingredients_per_meal=8, groceries_per_user=40,
+                        email_prefix='seed'):
+    """Yield (position, user document) pairs of generated data for benchmarks and demos"""
+    from ai_providers import LocalProvider
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    names = [f'{adjective} {base} {dish}' for adjective in LocalProvider.ADJECTIVES
+             for base in LocalProvider.BASES for dish in LocalProvider.DISHES]
+    ingredients = [{'name': name, 'quantity': quantity} for name, quantity in LocalProvider.INGREDIENTS]
+    groceries_window = 90 * 24 * 3600
+    for i in range(users):
+        meals = [{
+            'day_of_week': VALID_DAYS[j % len(VALID_DAYS)],
+            'name': rng.choice(names),
+            'notes': '',
+            'ingredients': rng.sample(ingredients, min(ingredients_per_meal, len(ingredients))),
+        } for j in range(meals_per_user)]
+        groceries = []
+        for _ in range(groceries_per_user):
+            item = rng.choice(ingredients)
+            age = rng.random() * groceries_window
+            groceries.append({'name': item['name'], 'quantity': item['quantity'], 'purchased': age > 7 * 24 * 3600,
+                              'created_at': now - timedelta(seconds=age)})
+        yield i, {'email': f'{email_prefix}-{i}@example.com', 'meals': meals, 'groceries': groceries}
+
+def _echo_progress(rows, seconds):
+    click.echo(f'  {rows:,} rows in {seconds:.1f}s ({rows / seconds:,.0f} rows/s)', err=True)
+
+def _report(importer, seconds):
+    counts = importer.counts
+    click.echo(f"Imported {counts['users']:,} users, {counts['meals']:,} meals, {counts['ingredients']:,} ingredients "
+               f"and {counts['grocery_items']:,} grocery items in {seconds:.1f}s "
+               f"({importer.rows / seconds if seconds else 0:,.0f} rows/s)")
+    if counts['skipped']:
+        click.echo(f"Skipped {counts['skipped']:,} invalid records:", err=True)
+        for position, message in importer.errors:
+            click.echo(f'  {position}: {message}', err=True)
+
+@click.command('import-data')
+@click.argument('paths', nargs=-1)
+@click.option('--format', 'file_format', type=click.Choice(['ndjson', 'csv']),
+              help='Input format (default: from the file extension)')
+@click.option('--kind', type=click.Choice(['users', 'meals', 'groceries']), default='users',
+              help='Row kind of CSV input')
+@click.option('--batch-size', type=int, default=50000, show_default=True, help='Rows per transaction')
+@click.option('--defer-indexes/--keep-indexes', default=True, show_default=True,
+              help='Drop secondary indexes during the load and rebuild them after it')
+@click.option('--restore-indexes', 'only_restore', is_flag=True,
+              help='Only recreate indexes missing after an interrupted import')
+@with_appcontext
+def import_data_command(paths, file_format, kind, batch_size, defer_indexes, only_restore):
+    """Bulk import users, meals and grocery items from NDJSON or CSV files ('-' for stdin)"""
+    if only_restore:
+        with db.engine.connect() as connection:
+            restore_indexes(connection)
+        click.echo('Indexes restored')
+        return
+    if not paths:
+        raise click.UsageError('Give at least one file to import')
+
+    def documents():
+        for path in paths:
+            name = path[:-3] if path.endswith('.gz') else path
+            if (file_format or ('csv' if name.endswith('.csv') else 'ndjson')) == 'csv':
+                yield from read_csv(path, kind)
+            else:
+                yield from read_ndjson(path)
+
+    started = time.perf_counter()
+    importer = import_documents(documents(), batch_size, defer_indexes, _echo_progress)
+    _report(importer, time.perf_counter() - started)
+    current_app.logger.info(f'Bulk import finished: {importer.counts}')
+    if importer.counts['skipped']:
+        sys.exit(1)
+
+@click.command('seed-data')
+@click.option('--users', type=int, default=1000, show_default=True)
+@click.option('--meals-per-user', type=click.IntRange(0, 7), default=7, show_default=True,
+              help='At most one meal per day')
+@click.option('--ingredients-per-meal', type=int, default=8, show_default=True)
+@click.option('--groceries-per-user', type=int, default=40, show_default=True)
+@click.option('--seed', type=int, default=1, show_default=True)
+@click.option('--batch-size', type=int, default=50000, show_default=True)
+@with_appcontext
+def seed_data_command(users, meals_per_user, ingredients_per_meal, groceries_per_user, seed, batch_size):
+    """Generate synthetic users with meals and grocery lists through the bulk import path"""
+    db.create_all()
+    started = time.perf_counter()
+    documents = synthetic_documents(users, seed, meals_per_user, ingredients_per_meal, groceries_per_user,
+                                    email_prefix=f'seed{seed}')
+    importer = import_documents(documents, batch_size, progress=_echo_progress)
+    _report(importer, time.perf_counter() - started)
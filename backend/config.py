@@ -10,13 +10,140 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///mealmate.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # SQLite tuning, used when the database is a SQLite file (see sqlite_profile.py).
+    # 'production' applies SQLITE_PRAGMAS to every connection and starts write
+    # requests with BEGIN IMMEDIATE; 'default' keeps SQLite's own settings
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE') or 'default'
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',     # readers do not block the writer and vice versa
+        'synchronous': 'NORMAL',   # fsync at checkpoints, not every commit; safe with WAL
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024)),  # negative: KiB
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'foreign_keys': 'ON',
+        'temp_store': 'MEMORY',
+    }
+    
+    # Connection pool per process: enough connections for the worker's threads,
+    # and a bounded wait rather than piling up requests behind a busy database
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT_SECONDS', 10)),
+    }
+    
+    # Read endpoints (GET /api/plan, GET /api/groceries): 'core' selects the
+    # columns as plain rows, 'orm' loads model objects and calls to_dict()
+    READ_PATH = os.environ.get('READ_PATH') or 'core'
+    
+    # Eager-loading strategy for meal ingredients ('selectin', 'joined', 'subquery', 'lazy')
+    MEAL_INGREDIENT_LOADING = os.environ.get('MEAL_INGREDIENT_LOADING') or 'selectin'
+    
+    # JSON encoder for responses: 'orjson', 'stdlib' or 'auto' (orjson when installed)
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER') or 'auto'
+    
+    # Grocery list pagination and streaming
+    GROCERY_PAGE_MAX_LIMIT = int(os.environ.get('GROCERY_PAGE_MAX_LIMIT', 500))
+    GROCERY_STREAM_CHUNK_SIZE = int(os.environ.get('GROCERY_STREAM_CHUNK_SIZE', 500))
+    GROCERY_BATCH_MAX_OPERATIONS = int(os.environ.get('GROCERY_BATCH_MAX_OPERATIONS', 500))
+    
     # JWT Configuration
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = False  # Tokens don't expire for simplicity
     
+    # Identity resolution: per-process LRU of user records, and how often the
+    # in-memory set of revoked tokens picks up revocations from other processes
+    IDENTITY_CACHE_ENTRIES = int(os.environ.get('IDENTITY_CACHE_ENTRIES', 10000))
+    IDENTITY_CACHE_TTL_SECONDS = float(os.environ.get('IDENTITY_CACHE_TTL_SECONDS', 300))
+    TOKEN_REVOCATION_SYNC_SECONDS = float(os.environ.get('TOKEN_REVOCATION_SYNC_SECONDS', 5))
+    
+    # Password hashing: algorithm ('bcrypt', 'scrypt' or 'pbkdf2') and cost (bcrypt
+    # log2 rounds, scrypt log2 N or pbkdf2 iterations; defaults 12, 15, 600000).
+    # Hashes run on a pool of PASSWORD_HASH_WORKERS processes (0 hashes inline);
+    # beyond PASSWORD_HASH_MAX_PENDING queued requests logins get a 503
+    PASSWORD_HASH_ALGORITHM = os.environ.get('PASSWORD_HASH_ALGORITHM') or 'bcrypt'
+    PASSWORD_HASH_COST = int(os.environ['PASSWORD_HASH_COST']) if os.environ.get('PASSWORD_HASH_COST') else None
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 32))
+    PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS', 0.5))
+    PASSWORD_HASH_TIMEOUT_SECONDS = float(os.environ.get('PASSWORD_HASH_TIMEOUT_SECONDS', 10))  # then a 503 too
+    
     # Gemini AI Configuration
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
     
+    # AI provider: 'gemini', or 'local' for a deterministic offline provider
+    AI_PROVIDER = os.environ.get('AI_PROVIDER') or 'gemini'
+    AI_MODEL = os.environ.get('AI_MODEL') or 'gemini-2.0-flash-exp'
+    AI_LOCAL_LATENCY_MS = int(os.environ.get('AI_LOCAL_LATENCY_MS', 0))
+    AI_LOCAL_LATENCY_PER_MEAL_MS = int(os.environ.get('AI_LOCAL_LATENCY_PER_MEAL_MS', 0))
+    AI_LOCAL_INGREDIENTS_PER_MEAL = int(os.environ.get('AI_LOCAL_INGREDIENTS_PER_MEAL', 5))
+    
+    # AI meal-idea cache (in-process LRU in front of a persistent table)
+    AI_CACHE_ENABLED = os.environ.get('AI_CACHE_ENABLED', 'true').lower() == 'true'
+    AI_CACHE_MEMORY_ENTRIES = int(os.environ.get('AI_CACHE_MEMORY_ENTRIES', 256))
+    AI_CACHE_PERSISTENT_ENTRIES = int(os.environ.get('AI_CACHE_PERSISTENT_ENTRIES', 10000))
+    AI_CACHE_TTL_SECONDS = int(os.environ.get('AI_CACHE_TTL_SECONDS', 24 * 3600))
+    
+    # Coalescing of identical in-flight AI requests: 'thread' shares one call per
+    # worker process, 'file' also serializes identical calls across workers on a host
+    AI_SINGLEFLIGHT_MODE = os.environ.get('AI_SINGLEFLIGHT_MODE') or 'thread'
+    AI_SINGLEFLIGHT_LOCK_DIR = os.environ.get('AI_SINGLEFLIGHT_LOCK_DIR')
+    AI_SINGLEFLIGHT_WAIT_SECONDS = float(os.environ.get('AI_SINGLEFLIGHT_WAIT_SECONDS', 60))
+    
+    # Parallel fan-out: split large counts into concurrent smaller generations
+    AI_FANOUT_ENABLED = os.environ.get('AI_FANOUT_ENABLED', 'false').lower() == 'true'
+    AI_FANOUT_CHUNK_SIZE = int(os.environ.get('AI_FANOUT_CHUNK_SIZE', 2))
+    AI_FANOUT_MAX_WORKERS = int(os.environ.get('AI_FANOUT_MAX_WORKERS', 8))
+    AI_CALL_TIMEOUT_SECONDS = float(os.environ.get('AI_CALL_TIMEOUT_SECONDS', 30))
+    
+    # Resilience of provider calls: a circuit breaker that fails fast after repeated
+    # failures, optional hedged requests, and serving cached meals while unavailable
+    AI_CALL_MAX_WORKERS = int(os.environ.get('AI_CALL_MAX_WORKERS', 16))
+    AI_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('AI_BREAKER_FAILURE_THRESHOLD', 5))
+    AI_BREAKER_RESET_SECONDS = float(os.environ.get('AI_BREAKER_RESET_SECONDS', 30))
+    AI_HEDGE_ENABLED = os.environ.get('AI_HEDGE_ENABLED', 'false').lower() == 'true'
+    AI_HEDGE_DELAY_SECONDS = float(os.environ['AI_HEDGE_DELAY_SECONDS']) if os.environ.get('AI_HEDGE_DELAY_SECONDS') else None
+    AI_FALLBACK_ENABLED = os.environ.get('AI_FALLBACK_ENABLED', 'true').lower() == 'true'
+    AI_FALLBACK_LIBRARY_THRESHOLD = float(os.environ.get('AI_FALLBACK_LIBRARY_THRESHOLD', 0.5))
+    
+    # Admission control for AI generation: token buckets per user and for the whole
+    # deployment (requests per minute and burst size); requests wait up to
+    # AI_RATE_LIMIT_MAX_WAIT_SECONDS for a token before getting a 429
+    AI_RATE_LIMIT_ENABLED = os.environ.get('AI_RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    AI_RATE_LIMIT_USER_PER_MINUTE = float(os.environ.get('AI_RATE_LIMIT_USER_PER_MINUTE', 10))
+    AI_RATE_LIMIT_USER_BURST = float(os.environ.get('AI_RATE_LIMIT_USER_BURST', 5))
+    AI_RATE_LIMIT_GLOBAL_PER_MINUTE = float(os.environ.get('AI_RATE_LIMIT_GLOBAL_PER_MINUTE', 300))
+    AI_RATE_LIMIT_GLOBAL_BURST = float(os.environ.get('AI_RATE_LIMIT_GLOBAL_BURST', 60))
+    AI_RATE_LIMIT_MAX_WAIT_SECONDS = float(os.environ.get('AI_RATE_LIMIT_MAX_WAIT_SECONDS', 2))
+    
+    # Recipe library: generated and saved meals answer similar prompts without a
+    # model call when their TF-IDF cosine similarity reaches AI_LIBRARY_THRESHOLD
+    AI_LIBRARY_ENABLED = os.environ.get('AI_LIBRARY_ENABLED', 'true').lower() == 'true'
+    AI_LIBRARY_THRESHOLD = float(os.environ.get('AI_LIBRARY_THRESHOLD', 0.75))
+    AI_LIBRARY_REFRESH_SECONDS = float(os.environ.get('AI_LIBRARY_REFRESH_SECONDS', 30))
+    AI_LIBRARY_INCLUDE_USER_MEALS = os.environ.get('AI_LIBRARY_INCLUDE_USER_MEALS', 'true').lower() == 'true'
+    
+    # Asynchronous generation jobs ("async": true): persisted queue and in-process worker pool
+    AI_JOB_WORKERS = int(os.environ.get('AI_JOB_WORKERS', 4))
+    AI_JOB_AUTOSTART = os.environ.get('AI_JOB_AUTOSTART', 'true').lower() == 'true'
+    AI_JOB_POLL_SECONDS = float(os.environ.get('AI_JOB_POLL_SECONDS', 1))
+    AI_JOB_LEASE_SECONDS = int(os.environ.get('AI_JOB_LEASE_SECONDS', 120))
+    AI_JOB_MAX_ATTEMPTS = int(os.environ.get('AI_JOB_MAX_ATTEMPTS', 3))
+    AI_JOB_MAX_QUEUED = int(os.environ.get('AI_JOB_MAX_QUEUED', 1000))
+    AI_JOB_RESULT_TTL_SECONDS = int(os.environ.get('AI_JOB_RESULT_TTL_SECONDS', 24 * 3600))
+    AI_JOB_STREAM_SECONDS = int(os.environ.get('AI_JOB_STREAM_SECONDS', 300))
+    
+    # Follow-up calls that ask only for the meals missing from a short or truncated response
+    AI_CONTINUATION_ATTEMPTS = int(os.environ.get('AI_CONTINUATION_ATTEMPTS', 1))
+    
+    # Prometheus metrics at GET /metrics; set METRICS_TOKEN to require "Authorization: Bearer <token>".
+    # With METRICS_REQUIRE_TOKEN (on in production) the app refuses to start with metrics on and no token
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_REQUIRE_TOKEN = os.environ.get('METRICS_REQUIRE_TOKEN', 'false').lower() == 'true'
+    # Add each request's SQL count and time as a Server-Timing header (for load tests, not production)
+    METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', 'false').lower() == 'true'
+    
     # CORS Configuration
     CORS_ORIGINS = ['http://localhost:5173', 'http://localhost:3000']  # Frontend URLs
 
@@ -29,11 +156,17 @@ class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     FLASK_ENV = 'production'
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE') or 'production'
+    METRICS_REQUIRE_TOKEN = True  # never serve /metrics unauthenticated
 
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}  # the in-memory database uses a single static connection
+    AI_JOB_AUTOSTART = False  # tests run jobs explicitly with ai_jobs.run_one()
+    PASSWORD_HASH_WORKERS = 0  # hash inline
+    PASSWORD_HASH_COST = 4     # cheapest bcrypt cost, to keep tests fast
 
 # Configuration dictionary
 config = {
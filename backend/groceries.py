@@ -1,11 +1,121 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, GroceryItem
+from sqlalchemy import and_, or_, func
+from models import db, GroceryItem, Meal, Ingredient, GROCERY_READ_COLUMNS
+from meals import VALID_DAYS
+from quantities import QuantityAggregator, normalize_name
+from versioning import bump_version, conditional_get, if_match_versions, missing_or_stale
+from sqlite_profile import write_transaction
 from datetime import datetime
+from collections import Counter
+import base64
+import binascii
+import json
 
 # Create groceries blueprint
 groceries_bp = Blueprint('groceries', __name__, url_prefix='/api')
 
+def _encode_cursor(item):
+    """Encode the (created_at, id) position of the last item on a page"""
+    created_at = item.created_at.isoformat() if item.created_at else None
+    raw = json.dumps([created_at, item.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    """Decode a pagination cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded))
+        return (datetime.fromisoformat(created_at) if created_at else None), int(item_id)
+    except (TypeError, ValueError, binascii.Error):
+        raise ValueError('Invalid cursor')
+
+def _stored_timestamp(value):
+    """
+    A cursor timestamp as SQLite stores it: CURRENT_TIMESTAMP defaults have no
+    fraction, timestamps written from Python carry six digits
+    """
+    if value is None:
+        return None
+    text = value.strftime('%Y-%m-%d %H:%M:%S')
+    return f'{text}.{value.microsecond:06d}' if value.microsecond else text
+
+def _grocery_page(user_id, after=None, limit=None):
+    """
+    Fetch grocery items newest first using keyset pagination on (created_at, id)
+    
+    The position is compared against the anchor row's stored created_at, so
+    the comparison is exact whatever timestamp format the database uses; the
+    cursor's own timestamp is only a fallback for when the anchor row is gone
+    or belongs to another user.
+    Served by the (user_id, created_at, id) index.
+    
+    With READ_PATH 'core' the items are rows of GROCERY_READ_COLUMNS rather
+    than model objects; both have the id and created_at attributes the
+    cursor needs, and _items_data() turns either into response dicts.
+    """
+    core = current_app.config.get('READ_PATH', 'core') == 'core'
+    query = db.select(*GROCERY_READ_COLUMNS) if core else db.select(GroceryItem)
+    query = query.where(GroceryItem.user_id == user_id)
+    
+    if after:
+        created_at, item_id = after
+        # Compare the stored text: no bind processing that could reformat either side
+        stored = db.type_coerce(GroceryItem.created_at, db.String)
+        anchor = db.select(stored).where(
+            GroceryItem.id == item_id, GroceryItem.user_id == user_id
+        ).scalar_subquery()
+        position = func.coalesce(anchor, db.literal(_stored_timestamp(created_at), db.String))
+        query = query.where(or_(
+            stored < position,
+            and_(stored == position, GroceryItem.id < item_id)
+        ))
+    
+    query = query.order_by(GroceryItem.created_at.desc(), GroceryItem.id.desc())
+    if limit:
+        query = query.limit(limit)
+    
+    if core:
+        # On the session's connection: plain rows, without the ORM's result processing
+        return db.session.connection().execute(query).all()
+    return db.session.scalars(query).all()
+
+def _items_data(items):
+    """Response dicts for _grocery_page() results, rows or model objects"""
+    if not items:
+        return []
+    if isinstance(items[0], GroceryItem):
+        return [item.to_dict() for item in items]
+    keys = items[0]._fields
+    return [dict(zip(keys, row)) for row in items]
+
+def _stream_grocery_list(user_id, chunk_size):
+    """
+    Yield the full grocery list as one JSON document, fetched in keyset chunks
+    
+    Only one chunk of rows is held in memory at a time, however long the list is.
+    """
+    dumps = current_app.json.dumps
+    yield '{"grocery_items": ['
+    
+    after = None
+    first = True
+    while True:
+        items = _grocery_page(user_id, after=after, limit=chunk_size)
+        if not items:
+            break
+        
+        parts = [dumps(item_data) for item_data in _items_data(items)]
+        yield ('' if first else ',') + ','.join(parts)
+        first = False
+        
+        if len(items) < chunk_size:
+            break
+        last = items[-1]
+        after = (last.created_at, last.id)
+    
+    yield ']}'
+
 @groceries_bp.route('/groceries', methods=['GET'])
 @jwt_required()
 def get_grocery_list():
@@ -14,6 +124,12 @@ def get_grocery_list():
     
     Headers:
     Authorization: Bearer <jwt_token>
+    If-None-Match: "<etag>" (optional, answered with 304 when unchanged)
+    
+    Query Parameters (optional):
+    limit: page size for keyset pagination (max GROCERY_PAGE_MAX_LIMIT)
+    cursor: next_cursor value from the previous page
+    stream: "true" to stream the full list in chunks instead of paginating
     
     Response:
     {
@@ -27,25 +143,60 @@ def get_grocery_list():
                 "created_at": "2024-01-01T00:00:00",
                 "updated_at": "2024-01-01T00:00:00"
             }
-        ]
+        ],
+        "next_cursor": "WyIyMDI0LTAxLTAxVDAwOjAwOjAwIiwgMV0"  (paginated requests only)
     }
     """
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = int(get_jwt_identity())
+        
+        # Parse pagination parameters
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor')
+        stream = request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+        
+        if limit is not None and (limit < 1 or limit > current_app.config['GROCERY_PAGE_MAX_LIMIT']):
+            return jsonify({
+                'error': f"Limit must be between 1 and {current_app.config['GROCERY_PAGE_MAX_LIMIT']}"
+            }), 400
         
-        # Get all grocery items for the current user
-        grocery_items = GroceryItem.query.filter_by(user_id=current_user_id).order_by(GroceryItem.created_at.desc()).all()
+        try:
+            after = _decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Convert to dictionary format
-        items_data = [item.to_dict() for item in grocery_items]
+        def build_response():
+            if stream:
+                chunk_size = current_app.config['GROCERY_STREAM_CHUNK_SIZE']
+                return Response(
+                    stream_with_context(_stream_grocery_list(current_user_id, chunk_size)),
+                    mimetype='application/json'
+                )
+            
+            if limit is None and after is None:
+                # Get all grocery items for the current user
+                grocery_items = _grocery_page(current_user_id)
+                return jsonify({'grocery_items': _items_data(grocery_items)}), 200
+            
+            # Fetch one extra row to know whether another page exists
+            page_size = limit or current_app.config['GROCERY_PAGE_MAX_LIMIT']
+            grocery_items = _grocery_page(current_user_id, after=after, limit=page_size + 1)
+            has_more = len(grocery_items) > page_size
+            grocery_items = grocery_items[:page_size]
+            
+            return jsonify({
+                'grocery_items': _items_data(grocery_items),
+                'next_cursor': _encode_cursor(grocery_items[-1]) if has_more else None
+            }), 200
         
-        return jsonify({'grocery_items': items_data}), 200
+        return conditional_get(current_user_id, 'groceries', build_response)
         
     except Exception as e:
         return jsonify({'error': 'Failed to fetch grocery list', 'details': str(e)}), 500
 
 @groceries_bp.route('/groceries', methods=['POST'])
 @jwt_required()
+@write_transaction
 def add_grocery_item():
     """
     Add a new item to the grocery list
@@ -74,7 +225,7 @@ def add_grocery_item():
     }
     """
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = int(get_jwt_identity())
         data = request.get_json()
         
         # Validate required fields
@@ -90,6 +241,7 @@ def add_grocery_item():
         )
         
         db.session.add(new_item)
+        bump_version(current_user_id, 'groceries')
         db.session.commit()
         
         return jsonify({
@@ -103,12 +255,14 @@ def add_grocery_item():
 
 @groceries_bp.route('/groceries/<int:item_id>', methods=['PUT'])
 @jwt_required()
+@write_transaction
 def toggle_grocery_item(item_id):
     """
     Toggle the purchased status of a grocery item
     
     Headers:
     Authorization: Bearer <jwt_token>
+    If-Match: "<version>"  (optional, 412 if the item changed since)
     
     Request Body (optional):
     {
@@ -127,35 +281,45 @@ def toggle_grocery_item(item_id):
             "quantity": "2L",
             "purchased": true,
             "created_at": "2024-01-01T00:00:00",
-            "updated_at": "2024-01-01T00:00:00"
+            "updated_at": "2024-01-01T00:00:00",
+            "version": 2
         }
     }
     """
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = int(get_jwt_identity())
         data = request.get_json() or {}
         
-        # Find the item and verify ownership
-        item = GroceryItem.query.filter_by(id=item_id, user_id=current_user_id).first()
-        if not item:
-            return jsonify({'error': 'Grocery item not found'}), 404
+        versions = if_match_versions()
         
-        # Update item fields
+        values = {'updated_at': datetime.utcnow(), 'version': GroceryItem.version + 1}
         if 'purchased' in data:
-            item.purchased = bool(data['purchased'])
+            values['purchased'] = bool(data['purchased'])
         
         if data.get('name'):
-            item.name = data['name'].strip()
+            values['name'] = data['name'].strip()
         
         if data.get('quantity'):
-            item.quantity = data['quantity'].strip()
+            values['quantity'] = data['quantity'].strip()
+        
+        # Ownership check, If-Match check and update in one statement
+        query = db.update(GroceryItem).where(GroceryItem.id == item_id, GroceryItem.user_id == current_user_id)
+        if versions is not None:
+            query = query.where(GroceryItem.version.in_(versions))
+        item = db.session.scalars(
+            query.values(values).returning(GroceryItem).execution_options(synchronize_session=False)
+        ).first()
+        if item is None:
+            db.session.rollback()
+            return missing_or_stale(GroceryItem, item_id, current_user_id, versions, 'Grocery item not found')
+        item_data = item.to_dict()  # before the commit expires it
         
-        item.updated_at = datetime.utcnow()
+        bump_version(current_user_id, 'groceries')
         db.session.commit()
         
         return jsonify({
             'message': 'Grocery item updated successfully',
-            'item': item.to_dict()
+            'item': item_data
         }), 200
         
     except Exception as e:
@@ -164,12 +328,14 @@ def toggle_grocery_item(item_id):
 
 @groceries_bp.route('/groceries/<int:item_id>', methods=['DELETE'])
 @jwt_required()
+@write_transaction
 def delete_grocery_item(item_id):
     """
     Delete a grocery item from the list
     
     Headers:
     Authorization: Bearer <jwt_token>
+    If-Match: "<version>"  (optional, 412 if the item changed since)
     
     Response:
     {
@@ -177,15 +343,22 @@ def delete_grocery_item(item_id):
     }
     """
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = int(get_jwt_identity())
+        
+        versions = if_match_versions()
         
-        # Find the item and verify ownership
-        item = GroceryItem.query.filter_by(id=item_id, user_id=current_user_id).first()
-        if not item:
-            return jsonify({'error': 'Grocery item not found'}), 404
+        # Ownership check, If-Match check and delete in one statement
+        query = db.delete(GroceryItem).where(GroceryItem.id == item_id, GroceryItem.user_id == current_user_id)
+        if versions is not None:
+            query = query.where(GroceryItem.version.in_(versions))
+        deleted = db.session.execute(
+            query.returning(GroceryItem.id).execution_options(synchronize_session=False)
+        ).first()
+        if deleted is None:
+            db.session.rollback()
+            return missing_or_stale(GroceryItem, item_id, current_user_id, versions, 'Grocery item not found')
         
-        # Delete the item
-        db.session.delete(item)
+        bump_version(current_user_id, 'groceries')
         db.session.commit()
         
         return jsonify({'message': 'Grocery item deleted successfully'}), 200
@@ -196,6 +369,7 @@ def delete_grocery_item(item_id):
 
 @groceries_bp.route('/groceries/clear-purchased', methods=['DELETE'])
 @jwt_required()
+@write_transaction
 def clear_purchased_items():
     """
     Clear all purchased items from the grocery list
@@ -210,7 +384,7 @@ def clear_purchased_items():
     }
     """
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = int(get_jwt_identity())
         
         # Delete all purchased items for the current user
         deleted_count = GroceryItem.query.filter_by(
@@ -218,6 +392,8 @@ def clear_purchased_items():
             purchased=True
         ).delete()
         
+        if deleted_count:
+            bump_version(current_user_id, 'groceries')
         db.session.commit()
         
         return jsonify({
@@ -227,4 +403,393 @@ def clear_purchased_items():
         
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': 'Failed to clear purchased items', 'details': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': 'Failed to clear purchased items', 'details': str(e)}), 500 
+
+def _batch_error(index, op, error, status=400, item_id=None):
+    """Build the result entry for a batch operation that was not applied"""
+    result = {'index': index, 'op': op, 'status': status, 'error': error}
+    if item_id is not None:
+        result['id'] = item_id
+    return result
+
+@groceries_bp.route('/groceries/batch', methods=['POST'])
+@jwt_required()
+@write_transaction
+def batch_grocery_items():
+    """
+    Apply several grocery list operations in one transaction
+    
+    Operations are validated up front; invalid ones are reported and skipped.
+    Each item may be named by at most one operation: every operation on an id
+    that appears more than once is rejected with a 409, so the set-based
+    statements below (create, update, toggle, delete, then a single commit)
+    give the same result as applying the batch in request order.
+    
+    Headers:
+    Authorization: Bearer <jwt_token>
+    
+    Request Body:
+    {
+        "operations": [
+            {"op": "create", "name": "Milk", "quantity": "1L"},
+            {"op": "update", "id": 2, "name": "Oat Milk", "quantity": "2L"},
+            {"op": "toggle", "id": 3, "purchased": true},
+            {"op": "toggle", "id": 4},
+            {"op": "delete", "id": 5}
+        ]
+    }
+    
+    A toggle without "purchased" flips the item's current state.
+    
+    Response:
+    {
+        "message": "Batch applied successfully",
+        "results": [
+            {"index": 0, "op": "create", "status": 201, "id": 6, "item": {...}},
+            {"index": 1, "op": "update", "status": 200, "id": 2, "item": {...}},
+            {"index": 2, "op": "toggle", "status": 404, "id": 3, "error": "Grocery item not found"},
+            {"index": 3, "op": "toggle", "status": 200, "id": 4, "item": {...}},
+            {"index": 4, "op": "delete", "status": 200, "id": 5}
+        ]
+    }
+    
+    A repeated id gives {"status": 409, "error": "Item appears more than once in the batch"}
+    for each operation naming it.
+    """
+    try:
+        current_user_id = int(get_jwt_identity())
+        data = request.get_json(silent=True) or {}
+        operations = data.get('operations') if isinstance(data, dict) else None
+        
+        # Validate the batch itself
+        if not isinstance(operations, list) or not operations:
+            return jsonify({'error': 'A non-empty list of operations is required'}), 400
+        
+        max_operations = current_app.config['GROCERY_BATCH_MAX_OPERATIONS']
+        if len(operations) > max_operations:
+            return jsonify({'error': f'A batch can contain at most {max_operations} operations'}), 400
+        
+        results = [None] * len(operations)
+        creates = []                            # (index, row)
+        updates = []                            # (index, item_id, values)
+        toggles = {True: [], False: [], None: []}  # purchased value -> [(index, item_id)]
+        deletes = []                            # (index, item_id)
+        
+        # Validate each operation
+        for index, operation in enumerate(operations):
+            if not isinstance(operation, dict) or operation.get('op') not in ('create', 'update', 'toggle', 'delete'):
+                op = operation.get('op') if isinstance(operation, dict) else None
+                results[index] = _batch_error(index, op, 'Operation must be one of create, update, toggle, delete')
+                continue
+            
+            op = operation['op']
+            if op == 'create':
+                name = operation.get('name')
+                quantity = operation.get('quantity')
+                if not isinstance(name, str) or not isinstance(quantity, str) or not name.strip() or not quantity.strip():
+                    results[index] = _batch_error(index, op, 'Item name and quantity are required')
+                    continue
+                creates.append((index, {
+                    'user_id': current_user_id,
+                    'name': name.strip(),
+                    'quantity': quantity.strip(),
+                    'purchased': bool(operation.get('purchased', False))
+                }))
+                continue
+            
+            item_id = operation.get('id')
+            if not isinstance(item_id, int) or isinstance(item_id, bool):
+                results[index] = _batch_error(index, op, 'Item id is required')
+                continue
+            
+            if op == 'update':
+                values = {}
+                if isinstance(operation.get('name'), str) and operation['name'].strip():
+                    values['name'] = operation['name'].strip()
+                if isinstance(operation.get('quantity'), str) and operation['quantity'].strip():
+                    values['quantity'] = operation['quantity'].strip()
+                if 'purchased' in operation:
+                    values['purchased'] = bool(operation['purchased'])
+                if not values:
+                    results[index] = _batch_error(index, op, 'Nothing to update', item_id=item_id)
+                    continue
+                updates.append((index, item_id, values))
+            elif op == 'toggle':
+                purchased = bool(operation['purchased']) if operation.get('purchased') is not None else None
+                toggles[purchased].append((index, item_id))
+            else:
+                deletes.append((index, item_id))
+        
+        # Reject every operation on an id the batch names more than once
+        seen_ids = Counter(item_id for _, item_id, _ in updates)
+        seen_ids.update(item_id for entries in toggles.values() for _, item_id in entries)
+        seen_ids.update(item_id for _, item_id in deletes)
+        repeated_ids = {item_id for item_id, count in seen_ids.items() if count > 1}
+        
+        def unique(index, op, item_id):
+            if item_id not in repeated_ids:
+                return True
+            results[index] = _batch_error(index, op, 'Item appears more than once in the batch', 409, item_id)
+            return False
+        
+        if repeated_ids:
+            updates = [entry for entry in updates if unique(entry[0], 'update', entry[1])]
+            for purchased in toggles:
+                toggles[purchased] = [entry for entry in toggles[purchased] if unique(entry[0], 'toggle', entry[1])]
+            deletes = [entry for entry in deletes if unique(entry[0], 'delete', entry[1])]
+        
+        # Verify ownership of every referenced item with one query
+        referenced_ids = {item_id for _, item_id, _ in updates}
+        referenced_ids.update(item_id for entries in toggles.values() for _, item_id in entries)
+        referenced_ids.update(item_id for _, item_id in deletes)
+        
+        owned_ids = set()
+        if referenced_ids:
+            owned_ids = set(db.session.scalars(
+                db.select(GroceryItem.id).where(
+                    GroceryItem.user_id == current_user_id,
+                    GroceryItem.id.in_(referenced_ids)
+                )
+            ))
+        
+        def owned(index, op, item_id):
+            if item_id in owned_ids:
+                return True
+            results[index] = _batch_error(index, op, 'Grocery item not found', 404, item_id)
+            return False
+        
+        updates = [entry for entry in updates if owned(entry[0], 'update', entry[1])]
+        for purchased in toggles:
+            toggles[purchased] = [entry for entry in toggles[purchased] if owned(entry[0], 'toggle', entry[1])]
+        deletes = [entry for entry in deletes if owned(entry[0], 'delete', entry[1])]
+        
+        now = datetime.utcnow()
+        touched = {}  # item_id -> [result indexes that should carry the final item]
+        
+        # Creates: one multi-row INSERT ... RETURNING. Ids are assigned in VALUES
+        # order within the statement, so sorting them restores parameter order
+        # (asking SQLAlchemy to sort makes SQLite fall back to one INSERT per row).
+        if creates:
+            new_ids = sorted(db.session.scalars(
+                db.insert(GroceryItem).returning(GroceryItem.id),
+                [row for _, row in creates]
+            ).all())
+            for (index, _), item_id in zip(creates, new_ids):
+                results[index] = {'index': index, 'op': 'create', 'status': 201, 'id': item_id}
+                touched.setdefault(item_id, []).append(index)
+        
+        # Updates: one executemany by primary key. COALESCE keeps the columns an
+        # operation leaves out, so every update fits the same statement
+        if updates:
+            table = GroceryItem.__table__
+            db.session.execute(
+                db.update(table)
+                .where(table.c.id == db.bindparam('item_id'))
+                .values(
+                    name=func.coalesce(db.bindparam('new_name', type_=table.c.name.type), table.c.name),
+                    quantity=func.coalesce(db.bindparam('new_quantity', type_=table.c.quantity.type), table.c.quantity),
+                    purchased=func.coalesce(db.bindparam('new_purchased', type_=table.c.purchased.type), table.c.purchased),
+                    updated_at=now,
+                    version=table.c.version + 1
+                ),
+                [
+                    {'item_id': item_id, 'new_name': values.get('name'), 'new_quantity': values.get('quantity'),
+                     'new_purchased': values.get('purchased')}
+                    for _, item_id, values in updates
+                ]
+            )
+            for index, item_id, _ in updates:
+                results[index] = {'index': index, 'op': 'update', 'status': 200, 'id': item_id}
+                touched.setdefault(item_id, []).append(index)
+        
+        # Toggles: one UPDATE ... WHERE id IN (...) per target state
+        for purchased, entries in toggles.items():
+            if not entries:
+                continue
+            new_value = db.not_(GroceryItem.purchased) if purchased is None else purchased
+            db.session.execute(
+                db.update(GroceryItem)
+                .where(GroceryItem.user_id == current_user_id, GroceryItem.id.in_([item_id for _, item_id in entries]))
+                .values(purchased=new_value, updated_at=now, version=GroceryItem.version + 1)
+                .execution_options(synchronize_session=False)
+            )
+            for index, item_id in entries:
+                results[index] = {'index': index, 'op': 'toggle', 'status': 200, 'id': item_id}
+                touched.setdefault(item_id, []).append(index)
+        
+        # Deletes: one DELETE ... WHERE id IN (...)
+        if deletes:
+            deleted_ids = {item_id for _, item_id in deletes}
+            db.session.execute(
+                db.delete(GroceryItem)
+                .where(GroceryItem.user_id == current_user_id, GroceryItem.id.in_(deleted_ids))
+                .execution_options(synchronize_session=False)
+            )
+            for index, item_id in deletes:
+                results[index] = {'index': index, 'op': 'delete', 'status': 200, 'id': item_id}
+                touched.pop(item_id, None)
+        
+        if creates or updates or any(toggles.values()) or deletes:
+            bump_version(current_user_id, 'groceries')
+        db.session.commit()
+        
+        # Attach the final state of every surviving item with one query
+        if touched:
+            items = GroceryItem.query.filter(GroceryItem.id.in_(touched.keys())).all()
+            for item in items:
+                item_data = item.to_dict()
+                for index in touched[item.id]:
+                    results[index]['item'] = item_data
+        
+        return jsonify({
+            'message': 'Batch applied successfully',
+            'results': results
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to apply grocery batch', 'details': str(e)}), 500
+
+@groceries_bp.route('/groceries/generate', methods=['POST'])
+@jwt_required()
+@write_transaction
+def generate_grocery_list():
+    """
+    Build or merge the grocery list from the current meal plan
+    
+    All plan ingredients are fetched with a single query, parsed and combined
+    in memory (duplicate ingredients across meals are summed per unit
+    dimension), then written with one multi-row insert. In merge mode an
+    ingredient already on the list as an unpurchased item is added to that
+    item's quantity instead, with one executemany update.
+    
+    Headers:
+    Authorization: Bearer <jwt_token>
+    
+    Request Body (optional):
+    {
+        "mode": "merge",            ("merge" adds to existing items, "replace" clears unpurchased items first)
+        "days": ["Monday", "Tuesday"]  (limit to these days, defaults to the whole plan)
+    }
+    
+    Response:
+    {
+        "message": "Grocery list generated successfully",
+        "summary": {"created": 12, "updated": 3, "deleted": 0},
+        "items": [
+            {
+                "id": 7,
+                "user_id": 1,
+                "name": "Flour",
+                "quantity": "1.2 kg",
+                "purchased": false,
+                "created_at": "2024-01-01T00:00:00",
+                "updated_at": "2024-01-01T00:00:00"
+            }
+        ]
+    }
+    """
+    try:
+        current_user_id = int(get_jwt_identity())
+        data = request.get_json(silent=True) or {}
+        
+        # Validate options
+        mode = data.get('mode', 'merge')
+        if mode not in ('merge', 'replace'):
+            return jsonify({'error': 'Mode must be "merge" or "replace"'}), 400
+        
+        days = data.get('days')
+        if days is not None and (not isinstance(days, list) or not all(isinstance(day, str) for day in days)):
+            return jsonify({'error': 'Days must be a list of day names'}), 400
+        if days is not None and any(day not in VALID_DAYS for day in days):
+            return jsonify({'error': 'Invalid day of week'}), 400
+        
+        # Fetch every ingredient in the plan with one set-based query
+        query = (
+            db.select(Ingredient.name, Ingredient.quantity)
+            .join(Meal, Ingredient.meal_id == Meal.id)
+            .where(Meal.user_id == current_user_id)
+            .order_by(Meal.id, Ingredient.id)
+        )
+        if days is not None:
+            query = query.where(Meal.day_of_week.in_(days))
+        
+        aggregator = QuantityAggregator()
+        for name, quantity in db.session.execute(query):
+            aggregator.add(name, quantity)
+        
+        summary = {'created': 0, 'updated': 0, 'deleted': 0}
+        
+        existing = {}  # normalized name -> (id, name, quantity) of the oldest unpurchased item
+        if mode == 'replace':
+            # Start over from the plan, keeping items that were already bought
+            summary['deleted'] = GroceryItem.query.filter_by(
+                user_id=current_user_id,
+                purchased=False
+            ).delete(synchronize_session=False)
+        else:
+            for item in db.session.execute(
+                db.select(GroceryItem.id, GroceryItem.name, GroceryItem.quantity)
+                .where(GroceryItem.user_id == current_user_id, GroceryItem.purchased == False)  # noqa: E712
+                .order_by(GroceryItem.id)
+            ):
+                existing.setdefault(normalize_name(item.name), item)
+        
+        rows = []
+        updates = []
+        for name, quantity in aggregator.items():
+            item = existing.get(normalize_name(name))
+            if item is not None:
+                # Add the plan's quantity to the item already on the list
+                combined = QuantityAggregator()
+                combined.add(item.name, item.quantity)
+                combined.add(name, quantity)
+                _, total = next(iter(combined.items()))
+                updates.append({'item_id': item.id, 'new_quantity': total[:100]})
+                continue
+            rows.append({
+                'user_id': current_user_id,
+                'name': name[:200],
+                'quantity': quantity[:100],
+                'purchased': False
+            })
+        
+        new_items = []
+        if rows:
+            new_items = sorted(
+                db.session.scalars(db.insert(GroceryItem).returning(GroceryItem), rows).all(),
+                key=lambda item: item.id
+            )
+            summary['created'] = len(new_items)
+        
+        if updates:
+            table = GroceryItem.__table__
+            db.session.execute(
+                db.update(table)
+                .where(table.c.id == db.bindparam('item_id'))
+                .values(quantity=db.bindparam('new_quantity'), updated_at=datetime.utcnow(), version=table.c.version + 1),
+                updates
+            )
+            summary['updated'] = len(updates)
+            new_items += db.session.scalars(
+                db.select(GroceryItem)
+                .where(GroceryItem.id.in_([update['item_id'] for update in updates]))
+                .order_by(GroceryItem.id)
+                .execution_options(populate_existing=True)
+            ).all()
+        
+        items_data = [item.to_dict() for item in new_items]
+        
+        if summary['created'] or summary['updated'] or summary['deleted']:
+            bump_version(current_user_id, 'groceries')
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Grocery list generated successfully',
+            'summary': summary,
+            'items': items_data
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to generate grocery list', 'details': str(e)}), 500
@@ -0,0 +1,190 @@
+"""
+Cached identity resolution and token revocation for JWT-protected requests
+
+Access tokens never expire, so the user behind a token changes rarely and
+is worth caching. UserCache keeps a per-process LRU of user records
+(id, email, created_at; never the password hash) keyed by id, with a TTL
+as a bound on staleness across processes and invalidate() for account
+changes made in this one.
+
+TokenBlocklist keeps the ids (jti) of revoked tokens in an in-memory set,
+so checking a token is a set lookup instead of a query. The set is loaded
+from the revoked_tokens table on first use and picks up tokens revoked by
+other processes (rows with a higher id) at most every
+TOKEN_REVOCATION_SYNC_SECONDS; a token revoked here is blocked at once.
+
+Usage:
+    init_identity(app, jwt)
+    user = user_cache.get(user_id)      # dict or None
+    token_blocklist.revoke(jti, user_id)
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from models import db, User, RevokedToken
+
+class UserCache:
+    """LRU of user records keyed by id, with a TTL"""
+
+    def __init__(self):
+        self.max_entries = 10000
+        self.ttl = 300.0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user id -> (expires at, record)
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+
+    def init_app(self, app):
+        """Read the cache size and TTL from the app config"""
+        self.max_entries = app.config.get('IDENTITY_CACHE_ENTRIES', 10000)
+        self.ttl = app.config.get('IDENTITY_CACHE_TTL_SECONDS', 300.0)
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, user_id):
+        """Return the user record for user_id, or None if there is no such user"""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return entry[1]
+            self._stats['misses'] += 1
+
+        row = db.session.execute(
+            db.select(User.id, User.email, User.created_at).where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None  # not cached, so a user created later is found
+        record = {
+            'id': row.id,
+            'email': row.email,
+            'created_at': row.created_at.isoformat() if row.created_at else None
+        }
+
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, record)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+        return record
+
+    def invalidate(self, user_id):
+        """Drop a user's record after an account change"""
+        with self._lock:
+            if self._entries.pop(int(user_id), None) is not None:
+                self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        return stats
+
+class TokenBlocklist:
+    """In-memory set of revoked token ids, synced from the revoked_tokens table"""
+
+    def __init__(self):
+        self.sync_interval = 5.0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._revoked = set()
+        self._max_id = 0
+        self._synced_at = None
+        self._stats = {'checks': 0, 'blocked': 0, 'syncs': 0}
+
+    def init_app(self, app):
+        """Read the sync interval from the app config"""
+        self.sync_interval = app.config.get('TOKEN_REVOCATION_SYNC_SECONDS', 5.0)
+        with self._lock:
+            self._revoked = set()
+            self._max_id = 0
+            self._synced_at = None
+
+    def sync(self, force=False):
+        """
+        Add tokens revoked since the last sync to the set
+
+        Only one thread syncs at a time; the others keep checking against the
+        current set rather than waiting for the query.
+        """
+        with self._lock:
+            due = force or self._synced_at is None or time.monotonic() - self._synced_at >= self.sync_interval
+        if not due or not self._sync_lock.acquire(blocking=force or self._synced_at is None):
+            return 0
+        try:
+            table = RevokedToken.__table__
+            with db.engine.connect() as conn:
+                rows = conn.execute(
+                    db.select(table.c.id, table.c.jti)
+                    .where(table.c.id > self._max_id)
+                    .where(db.or_(table.c.expires_at.is_(None), table.c.expires_at > datetime.utcnow()))
+                    .order_by(table.c.id)
+                ).all()
+            with self._lock:
+                self._revoked.update(row.jti for row in rows)
+                if rows:
+                    self._max_id = rows[-1].id
+                self._synced_at = time.monotonic()
+                self._stats['syncs'] += 1
+            return len(rows)
+        finally:
+            self._sync_lock.release()
+
+    def is_revoked(self, jti):
+        """Whether the token with this id has been revoked"""
+        self.sync()
+        with self._lock:
+            self._stats['checks'] += 1
+            revoked = jti in self._revoked
+            if revoked:
+                self._stats['blocked'] += 1
+        return revoked
+
+    def revoke(self, jti, user_id, expires=None):
+        """Commit a revoked token to the table and block it in this process at once"""
+        db.session.add(RevokedToken(
+            jti=jti,
+            user_id=user_id,
+            revoked_at=datetime.utcnow(),
+            expires_at=datetime.fromtimestamp(expires, timezone.utc).replace(tzinfo=None) if expires else None
+        ))
+        db.session.commit()
+        with self._lock:
+            self._revoked.add(jti)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['revoked'] = len(self._revoked)
+        return stats
+
+# Process-wide caches, configured in create_app
+user_cache = UserCache()
+token_blocklist = TokenBlocklist()
+
+def init_identity(app, jwt):
+    """
+    Configure the caches and register the blocklist check with the JWT manager
+
+    No user_lookup_loader is registered: flask-jwt-extended would then load
+    the user on every protected request. Handlers that need the user record
+    call user_cache.get() themselves.
+    """
+    user_cache.init_app(app)
+    token_blocklist.init_app(app)
+
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        return token_blocklist.is_revoked(jwt_payload['jti'])
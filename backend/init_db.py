@@ -5,7 +5,7 @@ Database initialization script for MealMate
 import os
 from app import create_app
 from models import db, User
-from werkzeug.security import generate_password_hash
+from passwords import password_hasher
 
 def init_database():
     """Initialize the database with tables and sample data"""
@@ -25,7 +25,7 @@ def init_database():
             print("Creating test user...")
             test_user = User(
                 email='test@mealmate.com',
-                password_hash=generate_password_hash('password123')
+                password_hash=password_hasher.hash('password123')
             )
             db.session.add(test_user)
             db.session.commit()
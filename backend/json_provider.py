@@ -0,0 +1,69 @@
+"""
+Flask JSON provider backed by orjson, with the standard library as fallback
+
+orjson encodes a large response several times faster than json.dumps and
+writes datetimes itself, so the Core read path can hand it rows with their
+timestamps untouched instead of calling isoformat() per value. Both
+encoders write datetimes and dates in the same ISO 8601 format as the
+models' to_dict(). Flask's stdlib provider would use HTTP dates instead.
+
+JSON_PROVIDER selects the encoder: 'orjson', 'stdlib', or 'auto' (orjson
+when it is installed). Pretty-printed debug responses, custom dumps()
+arguments and values orjson rejects (such as integers beyond 64 bits) go
+through the standard library either way.
+
+Usage:
+    init_json(app)
+"""
+from datetime import date, datetime
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: the standard library encoder is used instead
+    orjson = None
+
+def _default(o):
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    return DefaultJSONProvider.default(o)
+
+class JSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider that encodes with orjson when use_orjson is set"""
+
+    default = staticmethod(_default)
+    use_orjson = False
+
+    def _orjson_options(self):
+        return orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+
+    def dumps(self, obj, **kwargs):
+        if self.use_orjson and not kwargs:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._orjson_options()).decode()
+            except TypeError:  # orjson.JSONEncodeError
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is None and self._app.debug or self.compact is False
+        if self.use_orjson and not pretty:
+            try:
+                body = orjson.dumps(obj, default=self.default, option=self._orjson_options() | orjson.OPT_APPEND_NEWLINE)
+                return self._app.response_class(body, mimetype=self.mimetype)
+            except TypeError:
+                pass
+        return super().response(*args, **kwargs)
+
+def init_json(app):
+    """Install the JSON provider selected by JSON_PROVIDER on the app"""
+    choice = app.config.get('JSON_PROVIDER', 'auto')
+    if choice not in ('auto', 'orjson', 'stdlib'):
+        raise ValueError(f'Unknown JSON provider: {choice}')
+    if choice == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_PROVIDER is orjson but orjson is not installed')
+    provider = JSONProvider(app)
+    provider.use_orjson = choice != 'stdlib' and orjson is not None
+    app.json = provider
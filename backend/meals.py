@@ -1,11 +1,118 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Meal, Ingredient, User
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from models import db, Meal, Ingredient, User, MEAL_READ_COLUMNS, INGREDIENT_READ_COLUMNS
+from versioning import bump_version, conditional_get, if_match_versions, missing_or_stale
+from sqlite_profile import write_transaction
+from recipe_library import recipe_library
 from datetime import datetime
 
 # Create meals blueprint
 meals_bp = Blueprint('meals', __name__, url_prefix='/api')
 
+VALID_DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+def _meal_query():
+    """Meal query that loads ingredients with the configured eager-loading strategy"""
+    return Meal.with_ingredients(current_app.config.get('MEAL_INGREDIENT_LOADING', 'selectin'))
+
+# INSERT constructs with ON CONFLICT support, by dialect name
+CONFLICT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def _insert_meal(values):
+    """
+    Insert a meal unless the user already has one on that day
+    
+    One statement: the (user_id, day_of_week) unique constraint decides,
+    so two concurrent requests cannot both add a meal for the same day.
+    Returns the new meal's id, or None if the day was taken.
+    """
+    insert = CONFLICT_INSERTS.get(db.session.get_bind().dialect.name)
+    if insert is None:
+        try:
+            with db.session.begin_nested():
+                return db.session.execute(db.insert(Meal).values(values)).inserted_primary_key[0]
+        except IntegrityError:
+            return None
+    # No conflict target: the primary key aside, the day constraint is the only unique one
+    statement = insert(Meal).values(values).on_conflict_do_nothing().returning(Meal.id)
+    return db.session.execute(statement).scalar()
+
+def _plan_data(user_id):
+    """
+    The user's meals with their ingredients as response dicts, read as plain
+    rows: two statements like the selectin strategy, without ORM objects
+    """
+    connection = db.session.connection()
+    result = connection.execute(db.select(*MEAL_READ_COLUMNS).where(Meal.user_id == user_id))
+    keys = result.keys()
+    meals = [dict(zip(keys, row)) for row in result]
+    ingredients_by_meal = {}
+    for meal in meals:
+        meal['ingredients'] = ingredients_by_meal[meal['id']] = []
+    if ingredients_by_meal:
+        result = connection.execute(
+            db.select(*INGREDIENT_READ_COLUMNS)
+            .where(Ingredient.meal_id.in_(list(ingredients_by_meal)))
+            .order_by(Ingredient.meal_id, Ingredient.id)  # the meal_id index order, no sort
+        )
+        keys = result.keys()
+        for row in result:
+            ingredients_by_meal[row.meal_id].append(dict(zip(keys, row)))
+    return meals
+
+def _add_to_library(meals, user_id):
+    """Offer saved meals with ingredients to the recipe library, private to user_id"""
+    recipe_library.add_meals([meal.to_dict() for meal in meals if meal.ingredients], source='user', user_id=user_id)
+
+def _invalid_ingredients(ingredients_data):
+    """Return an error message unless ingredients_data is a list (or null) of objects"""
+    if ingredients_data is None:
+        return None
+    if not isinstance(ingredients_data, list):
+        return 'Ingredients must be a list'
+    if not all(isinstance(ingredient_data, dict) for ingredient_data in ingredients_data):
+        return 'Each ingredient must be an object with a name and quantity'
+    return None
+
+def _sync_ingredients(meal, ingredients_data):
+    """
+    Diff a meal's ingredients against the requested list
+    
+    Existing rows are matched by name: matches keep their row (and id) and are
+    only updated when the quantity differs, unmatched requested entries are
+    inserted and leftover rows are deleted through the delete-orphan cascade.
+    Returns True if anything changed.
+    """
+    existing_by_name = {}
+    for ingredient in meal.ingredients:
+        existing_by_name.setdefault(ingredient.name, []).append(ingredient)
+    
+    changed = False
+    wanted = []
+    for ingredient_data in ingredients_data:
+        if not ingredient_data.get('name') or not ingredient_data.get('quantity'):
+            continue
+        
+        matches = existing_by_name.get(ingredient_data['name'])
+        if matches:
+            ingredient = matches.pop(0)
+            if ingredient.quantity != ingredient_data['quantity']:
+                ingredient.quantity = ingredient_data['quantity']
+                changed = True
+        else:
+            ingredient = Ingredient(name=ingredient_data['name'], quantity=ingredient_data['quantity'])
+            changed = True
+        wanted.append(ingredient)
+    
+    if any(existing_by_name.values()):
+        changed = True
+    
+    if changed:
+        meal.ingredients = wanted
+    return changed
+
 @meals_bp.route('/plan', methods=['GET'])
 @jwt_required()
 def get_weekly_plan():
@@ -14,6 +121,7 @@ def get_weekly_plan():
     
     Headers:
     Authorization: Bearer <jwt_token>
+    If-None-Match: "<etag>" (optional, answered with 304 when unchanged)
     
     Response:
     {
@@ -39,21 +147,28 @@ def get_weekly_plan():
     }
     """
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = int(get_jwt_identity())
         
-        # Get all meals for the current user
-        meals = Meal.query.filter_by(user_id=current_user_id).all()
-        
-        # Convert to dictionary format
-        meals_data = [meal.to_dict() for meal in meals]
+        def build_response():
+            if current_app.config.get('READ_PATH', 'core') == 'core':
+                return jsonify({'meals': _plan_data(current_user_id)}), 200
+            
+            # Get all meals for the current user
+            meals = _meal_query().filter_by(user_id=current_user_id).all()
+            
+            # Convert to dictionary format
+            meals_data = [meal.to_dict() for meal in meals]
+            
+            return jsonify({'meals': meals_data}), 200
         
-        return jsonify({'meals': meals_data}), 200
+        return conditional_get(current_user_id, 'plan', build_response)
         
     except Exception as e:
         return jsonify({'error': 'Failed to fetch meal plan', 'details': str(e)}), 500
 
 @meals_bp.route('/meals', methods=['POST'])
 @jwt_required()
+@write_transaction
 def add_meal():
     """
     Add a new meal to the plan
@@ -89,12 +204,13 @@ def add_meal():
             "notes": "Classic Italian pasta dish",
             "created_at": "2024-01-01T00:00:00",
             "updated_at": "2024-01-01T00:00:00",
+            "version": 1,
             "ingredients": [...]
         }
     }
     """
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = int(get_jwt_identity())
         data = request.get_json()
         
         # Validate required fields
@@ -102,46 +218,42 @@ def add_meal():
             return jsonify({'error': 'Day of week and meal name are required'}), 400
         
         # Validate day of week
-        valid_days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        if data['day_of_week'] not in valid_days:
+        if data['day_of_week'] not in VALID_DAYS:
             return jsonify({'error': 'Invalid day of week'}), 400
         
-        # Check if meal already exists for this day and user
-        existing_meal = Meal.query.filter_by(
-            user_id=current_user_id,
-            day_of_week=data['day_of_week']
-        ).first()
+        error = _invalid_ingredients(data.get('ingredients'))
+        if error:
+            return jsonify({'error': error}), 400
         
-        if existing_meal:
+        meal_id = _insert_meal({
+            'user_id': current_user_id,
+            'day_of_week': data['day_of_week'],
+            'name': data['name'],
+            'notes': data.get('notes', '')
+        })
+        if meal_id is None:
+            db.session.rollback()
             return jsonify({'error': 'Meal already exists for this day'}), 409
         
-        # Create new meal
-        new_meal = Meal(
-            user_id=current_user_id,
-            day_of_week=data['day_of_week'],
-            name=data['name'],
-            notes=data.get('notes', '')
-        )
-        
-        db.session.add(new_meal)
-        db.session.flush()  # Get the meal ID
-        
-        # Add ingredients if provided
-        ingredients_data = data.get('ingredients', [])
-        for ingredient_data in ingredients_data:
-            if ingredient_data.get('name') and ingredient_data.get('quantity'):
-                ingredient = Ingredient(
-                    meal_id=new_meal.id,
-                    name=ingredient_data['name'],
-                    quantity=ingredient_data['quantity']
-                )
-                db.session.add(ingredient)
+        # Add ingredients if provided, with one executemany
+        ingredient_rows = [
+            {'meal_id': meal_id, 'name': ingredient_data['name'], 'quantity': ingredient_data['quantity']}
+            for ingredient_data in data.get('ingredients') or []
+            if ingredient_data.get('name') and ingredient_data.get('quantity')
+        ]
+        if ingredient_rows:
+            db.session.execute(db.insert(Ingredient), ingredient_rows)
         
+        bump_version(current_user_id, 'plan')
         db.session.commit()
         
+        # Reload the meal with its ingredients in a fixed number of queries
+        meal = _meal_query().filter_by(id=meal_id).one()
+        _add_to_library([meal], current_user_id)
+        
         return jsonify({
             'message': 'Meal added successfully',
-            'meal': new_meal.to_dict()
+            'meal': meal.to_dict()
         }), 201
         
     except Exception as e:
@@ -150,12 +262,14 @@ def add_meal():
 
 @meals_bp.route('/meals/<int:meal_id>', methods=['PUT'])
 @jwt_required()
+@write_transaction
 def update_meal(meal_id):
     """
     Update an existing meal
     
     Headers:
     Authorization: Bearer <jwt_token>
+    If-Match: "<version>"  (optional, 412 if the meal changed since)
     
     Request Body:
     {
@@ -177,45 +291,53 @@ def update_meal(meal_id):
     }
     """
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = int(get_jwt_identity())
         data = request.get_json()
         
-        # Find the meal and verify ownership
-        meal = Meal.query.filter_by(id=meal_id, user_id=current_user_id).first()
-        if not meal:
-            return jsonify({'error': 'Meal not found'}), 404
+        versions = if_match_versions()
         
-        # Update meal fields
+        error = _invalid_ingredients(data.get('ingredients'))
+        if error:
+            return jsonify({'error': error}), 400
+        
+        values = {'updated_at': datetime.utcnow(), 'version': Meal.version + 1}
         if data.get('day_of_week'):
-            valid_days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            if data['day_of_week'] not in valid_days:
+            if data['day_of_week'] not in VALID_DAYS:
                 return jsonify({'error': 'Invalid day of week'}), 400
-            meal.day_of_week = data['day_of_week']
+            values['day_of_week'] = data['day_of_week']
         
         if data.get('name'):
-            meal.name = data['name']
+            values['name'] = data['name']
         
         if 'notes' in data:
-            meal.notes = data['notes']
+            values['notes'] = data['notes']
+        
+        # Ownership check, If-Match check and update in one statement
+        query = db.update(Meal).where(Meal.id == meal_id, Meal.user_id == current_user_id)
+        if versions is not None:
+            query = query.where(Meal.version.in_(versions))
+        try:
+            updated = db.session.execute(
+                query.values(values).returning(Meal.id).execution_options(synchronize_session=False)
+            ).first()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'error': 'Meal already exists for this day'}), 409
+        if updated is None:
+            db.session.rollback()
+            return missing_or_stale(Meal, meal_id, current_user_id, versions, 'Meal not found')
         
-        # Update ingredients if provided
+        # Update ingredients if provided, touching only the rows that changed
         if 'ingredients' in data:
-            # Remove existing ingredients
-            Ingredient.query.filter_by(meal_id=meal.id).delete()
-            
-            # Add new ingredients
-            for ingredient_data in data['ingredients']:
-                if ingredient_data.get('name') and ingredient_data.get('quantity'):
-                    ingredient = Ingredient(
-                        meal_id=meal.id,
-                        name=ingredient_data['name'],
-                        quantity=ingredient_data['quantity']
-                    )
-                    db.session.add(ingredient)
-        
-        meal.updated_at = datetime.utcnow()
+            _sync_ingredients(_meal_query().filter_by(id=meal_id).one(), data['ingredients'] or [])
+        
+        bump_version(current_user_id, 'plan')
         db.session.commit()
         
+        # Reload the meal with its ingredients in a fixed number of queries
+        meal = _meal_query().filter_by(id=meal_id).one()
+        _add_to_library([meal], current_user_id)
+        
         return jsonify({
             'message': 'Meal updated successfully',
             'meal': meal.to_dict()
@@ -227,12 +349,14 @@ def update_meal(meal_id):
 
 @meals_bp.route('/meals/<int:meal_id>', methods=['DELETE'])
 @jwt_required()
+@write_transaction
 def delete_meal(meal_id):
     """
     Delete a meal from the plan
     
     Headers:
     Authorization: Bearer <jwt_token>
+    If-Match: "<version>"  (optional, 412 if the meal changed since)
     
     Response:
     {
@@ -240,19 +364,165 @@ def delete_meal(meal_id):
     }
     """
     try:
-        current_user_id = get_jwt_identity()
+        current_user_id = int(get_jwt_identity())
         
-        # Find the meal and verify ownership
-        meal = Meal.query.filter_by(id=meal_id, user_id=current_user_id).first()
-        if not meal:
-            return jsonify({'error': 'Meal not found'}), 404
+        versions = if_match_versions()
         
-        # Delete the meal (ingredients will be deleted due to cascade)
-        db.session.delete(meal)
+        target = [Meal.id == meal_id, Meal.user_id == current_user_id]
+        if versions is not None:
+            target.append(Meal.version.in_(versions))
+        
+        # Ingredients first, as the delete-orphan cascade only covers ORM deletes;
+        # both statements check ownership and version themselves
+        db.session.execute(
+            db.delete(Ingredient)
+            .where(Ingredient.meal_id.in_(db.select(Meal.id).where(*target)))
+            .execution_options(synchronize_session=False)
+        )
+        deleted = db.session.execute(
+            db.delete(Meal).where(*target).returning(Meal.id).execution_options(synchronize_session=False)
+        ).first()
+        if deleted is None:
+            db.session.rollback()
+            return missing_or_stale(Meal, meal_id, current_user_id, versions, 'Meal not found')
+        
+        bump_version(current_user_id, 'plan')
         db.session.commit()
         
         return jsonify({'message': 'Meal deleted successfully'}), 200
         
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': 'Failed to delete meal', 'details': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': 'Failed to delete meal', 'details': str(e)}), 500
+
+@meals_bp.route('/plan', methods=['PUT'])
+@jwt_required()
+@write_transaction
+def upsert_weekly_plan():
+    """
+    Save the whole week in one request
+    
+    Meals are upserted by day_of_week and their ingredient lists are diffed,
+    so only changed rows are inserted, updated or deleted. Everything is
+    applied in a single transaction.
+    
+    Headers:
+    Authorization: Bearer <jwt_token>
+    
+    Request Body:
+    {
+        "meals": [
+            {
+                "day_of_week": "Monday",
+                "name": "Spaghetti Carbonara",
+                "notes": "Classic Italian pasta dish",
+                "ingredients": [
+                    {
+                        "name": "Spaghetti",
+                        "quantity": "200g"
+                    }
+                ]
+            }
+        ],
+        "replace": false  (optional, delete meals on days missing from "meals")
+    }
+    
+    Response:
+    {
+        "message": "Meal plan saved successfully",
+        "summary": {"created": 1, "updated": 2, "unchanged": 4, "deleted": 0},
+        "meals": [...]
+    }
+    """
+    try:
+        current_user_id = int(get_jwt_identity())
+        data = request.get_json(silent=True)
+        
+        # Validate the payload before touching the database
+        if not isinstance(data, dict) or not isinstance(data.get('meals'), list):
+            return jsonify({'error': 'A list of meals is required'}), 400
+        
+        meals_data = data['meals']
+        seen_days = set()
+        for meal_data in meals_data:
+            if not isinstance(meal_data, dict) or not meal_data.get('day_of_week') or not meal_data.get('name'):
+                return jsonify({'error': 'Day of week and meal name are required for every meal'}), 400
+            if meal_data['day_of_week'] not in VALID_DAYS:
+                return jsonify({'error': 'Invalid day of week'}), 400
+            if meal_data['day_of_week'] in seen_days:
+                return jsonify({'error': f"Duplicate meal for {meal_data['day_of_week']}"}), 400
+            error = _invalid_ingredients(meal_data.get('ingredients'))
+            if error:
+                return jsonify({'error': error}), 400
+            seen_days.add(meal_data['day_of_week'])
+        
+        # Load the current week with ingredients in a fixed number of queries
+        existing_by_day = {}
+        for meal in _meal_query().filter_by(user_id=current_user_id).order_by(Meal.id).all():
+            existing_by_day.setdefault(meal.day_of_week, meal)
+        
+        summary = {'created': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+        saved_days = set()  # days whose meal was created or changed
+        now = datetime.utcnow()
+        
+        for meal_data in meals_data:
+            meal = existing_by_day.get(meal_data['day_of_week'])
+            
+            if meal is None:
+                meal = Meal(
+                    user_id=current_user_id,
+                    day_of_week=meal_data['day_of_week'],
+                    name=meal_data['name'],
+                    notes=meal_data.get('notes', '')
+                )
+                _sync_ingredients(meal, meal_data.get('ingredients') or [])
+                db.session.add(meal)
+                summary['created'] += 1
+                saved_days.add(meal.day_of_week)
+                continue
+            
+            changed = False
+            if meal.name != meal_data['name']:
+                meal.name = meal_data['name']
+                changed = True
+            if 'notes' in meal_data and meal.notes != meal_data['notes']:
+                meal.notes = meal_data['notes']
+                changed = True
+            if 'ingredients' in meal_data:
+                changed = _sync_ingredients(meal, meal_data['ingredients'] or []) or changed
+            
+            if changed:
+                meal.updated_at = now
+                meal.version = Meal.version + 1
+                summary['updated'] += 1
+                saved_days.add(meal.day_of_week)
+            else:
+                summary['unchanged'] += 1
+        
+        # Optionally drop meals on days that were left out of the payload
+        if data.get('replace'):
+            for day, meal in existing_by_day.items():
+                if day not in seen_days:
+                    db.session.delete(meal)
+                    summary['deleted'] += 1
+        
+        if summary['created'] or summary['updated'] or summary['deleted']:
+            bump_version(current_user_id, 'plan')
+        db.session.commit()
+        
+        meals = _meal_query().filter_by(user_id=current_user_id).all()
+        _add_to_library([meal for meal in meals if meal.day_of_week in saved_days], current_user_id)
+        
+        return jsonify({
+            'message': 'Meal plan saved successfully',
+            'summary': summary,
+            'meals': [meal.to_dict() for meal in meals]
+        }), 200
+        
+    except IntegrityError:
+        # Another request added a meal on one of the days in the meantime
+        db.session.rollback()
+        return jsonify({'error': 'Meal plan was changed by another request'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to save meal plan', 'details': str(e)}), 500
@@ -0,0 +1,261 @@
+"""
+Request, database and AI call metrics in Prometheus text format
+
+Metrics.init_app hooks into the app and the SQLAlchemy engine:
+- before/after_request time every request and record a latency histogram
+  and a status-code counter per route (the URL rule, such as
+  /api/meals/<int:meal_id>, so label cardinality stays bounded);
+- before/after_cursor_execute count SQL statements and their time, both
+  in total and per request (as histograms of queries and DB seconds per
+  request, per route);
+- an observer on ai_calls records provider call latency by outcome.
+
+With METRICS_SERVER_TIMING on, every response also carries its own SQL
+count and time in a Server-Timing header (db;dur=<ms>;desc="<n> queries"),
+which lets load tests attribute database time to individual requests.
+
+Component counters (caches, jobs, rate limiter, ...) are read from their
+stats() methods at scrape time through register_collector(). Everything
+is exposed at GET /metrics. Metrics are kept per process: with several
+gunicorn workers each scrape shows the worker that answered it.
+
+Usage:
+    metrics.init_app(app)
+    metrics.register_collector('ai_cache', ai_cache.stats)
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from resilience import ai_calls
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20, 50, 100)
+DB_SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+AI_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+_NAME_RE = re.compile(r'[^a-zA-Z0-9_]')
+
+class Histogram:
+    """Cumulative-bucket histogram; callers hold the registry lock"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def _labels(names, values):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+class Metrics:
+    """Process-wide metrics registry with a Prometheus exposition endpoint"""
+
+    def __init__(self):
+        self.enabled = True
+        self.token = None
+        self.server_timing = False
+        self.provider = None
+        self._lock = threading.Lock()
+        self._local = threading.local()  # SQL counters of the request on this thread
+        self._collectors = {}
+        self.reset()
+
+    def reset(self):
+        """Drop all recorded values"""
+        with self._lock:
+            self._requests = {}        # (method, route, status) -> count
+            self._latency = {}         # (method, route) -> Histogram
+            self._request_queries = {}  # route -> Histogram
+            self._request_db = {}      # route -> Histogram
+            self._ai_calls = {}        # (kind, outcome) -> Histogram
+            self._queries = 0
+            self._query_seconds = 0.0
+
+    def init_app(self, app):
+        """
+        Register the request hooks, the SQL event listeners and GET /metrics
+
+        Raises ValueError when METRICS_REQUIRE_TOKEN is set, metrics are
+        enabled and METRICS_TOKEN is not, so /metrics is never left open.
+        """
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.token = app.config.get('METRICS_TOKEN')
+        self.server_timing = app.config.get('METRICS_SERVER_TIMING', False)
+        self.provider = app.config.get('AI_PROVIDER')
+        if not self.enabled:
+            return
+        if app.config.get('METRICS_REQUIRE_TOKEN') and not self.token:
+            raise ValueError('METRICS_TOKEN must be set when metrics are enabled (or set METRICS_ENABLED=false)')
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view, methods=['GET'])
+
+        # Listen on the Engine class, once, so engines created later are covered too
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+        ai_calls.add_observer(self.observe_ai_call)
+
+    def register_collector(self, name, collect):
+        """Export the numeric values of collect() (a stats dict) as mealmate_<name>_* gauges"""
+        self._collectors[name] = collect
+
+    def _start_request(self):
+        local = self._local
+        local.started = time.perf_counter()
+        local.queries = 0
+        local.query_seconds = 0.0
+
+    def _finish_request(self, response):
+        local = self._local
+        started = getattr(local, 'started', None)
+        if started is None:
+            return response
+        seconds = time.perf_counter() - started
+        local.started = None
+
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        method = request.method
+        with self._lock:
+            key = (method, route, response.status_code)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            histogram = self._latency.get((method, route))
+            if histogram is None:
+                histogram = self._latency[(method, route)] = Histogram(HTTP_BUCKETS)
+            histogram.observe(seconds)
+            histogram = self._request_queries.get(route)
+            if histogram is None:
+                histogram = self._request_queries[route] = Histogram(QUERY_COUNT_BUCKETS)
+                self._request_db[route] = Histogram(DB_SECONDS_BUCKETS)
+            histogram.observe(local.queries)
+            self._request_db[route].observe(local.query_seconds)
+            self._queries += local.queries
+            self._query_seconds += local.query_seconds
+        if self.server_timing:
+            response.headers['Server-Timing'] = f'db;dur={local.query_seconds * 1000:.3f};desc="{local.queries} queries"'
+        return response
+
+    def record_query(self, seconds):
+        """Count one SQL statement, also against the current request if there is one"""
+        if not self.enabled:
+            return
+        local = self._local
+        if getattr(local, 'started', None) is not None:
+            # Added to the process totals when the request finishes, so the
+            # common case takes no lock per statement
+            local.queries += 1
+            local.query_seconds += seconds
+            return
+        with self._lock:
+            self._queries += 1
+            self._query_seconds += seconds
+
+    def observe_ai_call(self, kind, seconds, outcome):
+        """Record one provider call ('call' or 'stream') and its outcome"""
+        with self._lock:
+            histogram = self._ai_calls.get((kind, outcome))
+            if histogram is None:
+                histogram = self._ai_calls[(kind, outcome)] = Histogram(AI_BUCKETS)
+            histogram.observe(seconds)
+
+    def request_queries(self):
+        """SQL statements run so far by the request on this thread"""
+        return getattr(self._local, 'queries', 0)
+
+    def _metrics_view(self):
+        if self.token and request.headers.get('Authorization') != f'Bearer {self.token}':
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(self.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines.append('# HELP mealmate_http_requests_total HTTP requests by method, route and status')
+            lines.append('# TYPE mealmate_http_requests_total counter')
+            for (method, route, status), count in sorted(self._requests.items()):
+                lines.append(f'mealmate_http_requests_total{{{_labels(("method", "route", "status"), (method, route, status))}}} {count}')
+            self._render_histograms(lines, 'mealmate_http_request_duration_seconds', 'HTTP request latency',
+                                    ('method', 'route'), self._latency)
+            self._render_histograms(lines, 'mealmate_http_request_db_queries', 'SQL statements per HTTP request',
+                                    ('route',), {(route,): h for route, h in self._request_queries.items()})
+            self._render_histograms(lines, 'mealmate_http_request_db_seconds', 'Time in SQL statements per HTTP request',
+                                    ('route',), {(route,): h for route, h in self._request_db.items()})
+            self._render_histograms(lines, 'mealmate_ai_call_duration_seconds', 'AI provider call latency',
+                                    ('provider', 'kind', 'outcome'),
+                                    {(self.provider, kind, outcome): h for (kind, outcome), h in self._ai_calls.items()})
+            lines.append('# HELP mealmate_db_queries_total SQL statements executed by this process')
+            lines.append('# TYPE mealmate_db_queries_total counter')
+            lines.append(f'mealmate_db_queries_total {self._queries}')
+            lines.append('# HELP mealmate_db_query_seconds_total Time spent in SQL statements by this process')
+            lines.append('# TYPE mealmate_db_query_seconds_total counter')
+            lines.append(f'mealmate_db_query_seconds_total {self._query_seconds!r}')
+
+        for name, collect in sorted(self._collectors.items()):
+            try:
+                stats = collect()
+            except Exception as e:
+                current_app.logger.warning(f'Metrics collector {name} failed: {e}')
+                continue
+            self._render_stats(lines, f'mealmate_{name}', stats)
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histograms(lines, name, help_text, label_names, histograms):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for label_values, histogram in sorted(histograms.items(), key=lambda item: tuple(map(str, item[0]))):
+            labels = _labels(label_names, label_values)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{{labels}}} {histogram.sum!r}')
+            lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+    def _render_stats(self, lines, prefix, stats):
+        """Flatten a stats dict: numbers become gauges, strings become {value="..."} 1"""
+        for key, value in sorted(stats.items()):
+            name = _NAME_RE.sub('_', f'{prefix}_{key}')
+            if isinstance(value, dict):
+                self._render_stats(lines, name, value)
+            elif isinstance(value, bool):
+                lines.append(f'# TYPE {name} gauge')
+                lines.append(f'{name} {int(value)}')
+            elif isinstance(value, (int, float)):
+                lines.append(f'# TYPE {name} gauge')
+                lines.append(f'{name} {_format_number(value)}')
+            elif isinstance(value, str):
+                lines.append(f'# TYPE {name} gauge')
+                lines.append(f'{name}{{{_labels(("value",), (value,))}}} 1')
+
+# Process-wide metrics registry, configured in create_app
+metrics = Metrics()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if starts:
+        metrics.record_query(time.perf_counter() - starts.pop())
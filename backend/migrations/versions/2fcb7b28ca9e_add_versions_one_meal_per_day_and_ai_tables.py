@@ -0,0 +1,158 @@
+"""Add versions, one meal per day and AI tables
+
+Adds the per-user change markers and per-row versions, the AI cache, job,
+rate limit, recipe library and revoked token tables, and the unique
+(user_id, day_of_week) constraint on meals. Where a user has several meals
+on one day, the most recently created one is kept and the others are
+deleted with their ingredients before the constraint is created.
+
+Revision ID: 2fcb7b28ca9e
+Revises: fcb33fdcaf00
+Create Date: 2026-10-17 07:47:13.636870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# Meals that share a user and day with a newer meal
+DUPLICATE_MEALS = """
+    SELECT older.id FROM meals AS older
+    JOIN meals AS newer
+      ON newer.user_id = older.user_id
+     AND newer.day_of_week = older.day_of_week
+     AND newer.id > older.id
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2fcb7b28ca9e'
+down_revision = 'fcb33fdcaf00'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ai_response_cache',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('prompt', sa.Text(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('response', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('last_accessed_at', sa.DateTime(), nullable=False),
+    sa.Column('hits', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    with op.batch_alter_table('ai_response_cache', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_ai_response_cache_expires_at'), ['expires_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_ai_response_cache_last_accessed_at'), ['last_accessed_at'], unique=False)
+
+    op.create_table('rate_limit_buckets',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_table('recipes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=False),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('ingredients', sa.Text(), nullable=False),
+    sa.Column('prompt', sa.Text(), nullable=True),
+    sa.Column('source', sa.String(length=16), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('content_hash')
+    )
+    op.create_table('ai_jobs',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('prompt', sa.Text(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('parallel', sa.Boolean(), nullable=True),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('worker', sa.String(length=120), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('run_after', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('lease_expires_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('ai_jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_ai_jobs_status_run_after', ['status', 'run_after'], unique=False)
+        batch_op.create_index(batch_op.f('ix_ai_jobs_user_id'), ['user_id'], unique=False)
+
+    op.create_table('revoked_tokens',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('jti', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('revoked_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('jti')
+    )
+    with op.batch_alter_table('revoked_tokens', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_revoked_tokens_user_id'), ['user_id'], unique=False)
+
+    with op.batch_alter_table('grocery_items', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+        batch_op.drop_index(batch_op.f('ix_grocery_items_user_id'))
+        batch_op.create_index('ix_grocery_items_user_created_id', ['user_id', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('meals', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+    # One meal per day: drop older duplicates so the constraint can be created
+    op.execute(f'DELETE FROM ingredients WHERE meal_id IN ({DUPLICATE_MEALS})')
+    op.execute(f'DELETE FROM meals WHERE id IN ({DUPLICATE_MEALS})')
+
+    with op.batch_alter_table('meals', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_meals_user_day', ['user_id', 'day_of_week'])
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('plan_version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('plan_modified_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('groceries_version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('groceries_modified_at', sa.DateTime(), nullable=True))
+
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('groceries_modified_at')
+        batch_op.drop_column('groceries_version')
+        batch_op.drop_column('plan_modified_at')
+        batch_op.drop_column('plan_version')
+
+    with op.batch_alter_table('meals', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_meals_user_day', type_='unique')
+        batch_op.drop_column('version')
+
+    with op.batch_alter_table('grocery_items', schema=None) as batch_op:
+        batch_op.drop_index('ix_grocery_items_user_created_id')
+        batch_op.create_index(batch_op.f('ix_grocery_items_user_id'), ['user_id'], unique=False)
+        batch_op.drop_column('version')
+
+    with op.batch_alter_table('revoked_tokens', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_revoked_tokens_user_id'))
+
+    op.drop_table('revoked_tokens')
+    with op.batch_alter_table('ai_jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_ai_jobs_user_id'))
+        batch_op.drop_index('ix_ai_jobs_status_run_after')
+
+    op.drop_table('ai_jobs')
+    op.drop_table('recipes')
+    op.drop_table('rate_limit_buckets')
+    with op.batch_alter_table('ai_response_cache', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_ai_response_cache_last_accessed_at'))
+        batch_op.drop_index(batch_op.f('ix_ai_response_cache_expires_at'))
+
+    op.drop_table('ai_response_cache')
@@ -0,0 +1,37 @@
+"""Add owner to user-saved recipes
+
+Meals saved by a user are now stored with the user's id and only matched
+for that user. Rows saved before this revision have no recorded owner, so
+they are deleted rather than left shared; each is stored again, with its
+owner, the next time the meal is saved. Downgrading deletes owned rows for
+the same reason.
+
+Revision ID: 76b739221ae9
+Revises: 2fcb7b28ca9e
+Create Date: 2026-10-17 07:52:51.431508
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '76b739221ae9'
+down_revision = '2fcb7b28ca9e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("DELETE FROM recipes WHERE source = 'user'")
+    with op.batch_alter_table('recipes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('user_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_recipes_user_id'), ['user_id'], unique=False)
+        batch_op.create_foreign_key('fk_recipes_user_id_users', 'users', ['user_id'], ['id'])
+
+
+def downgrade():
+    op.execute("DELETE FROM recipes WHERE user_id IS NOT NULL")
+    with op.batch_alter_table('recipes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_recipes_user_id'))
+        batch_op.drop_column('user_id')
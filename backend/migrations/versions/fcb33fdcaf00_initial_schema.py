@@ -0,0 +1,89 @@
+"""Initial schema
+
+Users, meals, ingredients and grocery items as first released.
+
+Revision ID: fcb33fdcaf00
+Revises: 
+Create Date: 2026-10-17 07:47:06.952214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fcb33fdcaf00'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('password_hash', sa.String(length=255), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_users_email'), ['email'], unique=True)
+
+    op.create_table('grocery_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=False),
+    sa.Column('quantity', sa.String(length=100), nullable=False),
+    sa.Column('purchased', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('grocery_items', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_grocery_items_user_id'), ['user_id'], unique=False)
+
+    op.create_table('meals',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day_of_week', sa.String(length=20), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=False),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('meals', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_meals_user_id'), ['user_id'], unique=False)
+
+    op.create_table('ingredients',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('meal_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=False),
+    sa.Column('quantity', sa.String(length=100), nullable=False),
+    sa.ForeignKeyConstraint(['meal_id'], ['meals.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('ingredients', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_ingredients_meal_id'), ['meal_id'], unique=False)
+
+
+
+def downgrade():
+    with op.batch_alter_table('ingredients', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_ingredients_meal_id'))
+
+    op.drop_table('ingredients')
+    with op.batch_alter_table('meals', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_meals_user_id'))
+
+    op.drop_table('meals')
+    with op.batch_alter_table('grocery_items', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_grocery_items_user_id'))
+
+    op.drop_table('grocery_items')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_users_email'))
+
+    op.drop_table('users')
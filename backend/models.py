@@ -1,5 +1,7 @@
+import json
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import joinedload, lazyload, selectinload, subqueryload
 from sqlalchemy.sql import func
 
 db = SQLAlchemy()
@@ -13,6 +15,13 @@ class User(db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=func.now())
     
+    # Change markers bumped by every write to the user's plan or grocery list,
+    # used to answer conditional GETs without loading any rows
+    plan_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    plan_modified_at = db.Column(db.DateTime, default=func.now())
+    groceries_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    groceries_modified_at = db.Column(db.DateTime, default=func.now())
+    
     # Relationships
     meals = db.relationship('Meal', backref='user', lazy=True, cascade='all, delete-orphan')
     grocery_items = db.relationship('GroceryItem', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -20,9 +29,26 @@ class User(db.Model):
     def __repr__(self):
         return f'<User {self.email}>'
 
+class RevokedToken(db.Model):
+    """Access token revoked before its expiry (e.g. on logout), by JWT id"""
+    __tablename__ = 'revoked_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)  # sync high-water mark for the in-memory blocklist
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime)  # None for tokens that never expire
+    
+    def __repr__(self):
+        return f'<RevokedToken {self.jti}>'
+
 class Meal(db.Model):
     """Meal model for storing meal plan information"""
     __tablename__ = 'meals'
+    __table_args__ = (
+        # One meal per day: lets add_meal insert with ON CONFLICT instead of checking first
+        db.UniqueConstraint('user_id', 'day_of_week', name='uq_meals_user_day'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
@@ -31,6 +57,7 @@ class Meal(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=func.now())
     updated_at = db.Column(db.DateTime, default=func.now(), onupdate=func.now())
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # bumped by every write, for If-Match
     
     # Relationships
     ingredients = db.relationship('Ingredient', backref='meal', lazy=True, cascade='all, delete-orphan')
@@ -38,6 +65,18 @@ class Meal(db.Model):
     def __repr__(self):
         return f'<Meal {self.name} for {self.day_of_week}>'
     
+    @classmethod
+    def with_ingredients(cls, strategy='selectin'):
+        """
+        Return a query for meals with the ingredients relationship loaded
+        using the given strategy ('selectin', 'joined', 'subquery' or 'lazy')
+        """
+        try:
+            loader = INGREDIENT_LOADERS[strategy]
+        except KeyError:
+            raise ValueError(f'Unknown ingredient loading strategy: {strategy}')
+        return cls.query.options(loader(cls.ingredients))
+    
     def to_dict(self):
         """Convert meal to dictionary for JSON response"""
         return {
@@ -48,9 +87,20 @@ class Meal(db.Model):
             'notes': self.notes,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'version': self.version,
             'ingredients': [ingredient.to_dict() for ingredient in self.ingredients]
         }
 
+# Loader options for Meal.ingredients, selectable per query via Meal.with_ingredients().
+# 'selectin' and 'subquery' cost one extra SELECT for the whole result set,
+# 'joined' uses a single LEFT OUTER JOIN and 'lazy' issues one SELECT per meal.
+INGREDIENT_LOADERS = {
+    'selectin': selectinload,
+    'joined': joinedload,
+    'subquery': subqueryload,
+    'lazy': lazyload,
+}
+
 class Ingredient(db.Model):
     """Ingredient model for meal ingredients"""
     __tablename__ = 'ingredients'
@@ -75,14 +125,19 @@ class Ingredient(db.Model):
 class GroceryItem(db.Model):
     """Grocery item model for shopping list"""
     __tablename__ = 'grocery_items'
+    __table_args__ = (
+        # Serves both the per-user lookup and keyset pagination on (created_at, id)
+        db.Index('ix_grocery_items_user_created_id', 'user_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     name = db.Column(db.String(200), nullable=False)
     quantity = db.Column(db.String(100), nullable=False)
     purchased = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=func.now())
     updated_at = db.Column(db.DateTime, default=func.now(), onupdate=func.now())
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # bumped by every write, for If-Match
     
     def __repr__(self):
         return f'<GroceryItem {self.name} ({self.quantity}) - {"Purchased" if self.purchased else "Not purchased"}>'
@@ -96,5 +151,113 @@ class GroceryItem(db.Model):
             'quantity': self.quantity,
             'purchased': self.purchased,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        } 
\ No newline at end of file
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'version': self.version
+        }
+
+# Columns selected by the Core read path, in to_dict() key order. A row's
+# _asdict() equals to_dict() except that timestamps stay datetimes, which the
+# app's JSON provider writes in the same ISO format (see json_provider.py)
+MEAL_READ_COLUMNS = (Meal.id, Meal.user_id, Meal.day_of_week, Meal.name, Meal.notes,
+                     Meal.created_at, Meal.updated_at, Meal.version)
+INGREDIENT_READ_COLUMNS = (Ingredient.id, Ingredient.meal_id, Ingredient.name, Ingredient.quantity)
+GROCERY_READ_COLUMNS = (GroceryItem.id, GroceryItem.user_id, GroceryItem.name, GroceryItem.quantity,
+                        GroceryItem.purchased, GroceryItem.created_at, GroceryItem.updated_at,
+                        GroceryItem.version)
+
+class AIResponseCacheEntry(db.Model):
+    """Persistent tier of the AI meal-idea cache, shared across workers and restarts"""
+    __tablename__ = 'ai_response_cache'
+    
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of the normalized request
+    prompt = db.Column(db.Text, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    response = db.Column(db.Text, nullable=False)  # JSON-encoded list of validated meals
+    created_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    last_accessed_at = db.Column(db.DateTime, nullable=False, index=True)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<AIResponseCacheEntry {self.key[:12]} ({self.count} meals)>'
+
+class AIJob(db.Model):
+    """Queued meal-idea generation, persisted so jobs survive restarts"""
+    __tablename__ = 'ai_jobs'
+    __table_args__ = (
+        # Serves the claim query: oldest runnable job first
+        db.Index('ix_ai_jobs_status_run_after', 'status', 'run_after'),
+    )
+    
+    id = db.Column(db.String(32), primary_key=True)  # random hex, returned to the client
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    prompt = db.Column(db.Text, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    parallel = db.Column(db.Boolean)
+    status = db.Column(db.String(16), nullable=False, default='queued')  # queued, running, succeeded, failed
+    result = db.Column(db.Text)  # JSON response body on success
+    error = db.Column(db.Text)   # JSON error body on failure
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker = db.Column(db.String(120))  # host:pid of the worker holding the lease
+    created_at = db.Column(db.DateTime, nullable=False)
+    run_after = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime)
+    lease_expires_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<AIJob {self.id} {self.status}>'
+    
+    def to_dict(self):
+        """Convert job to dictionary for JSON response"""
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'prompt': self.prompt,
+            'count': self.count,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if self.result is not None:
+            data.update(json.loads(self.result))
+        if self.error is not None:
+            data.update(json.loads(self.error))
+        return data
+
+class RateLimitBucket(db.Model):
+    """Token bucket state shared by all worker processes"""
+    __tablename__ = 'rate_limit_buckets'
+    
+    key = db.Column(db.String(64), primary_key=True)  # e.g. "ai:user:42" or "ai:global"
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)  # unix time of the last refill
+    
+    def __repr__(self):
+        return f'<RateLimitBucket {self.key} ({self.tokens:.2f} tokens)>'
+
+class Recipe(db.Model):
+    """Deduplicated library of generated and user-saved meals, searchable by prompt"""
+    __tablename__ = 'recipes'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), unique=True, nullable=False)  # sha256 of name + ingredient names (+ owner)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)  # owner of a user-saved meal; None if shared
+    name = db.Column(db.String(200), nullable=False)
+    notes = db.Column(db.Text)
+    ingredients = db.Column(db.Text, nullable=False)  # JSON list of {"name", "quantity"}
+    prompt = db.Column(db.Text)  # request the meal was generated for, if any
+    source = db.Column(db.String(16), nullable=False)  # 'ai' or 'user'
+    created_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<Recipe {self.name}>'
+    
+    def to_meal(self):
+        """Convert recipe to the meal dict returned by the generate-ideas endpoint"""
+        return {
+            'name': self.name,
+            'notes': self.notes or '',
+            'ingredients': json.loads(self.ingredients)
+        }
@@ -0,0 +1,200 @@
+"""
+Password hashing on a bounded process pool
+
+Password hashes are deliberately expensive to compute, so hashing them in
+the request thread lets a burst of logins take over the CPU that plan and
+grocery requests need. PasswordHasher runs hashing and verification on a
+small process pool instead: at most PASSWORD_HASH_WORKERS hashes run at
+once, and at most PASSWORD_HASH_MAX_PENDING requests may be running or
+waiting. Further requests wait up to PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS
+for a slot and then get HasherBusy, which the auth routes turn into a 503;
+so does a hash that takes longer than PASSWORD_HASH_TIMEOUT_SECONDS.
+
+The algorithm ('bcrypt', 'scrypt' or 'pbkdf2') and its cost are
+configurable. Stored hashes made with other settings, including werkzeug's
+default scrypt hashes, still verify, and needs_rehash() tells the login
+route to replace them with the current settings.
+
+Usage:
+    password_hasher.init_app(app)
+    password_hash = password_hasher.hash(password)
+    if password_hasher.verify(password_hash, password) and password_hasher.needs_rehash(password_hash):
+        password_hash = password_hasher.hash(password)
+"""
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Cost used when PASSWORD_HASH_COST is not set: bcrypt log2 rounds,
+# scrypt log2 N and pbkdf2 iterations
+DEFAULT_COSTS = {'bcrypt': 12, 'scrypt': 15, 'pbkdf2': 600000}
+
+# bcrypt ignores everything past the first 72 bytes of a password
+MAX_PASSWORD_BYTES = 72
+
+class HasherBusy(Exception):
+    """Raised when PASSWORD_HASH_MAX_PENDING hash requests are already queued, or a hash times out"""
+
+def _hash(password, algorithm, cost):
+    """Hash a password with the given algorithm and cost (runs in a pool process)"""
+    if algorithm == 'bcrypt':
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=cost)).decode()
+    if algorithm == 'scrypt':
+        return generate_password_hash(password, method=f'scrypt:{2 ** cost}:8:1')
+    if algorithm == 'pbkdf2':
+        return generate_password_hash(password, method=f'pbkdf2:sha256:{cost}')
+    raise ValueError(f'Unknown password hash algorithm: {algorithm}')
+
+def _verify(password_hash, password):
+    """Check a password against a bcrypt or werkzeug hash (runs in a pool process)"""
+    try:
+        if password_hash.startswith('$2'):
+            # Longer passwords would match on their first 72 bytes alone
+            if len(password.encode()) > MAX_PASSWORD_BYTES:
+                return False
+            return bcrypt.checkpw(password.encode(), password_hash.encode())
+        return check_password_hash(password_hash, password)
+    except ValueError:
+        return False  # malformed or unknown hash format
+
+def hash_parameters(password_hash):
+    """Return (algorithm, cost) of a stored hash, or (None, None) if unrecognized"""
+    try:
+        if password_hash.startswith('$2'):
+            return 'bcrypt', int(password_hash.split('$')[2])
+        method = password_hash.split('$', 1)[0].split(':')
+        if method[0] == 'scrypt' and len(method) == 4:
+            return 'scrypt', int(math.log2(int(method[1])))
+        if method[0] == 'pbkdf2' and len(method) == 3:
+            return 'pbkdf2', int(method[2])
+    except (IndexError, ValueError):
+        pass
+    return None, None
+
+def _pool_context():
+    # A fork of a threaded server process can inherit held locks; start pool
+    # processes from a clean interpreter instead
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+class PasswordHasher:
+    """Hash and verify passwords on a bounded process pool"""
+
+    def __init__(self):
+        self.algorithm = 'bcrypt'
+        self.cost = DEFAULT_COSTS['bcrypt']
+        self.workers = os.cpu_count() or 1
+        self.max_pending = 32
+        self.queue_timeout = 0.5
+        self.timeout = 10.0
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._stats = {'hashed': 0, 'verified': 0, 'rehashed': 0, 'rejected': 0, 'timed_out': 0, 'pending': 0}
+
+    def init_app(self, app):
+        """
+        Read the algorithm, cost and pool limits from the app config
+
+        PASSWORD_HASH_WORKERS=0 hashes in the request thread, without a pool.
+        """
+        algorithm = app.config.get('PASSWORD_HASH_ALGORITHM', 'bcrypt')
+        if algorithm not in DEFAULT_COSTS:
+            raise ValueError(f'Unknown password hash algorithm: {algorithm}')
+        self.algorithm = algorithm
+        self.cost = app.config.get('PASSWORD_HASH_COST') or DEFAULT_COSTS[algorithm]
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', 32)
+        self.queue_timeout = app.config.get('PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS', 0.5)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT_SECONDS', 10.0)
+        self.shutdown()
+        self._slots = threading.BoundedSemaphore(max(1, self.max_pending))
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context())
+            return self._pool
+
+    def shutdown(self):
+        """Stop the pool processes; the next hash starts a new pool"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _count(self, stat, amount=1):
+        with self._lock:
+            self._stats[stat] += amount
+
+    def _submit(self, func, *args):
+        """Run func on the pool and wait up to the hash timeout for its result"""
+        future = self._get_pool().submit(func, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self._count('timed_out')
+            raise HasherBusy(f'Password hash did not finish within {self.timeout}s')
+
+    def _run(self, func, *args):
+        """
+        Run func on the pool once a slot is free; raises HasherBusy if none
+        frees up in time or the result takes longer than the hash timeout
+        """
+        if not self.workers:
+            return func(*args)
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._count('rejected')
+            raise HasherBusy(f'{self.max_pending} password hash requests are already queued')
+        self._count('pending')
+        try:
+            try:
+                return self._submit(func, *args)
+            except BrokenProcessPool:
+                # A pool process died (for example killed by the OOM killer); start a new pool once
+                with self._lock:
+                    self._pool = None
+                return self._submit(func, *args)
+        finally:
+            self._count('pending', -1)
+            self._slots.release()
+
+    def hash(self, password):
+        """Hash a password with the configured algorithm and cost"""
+        password_hash = self._run(_hash, password, self.algorithm, self.cost)
+        self._count('hashed')
+        return password_hash
+
+    def verify(self, password_hash, password):
+        """Whether password matches the stored hash, whatever settings made it"""
+        matches = self._run(_verify, password_hash, password)
+        self._count('verified')
+        return matches
+
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with other settings than the configured ones"""
+        return hash_parameters(password_hash) != (self.algorithm, self.cost)
+
+    def rehash(self, password):
+        """hash() for transparent upgrades on login, counted separately"""
+        password_hash = self.hash(password)
+        self._count('rehashed')
+        return password_hash
+
+    def stats(self):
+        """Hash counters, pending requests and the configured settings"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(algorithm=self.algorithm, cost=self.cost, workers=self.workers, max_pending=self.max_pending)
+        return stats
+
+# Process-wide password hasher, configured in create_app
+password_hasher = PasswordHasher()
@@ -0,0 +1,292 @@
+"""
+Quantity parsing and unit normalization for ingredients and grocery items
+
+Ingredient and grocery quantities are free-form strings ("200g", "1 1/2 cups",
+"2", "1 head"). This module parses them into amounts in a base unit per
+dimension so duplicate ingredients across meals can be combined:
+
+- mass is normalized to grams
+- volume is normalized to millilitres
+- counts are kept per counting unit ("2" and "3 pieces" combine, "1 head"
+  only combines with other heads)
+
+A known unit followed by the ingredient's name ("2 cups flour", "3 cloves
+garlic") is read as the unit alone.
+
+Anything that cannot be parsed ("a pinch", "to taste") is carried through
+verbatim.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+Quantity = namedtuple('Quantity', ['amount', 'unit', 'dimension'])
+
+# unit -> (dimension, factor to the dimension's base unit)
+_UNITS = {
+    # Mass (grams)
+    'mg': ('mass', 0.001),
+    'g': ('mass', 1.0),
+    'kg': ('mass', 1000.0),
+    'oz': ('mass', 28.3495),
+    'lb': ('mass', 453.592),
+    # Volume (millilitres)
+    'ml': ('volume', 1.0),
+    'cl': ('volume', 10.0),
+    'dl': ('volume', 100.0),
+    'l': ('volume', 1000.0),
+    'tsp': ('volume', 4.92892),
+    'tbsp': ('volume', 14.7868),
+    'cup': ('volume', 236.588),
+    'fl oz': ('volume', 29.5735),
+    'pint': ('volume', 473.176),
+    'quart': ('volume', 946.353),
+    'gallon': ('volume', 3785.41),
+}
+
+_ALIASES = {
+    'milligram': 'mg', 'milligrams': 'mg',
+    'gram': 'g', 'grams': 'g', 'gr': 'g', 'grm': 'g',
+    'kilogram': 'kg', 'kilograms': 'kg', 'kgs': 'kg', 'kilo': 'kg', 'kilos': 'kg',
+    'ounce': 'oz', 'ounces': 'oz',
+    'pound': 'lb', 'pounds': 'lb', 'lbs': 'lb',
+    'millilitre': 'ml', 'millilitres': 'ml', 'milliliter': 'ml', 'milliliters': 'ml', 'mls': 'ml',
+    'centilitre': 'cl', 'centiliter': 'cl',
+    'decilitre': 'dl', 'deciliter': 'dl',
+    'litre': 'l', 'litres': 'l', 'liter': 'l', 'liters': 'l', 'ltr': 'l',
+    'teaspoon': 'tsp', 'teaspoons': 'tsp', 'tsps': 'tsp',
+    'tablespoon': 'tbsp', 'tablespoons': 'tbsp', 'tbsps': 'tbsp', 'tbs': 'tbsp', 'tbl': 'tbsp',
+    'cups': 'cup',
+    'fluid ounce': 'fl oz', 'fluid ounces': 'fl oz', 'floz': 'fl oz',
+    'pints': 'pint', 'pt': 'pint',
+    'quarts': 'quart', 'qt': 'quart',
+    'gallons': 'gallon', 'gal': 'gallon',
+}
+
+# Words that mean "a plain count" rather than a distinct counting unit
+_PLAIN_COUNT_UNITS = {'', 'piece', 'pieces', 'pc', 'pcs', 'x', 'whole', 'item', 'items', 'unit', 'units'}
+
+# Counting units, singular; "2 cans of tomatoes" keeps its "of ..." phrase
+_COUNT_UNITS = {
+    'bag', 'bar', 'batch', 'block', 'bottle', 'box', 'bulb', 'bunch', 'can', 'carton', 'clove', 'cube',
+    'dash', 'ear', 'fillet', 'handful', 'head', 'jar', 'knob', 'leaf', 'loaf', 'pack', 'packet', 'pinch',
+    'punnet', 'rasher', 'sachet', 'sheet', 'slice', 'sprig', 'stalk', 'stick', 'tin', 'tub',
+}
+
+# Plurals that are not the singular plus "s" (consonant + "y" -> "ies" is handled by rule)
+_PLURALS = {
+    'batch': 'batches', 'box': 'boxes', 'brunch': 'brunches', 'bunch': 'bunches', 'dash': 'dashes',
+    'dish': 'dishes', 'fox': 'foxes', 'glass': 'glasses', 'half': 'halves', 'knife': 'knives',
+    'leaf': 'leaves', 'loaf': 'loaves', 'lunch': 'lunches', 'mango': 'mangoes', 'mass': 'masses',
+    'peach': 'peaches', 'pinch': 'pinches', 'potato': 'potatoes', 'radish': 'radishes',
+    'sandwich': 'sandwiches', 'squash': 'squashes', 'tomato': 'tomatoes',
+}
+_SINGULARS = {plural: singular for singular, plural in _PLURALS.items()}
+
+_UNICODE_FRACTIONS = {
+    '½': 0.5, '⅓': 1 / 3, '⅔': 2 / 3, '¼': 0.25, '¾': 0.75,
+    '⅕': 0.2, '⅖': 0.4, '⅗': 0.6, '⅘': 0.8, '⅙': 1 / 6, '⅛': 0.125,
+}
+
+# decimal: "1,000", "1,000.5" (thousands separators), "1.5", "1,5" (decimal comma)
+_DECIMAL = r'(?:\d{1,3}(?:,\d{3})+(?:\.\d+)?(?!\d)|\d+(?:[.,]\d+)?)'
+# amount: "1 1/2", "1/2", a decimal, "1½", "½", optionally a range "1-2"
+_NUMBER = rf'(?:{_DECIMAL}\s*[½⅓⅔¼¾⅕⅖⅗⅘⅙⅛]|\d+\s+\d+/\d+|\d+/\d+|{_DECIMAL}|[½⅓⅔¼¾⅕⅖⅗⅘⅙⅛])'
+_QUANTITY_RE = re.compile(
+    rf'^\s*(?P<amount>{_NUMBER})(?:\s*(?:-|–|to)\s*(?P<upper>{_NUMBER}))?\s*(?P<unit>[^\d\s].*?)?\s*$',
+    re.IGNORECASE
+)
+_THOUSANDS_RE = re.compile(r'\d{1,3}(?:,\d{3})+(?:\.\d+)?')
+_WHITESPACE_RE = re.compile(r'\s+')
+_NAME_STRIP_RE = re.compile(r'[^\w\s-]')
+
+def _parse_decimal(text):
+    """A comma followed by groups of exactly three digits separates thousands, any other is a decimal comma"""
+    if _THOUSANDS_RE.fullmatch(text):
+        return float(text.replace(',', ''))
+    return float(text.replace(',', '.'))
+
+def _parse_number(text):
+    """Convert a matched amount ("1 1/2", "1,5", "1,000", "2½") to a float"""
+    text = text.strip()
+    if text[-1] in _UNICODE_FRACTIONS:
+        whole = text[:-1].strip()
+        return (_parse_decimal(whole) if whole else 0.0) + _UNICODE_FRACTIONS[text[-1]]
+    if '/' in text:
+        parts = text.split()
+        whole = float(parts[0]) if len(parts) == 2 else 0.0
+        numerator, denominator = parts[-1].split('/')
+        if float(denominator) == 0:
+            raise ValueError('Division by zero in quantity')
+        return whole + float(numerator) / float(denominator)
+    return _parse_decimal(text)
+
+def _singular(word):
+    """Very small English singularizer for unit and ingredient names, the inverse of _plural"""
+    if word in _SINGULARS:
+        return _SINGULARS[word]
+    if word in _PLURALS:
+        return word
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+def _plural(word):
+    """Plural of a singular unit or ingredient name"""
+    if word in _PLURALS:
+        return _PLURALS[word]
+    if len(word) > 2 and word.endswith('y') and word[-2] not in 'aeiou':
+        return word[:-1] + 'ies'
+    return word + 's'
+
+def _measure_unit(words):
+    """The mass or volume unit the words start with, or None"""
+    for size in (2, 1):
+        unit = ' '.join(words[:size])
+        unit = _ALIASES.get(unit, unit)
+        if len(words) >= size and unit in _UNITS:
+            return unit
+    return None
+
+@lru_cache(maxsize=4096)
+def parse_quantity(text):
+    """
+    Parse a free-form quantity string
+
+    Returns a Quantity(amount, unit, dimension) with the amount expressed in
+    the given unit, or None if the string cannot be parsed. Ranges ("1-2
+    cups") use their upper bound so the shopping list never comes up short.
+    """
+    if not text:
+        return None
+
+    match = _QUANTITY_RE.match(str(text))
+    if not match:
+        return None
+
+    try:
+        amount = _parse_number(match.group('amount'))
+        if match.group('upper'):
+            amount = max(amount, _parse_number(match.group('upper')))
+    except (ValueError, ZeroDivisionError):
+        return None
+
+    unit = _WHITESPACE_RE.sub(' ', (match.group('unit') or '').lower()).strip()
+    words = [word.rstrip('.') for word in unit.split(' ')]
+
+    # What follows a known unit is the ingredient's name ("2 cups flour"),
+    # unless it holds another amount ("2 x 400g cans")
+    named = not any(char.isdigit() for char in unit)
+    measure = _measure_unit(words)
+    if measure and (named or _ALIASES.get(' '.join(words), ' '.join(words)) == measure):
+        return Quantity(amount, measure, _UNITS[measure][0])
+    if words[0] in _PLAIN_COUNT_UNITS and (named or len(words) == 1):
+        return Quantity(amount, '', 'count')
+
+    head = _singular(words[0])
+    if head in _COUNT_UNITS and named:
+        # "3 cloves garlic" -> "clove"; "2 cans of tomatoes" -> "can of tomatoes"
+        rest = words[1:] if len(words) > 1 and words[1] == 'of' else []
+        return Quantity(amount, ' '.join([head] + rest), 'count')
+
+    # Anything else is a counting unit of its own ("large egg"), singular like a name
+    words[-1] = _singular(words[-1])
+    return Quantity(amount, ' '.join(words), 'count')
+
+def normalize_name(name):
+    """Normalize an ingredient name for matching ("Red Onions " -> "red onion")"""
+    words = _NAME_STRIP_RE.sub('', str(name).lower()).split()
+    if words:
+        words[-1] = _singular(words[-1])
+    return ' '.join(words)
+
+def format_amount(amount):
+    """Format a number with at most two decimals and no trailing zeros"""
+    text = f'{amount:.2f}'.rstrip('0').rstrip('.')
+    return text or '0'
+
+def _format_count(amount, unit):
+    if not unit:
+        return format_amount(amount)
+    if amount != 1:
+        # Counting units are stored singular: pluralize the unit word
+        words = unit.split(' ')
+        index = 0 if words[0] in _COUNT_UNITS else len(words) - 1
+        words[index] = _plural(words[index])
+        unit = ' '.join(words)
+    return f'{format_amount(amount)} {unit}'
+
+def _format_measure(total, dimension, units):
+    """Format a mass/volume total, keeping the original unit if only one was used"""
+    if len(units) == 1:
+        unit = next(iter(units))
+        amount = total / _UNITS[unit][1]
+        if unit in ('cup', 'pint', 'quart', 'gallon') and amount != 1:
+            unit += 's'
+        return f'{format_amount(amount)} {unit}'
+
+    if dimension == 'mass':
+        return f'{format_amount(total / 1000)} kg' if total >= 1000 else f'{format_amount(total)} g'
+    return f'{format_amount(total / 1000)} l' if total >= 1000 else f'{format_amount(total)} ml'
+
+class QuantityAggregator:
+    """
+    Combine ingredient quantities by normalized name
+
+    Usage:
+        aggregator = QuantityAggregator()
+        for name, quantity in rows:
+            aggregator.add(name, quantity)
+        for name, quantity in aggregator.items():
+            ...
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def add(self, name, quantity):
+        key = normalize_name(name)
+        if not key:
+            return
+
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = {
+                'name': str(name).strip(),
+                'measures': {},   # dimension -> [total in base unit, set of units]
+                'counts': {},     # counting unit -> amount
+                'unparsed': [],
+            }
+
+        parsed = parse_quantity(quantity)
+        if parsed is None:
+            text = str(quantity).strip()
+            if text and text not in entry['unparsed']:
+                entry['unparsed'].append(text)
+        elif parsed.dimension == 'count':
+            entry['counts'][parsed.unit] = entry['counts'].get(parsed.unit, 0.0) + parsed.amount
+        else:
+            measure = entry['measures'].setdefault(parsed.dimension, [0.0, set()])
+            measure[0] += parsed.amount * _UNITS[parsed.unit][1]
+            measure[1].add(parsed.unit)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def keys(self):
+        return self._entries.keys()
+
+    def items(self):
+        """Yield (display name, combined quantity string) in insertion order"""
+        for entry in self._entries.values():
+            parts = []
+            for dimension in ('mass', 'volume'):
+                if dimension in entry['measures']:
+                    total, units = entry['measures'][dimension]
+                    parts.append(_format_measure(total, dimension, units))
+            for unit, amount in entry['counts'].items():
+                parts.append(_format_count(amount, unit))
+            parts.extend(entry['unparsed'])
+            yield entry['name'], ' + '.join(parts)
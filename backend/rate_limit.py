@@ -0,0 +1,155 @@
+"""
+Token-bucket admission control shared across worker processes
+
+Bucket state lives in the rate_limit_buckets table. Taking a token is one
+conditional UPDATE on the bucket's primary key that refills the bucket for
+the elapsed time and spends the token only if enough are available, so the
+cost per request is constant and correct with any number of gunicorn
+workers. A request takes from its user's bucket and from the global bucket
+in one transaction: if either is empty, neither is charged.
+"""
+import math
+import threading
+import time
+from functools import wraps
+from flask import current_app, jsonify
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+from models import db, RateLimitBucket
+
+# Delete idle (full) buckets every this many admissions
+_PRUNE_EVERY = 500
+
+class RateLimited(Exception):
+    """Raised when a bucket has no token; retry_after is the wait until one is available"""
+
+    def __init__(self, key, retry_after):
+        super().__init__(f'Rate limit exceeded for {key}')
+        self.key = key
+        self.retry_after = retry_after
+
+class TokenBucketLimiter:
+    """
+    Per-key token buckets persisted in the database
+
+    Usage:
+        limiter.acquire([('ai:user:42', rate, burst), ('ai:global', rate, burst)])
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._admissions = 0
+        self._stats = {'allowed': 0, 'rejected': 0, 'waited': 0}
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _take(self, conn, key, rate, burst, now, cost=1.0):
+        """Spend cost tokens from one bucket inside conn's transaction, or raise RateLimited"""
+        table = RateLimitBucket.__table__
+        elapsed = db.case((table.c.updated_at < now, now - table.c.updated_at), else_=0.0)
+        refilled = table.c.tokens + elapsed * rate
+        available = db.case((refilled > burst, burst), else_=refilled)
+
+        taken = conn.execute(
+            db.update(table)
+            .where(table.c.key == key, available >= cost)
+            .values(tokens=available - cost, updated_at=now)
+        ).rowcount
+        if taken:
+            return
+
+        # Either the bucket does not exist yet (it starts full) or it is empty
+        try:
+            with conn.begin_nested():
+                conn.execute(db.insert(table).values(key=key, tokens=burst - cost, updated_at=now))
+            return
+        except IntegrityError:
+            pass
+
+        tokens = conn.execute(db.select(available).where(table.c.key == key)).scalar()
+        if rate <= 0:
+            raise RateLimited(key, math.inf)
+        # A concurrent request may have created the bucket meanwhile; retry almost at once
+        raise RateLimited(key, max((cost - tokens) / rate, 0.001))
+
+    def acquire(self, buckets, max_wait=0.0):
+        """
+        Take one token from every (key, rate per second, burst) bucket, all or nothing
+
+        When a bucket is empty and the token will be available within
+        max_wait seconds, sleeps and tries again; otherwise raises
+        RateLimited with the time until a retry can succeed.
+        """
+        deadline = time.monotonic() + max_wait
+        waited = False
+        while True:
+            try:
+                with db.engine.begin() as conn:
+                    now = time.time()
+                    for key, rate, burst in buckets:
+                        self._take(conn, key, rate, burst, now)
+                break
+            except RateLimited as e:
+                if time.monotonic() + e.retry_after > deadline:
+                    self._count('rejected')
+                    raise
+                waited = True
+                time.sleep(e.retry_after)
+
+        self._count('waited' if waited else 'allowed')
+        with self._lock:
+            self._admissions += 1
+            prune = self._admissions % _PRUNE_EVERY == 0
+        if prune:
+            self.prune(max(burst / rate for _, rate, burst in buckets if rate > 0))
+
+    def prune(self, idle_seconds):
+        """Delete buckets untouched for idle_seconds; they would be full again anyway"""
+        table = RateLimitBucket.__table__
+        with db.engine.begin() as conn:
+            return conn.execute(db.delete(table).where(table.c.updated_at < time.time() - idle_seconds)).rowcount
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+# Process-wide limiter; its state is in the database, only counters are per process
+limiter = TokenBucketLimiter()
+
+def ai_generation_buckets(user_id, config):
+    """The per-user and global buckets charged for one AI generation request"""
+    return [
+        (f'ai:user:{user_id}', config['AI_RATE_LIMIT_USER_PER_MINUTE'] / 60.0, config['AI_RATE_LIMIT_USER_BURST']),
+        ('ai:global', config['AI_RATE_LIMIT_GLOBAL_PER_MINUTE'] / 60.0, config['AI_RATE_LIMIT_GLOBAL_BURST']),
+    ]
+
+def ai_rate_limited(view):
+    """
+    Admit AI generation requests through the per-user and global token buckets
+
+    Must be applied below @jwt_required(). Requests that would have to wait
+    longer than AI_RATE_LIMIT_MAX_WAIT_SECONDS get a 429 response with a
+    Retry-After header.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        config = current_app.config
+        if config['AI_RATE_LIMIT_ENABLED']:
+            try:
+                limiter.acquire(
+                    ai_generation_buckets(int(get_jwt_identity()), config),
+                    max_wait=config['AI_RATE_LIMIT_MAX_WAIT_SECONDS']
+                )
+            except RateLimited as e:
+                scope = 'global' if e.key == 'ai:global' else 'user'
+                response = jsonify({
+                    'error': 'Too many AI requests, please retry later',
+                    'details': f'{scope} rate limit exceeded',
+                    'retry_after': round(e.retry_after, 1)
+                })
+                response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+                return response, 429
+        return view(*args, **kwargs)
+    return wrapper
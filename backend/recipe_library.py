@@ -0,0 +1,357 @@
+"""
+Recipe library: generated and saved meals, searchable by prompt
+
+Every validated meal returned by the model, and every meal a user saves to
+their plan, is stored once in the recipes table (deduplicated by a hash of
+its name and ingredient names). Generated meals are shared by all users;
+saved meals belong to the user who saved them and are only ever matched
+for that user. Two RecipeIndex instances, TF-IDF inverted
+indexes in NumPy arrays, cover each recipe's content (name, notes and
+ingredients) and the prompt it was generated for. A recipe's similarity to
+a new prompt is the better of the two cosine scores, so a request phrased
+differently from an earlier one still finds its meals; prompts whose best
+matches are similar enough are answered without calling the model.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+from flask import current_app
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from models import db, Recipe
+from quantities import normalize_name
+from sqlite_profile import immediate_transaction
+
+_TOKEN_RE = re.compile(r'[a-z]+')
+
+# Words that say nothing about the dish itself
+_STOPWORDS = frozenset('''
+    a an and any are as at be but by can could de for from get give have i idea ideas in into is it its
+    like make me meal meals my of on or our please recipe recipes serve so some something suggest that the
+    their them these this those to up us want we week weekly what which with without would you your
+'''.split())
+
+# Repeat name tokens so the dish name outweighs a long description
+_NAME_WEIGHT = 2
+
+@lru_cache(maxsize=65536)
+def _stem(word):
+    return normalize_name(word)
+
+def tokenize(text):
+    """Lowercase words of two or more letters, singularized, without stopwords"""
+    return [_stem(word) for word in _TOKEN_RE.findall(str(text).lower())
+            if len(word) > 1 and word not in _STOPWORDS]
+
+def recipe_hash(meal, user_id=None):
+    """
+    Content hash of a meal: normalized name plus sorted normalized ingredient
+    names, and the owner's id for a user-saved meal
+    """
+    name = ' '.join(str(meal['name']).lower().split())
+    ingredients = sorted({normalize_name(ingredient['name']) for ingredient in meal.get('ingredients', [])})
+    content = [name, ingredients] if user_id is None else [name, ingredients, user_id]
+    return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+def recipe_terms(name, notes, ingredients):
+    """Term counts of one recipe's content"""
+    terms = Counter(tokenize(name) * _NAME_WEIGHT)
+    terms.update(tokenize(notes or ''))
+    for ingredient in ingredients:
+        terms.update(tokenize(ingredient['name']))
+    return terms
+
+class RecipeIndex:
+    """
+    Sparse TF-IDF index with cosine-similarity search
+
+    Documents are kept as parallel (doc, term, count) arrays; build() turns
+    them into term-sorted postings with L2-normalized weights, and search()
+    scores all documents sharing a term with the query in one np.bincount.
+    A document added with an owner is only returned to searches by that
+    owner; documents without one are returned to everyone.
+
+    Usage:
+        index = RecipeIndex()
+        index.add(recipe_id, terms, owner=user_id)
+        index.build()
+        index.search('quick vegetarian dinner', k=5, owner=user_id)  # [(recipe_id, score), ...]
+    """
+
+    def __init__(self):
+        self.vocabulary = {}
+        self._doc_ids = []        # recipe id of each document
+        self._doc_owners = []     # owning user id of each document, 0 if shared
+        self._pending = ([], [], [])  # docs, terms, counts not yet merged into the arrays
+        self._docs = np.zeros(0, dtype=np.int32)
+        self._terms = np.zeros(0, dtype=np.int32)
+        self._counts = np.zeros(0, dtype=np.float32)
+        self._recipe_ids = np.zeros(0, dtype=np.int64)
+        self._owners = np.zeros(0, dtype=np.int64)
+        self._idf = np.zeros(0, dtype=np.float32)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._posting_docs = np.zeros(0, dtype=np.int32)
+        self._posting_weights = np.zeros(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self._doc_ids)
+
+    def add(self, recipe_id, terms, owner=None):
+        """Queue a document given as a term -> count mapping; call build() before searching"""
+        doc = len(self._doc_ids)
+        self._doc_ids.append(recipe_id)
+        self._doc_owners.append(owner or 0)
+        docs, term_ids, counts = self._pending
+        for term, count in terms.items():
+            term_id = self.vocabulary.setdefault(term, len(self.vocabulary))
+            docs.append(doc)
+            term_ids.append(term_id)
+            counts.append(count)
+
+    def build(self):
+        """Merge queued documents and recompute IDF weights and postings"""
+        docs, term_ids, counts = self._pending
+        if docs:
+            self._docs = np.concatenate([self._docs, np.asarray(docs, dtype=np.int32)])
+            self._terms = np.concatenate([self._terms, np.asarray(term_ids, dtype=np.int32)])
+            self._counts = np.concatenate([self._counts, np.asarray(counts, dtype=np.float32)])
+            self._pending = ([], [], [])
+        self._recipe_ids = np.asarray(self._doc_ids, dtype=np.int64)
+        self._owners = np.asarray(self._doc_owners, dtype=np.int64)
+
+        n_docs = len(self._doc_ids)
+        n_terms = len(self.vocabulary)
+        document_frequency = np.bincount(self._terms, minlength=n_terms)
+        self._idf = (np.log((1.0 + n_docs) / (1.0 + document_frequency)) + 1.0).astype(np.float32)
+
+        weights = (1.0 + np.log(self._counts)) * self._idf[self._terms]
+        norms = np.sqrt(np.bincount(self._docs, weights=weights * weights, minlength=n_docs))
+        weights = weights / np.maximum(norms, 1e-12)[self._docs]
+
+        order = np.argsort(self._terms, kind='stable')
+        self._posting_docs = self._docs[order]
+        self._posting_weights = weights[order].astype(np.float32)
+        self._offsets = np.concatenate([[0], np.cumsum(document_frequency)])
+
+    def search(self, query, k=10, owner=None):
+        """Return up to k (recipe_id, cosine similarity) pairs visible to owner, best first"""
+        query_terms = Counter(tokenize(query))
+        known = [term for term in query_terms if term in self.vocabulary]
+        if not known or not len(self._recipe_ids):
+            return []
+
+        term_ids = np.fromiter((self.vocabulary[term] for term in known), dtype=np.int64)
+        counts = np.fromiter((query_terms[term] for term in known), dtype=np.float32)
+        query_weights = (1.0 + np.log(counts)) * self._idf[term_ids]
+        # Words no recipe contains get the highest IDF: they still count
+        # towards the query's length, so "... with tempeh" is not a perfect
+        # match for recipes that merely share the other words
+        unknown = np.array([query_terms[term] for term in query_terms if term not in self.vocabulary], dtype=np.float32)
+        unknown_weights = (1.0 + np.log(unknown)) * (np.log(1.0 + len(self._recipe_ids)) + 1.0)
+        query_weights /= np.sqrt(np.sum(query_weights ** 2) + np.sum(unknown_weights ** 2))
+
+        starts, ends = self._offsets[term_ids], self._offsets[term_ids + 1]
+        docs = np.concatenate([self._posting_docs[s:e] for s, e in zip(starts, ends)])
+        weights = np.concatenate([
+            self._posting_weights[s:e] * w for s, e, w in zip(starts, ends, query_weights)
+        ])
+        scores = np.bincount(docs, weights=weights, minlength=len(self._recipe_ids))
+        scores[(self._owners != 0) & (self._owners != (owner or 0))] = 0.0
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self._recipe_ids[doc]), float(scores[doc])) for doc in top if scores[doc] > 0]
+
+class RecipeLibrary:
+    """
+    Store meals in the recipes table and answer prompts from the index
+
+    The index is loaded from the table on first use and picks up recipes
+    added by any worker, this one included (rows with a higher id), at most
+    every AI_LIBRARY_REFRESH_SECONDS.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.threshold = 0.75
+        self.refresh_interval = 30.0
+        self.include_user_meals = True
+        self._lock = threading.Lock()
+        self._content = RecipeIndex()
+        self._prompts = RecipeIndex()
+        self._max_id = 0
+        self._refreshed_at = None
+        self._stats = {'stored': 0, 'duplicates': 0, 'hits': 0, 'misses': 0}
+
+    def init_app(self, app):
+        """Read the similarity threshold and refresh interval from the app config"""
+        self.enabled = app.config.get('AI_LIBRARY_ENABLED', True)
+        self.threshold = app.config.get('AI_LIBRARY_THRESHOLD', 0.75)
+        self.refresh_interval = app.config.get('AI_LIBRARY_REFRESH_SECONDS', 30.0)
+        self.include_user_meals = app.config.get('AI_LIBRARY_INCLUDE_USER_MEALS', True)
+        with self._lock:
+            self._content = RecipeIndex()
+            self._prompts = RecipeIndex()
+            self._max_id = 0
+            self._refreshed_at = None
+
+    def _count(self, stat, amount=1):
+        with self._lock:
+            self._stats[stat] += amount
+
+    def add_meals(self, meals, source='ai', prompt=None, user_id=None):
+        """
+        Store meals not yet in the library; returns the number of new recipes
+
+        Meals saved by a user (source 'user') are stored with user_id and only
+        matched for that user; generated meals are shared.
+
+        Database errors are logged rather than raised: the library must never
+        fail the generation or the save that feeds it.
+        """
+        if not meals or not self.enabled or (source == 'user' and not self.include_user_meals):
+            return 0
+        try:
+            return self._store(meals, source, prompt, user_id if source == 'user' else None)
+        except SQLAlchemyError as e:
+            current_app.logger.warning(f'Recipe library: could not store meals: {e}')
+            return 0
+
+    def _store(self, meals, source, prompt, user_id):
+
+        rows = {}
+        for meal in meals:
+            ingredients = [{'name': str(i['name']), 'quantity': str(i['quantity'])} for i in meal.get('ingredients', [])]
+            rows.setdefault(recipe_hash(meal, user_id), {
+                'name': str(meal['name']),
+                'notes': meal.get('notes') or '',
+                'ingredients': json.dumps(ingredients),
+                'prompt': prompt,
+                'source': source,
+                'user_id': user_id,
+            })
+        if not rows:
+            return 0
+
+        table = Recipe.__table__
+        now = datetime.utcnow()
+        # Reads then writes: take the write lock up front (see sqlite_profile)
+        with db.engine.connect() as conn, immediate_transaction(conn):
+            existing = set(conn.execute(
+                db.select(table.c.content_hash).where(table.c.content_hash.in_(list(rows)))
+            ).scalars())
+            new_rows = [dict(row, content_hash=key, created_at=now) for key, row in rows.items() if key not in existing]
+            stored = 0
+            if new_rows:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(db.insert(table), new_rows)
+                    stored = len(new_rows)
+                except IntegrityError:
+                    # Some were stored concurrently by another worker; insert the rest one by one
+                    for row in new_rows:
+                        try:
+                            with conn.begin_nested():
+                                conn.execute(db.insert(table).values(row))
+                            stored += 1
+                        except IntegrityError:
+                            pass
+
+        self._count('stored', stored)
+        self._count('duplicates', len(meals) - stored)
+        # New rows reach the index with the next timed refresh, like rows from
+        # other workers: rebuilding here would put an O(N) build on a request
+        return stored
+
+    def refresh(self, force=False):
+        """Add recipes stored since the last refresh to the index"""
+        with self._lock:
+            due = force or self._refreshed_at is None or time.monotonic() - self._refreshed_at >= self.refresh_interval
+            if not due:
+                return 0
+            self._refreshed_at = time.monotonic()
+
+            table = Recipe.__table__
+            with db.engine.connect() as conn:
+                rows = conn.execute(
+                    db.select(table.c.id, table.c.user_id, table.c.name, table.c.notes, table.c.ingredients, table.c.prompt)
+                    .where(table.c.id > self._max_id)
+                    .order_by(table.c.id)
+                ).all()
+            if not rows:
+                return 0
+
+            # Searches take the same lock, so they never see a half-built index
+            for row in rows:
+                self._content.add(row.id, recipe_terms(row.name, row.notes, json.loads(row.ingredients)), owner=row.user_id)
+                if row.prompt:
+                    self._prompts.add(row.id, Counter(tokenize(row.prompt)), owner=row.user_id)
+            self._content.build()
+            self._prompts.build()
+            self._max_id = rows[-1].id
+            return len(rows)
+
+    def search(self, prompt, k=10, user_id=None):
+        """Return up to k (recipe_id, similarity) pairs for the prompt, among shared recipes and user_id's own"""
+        self.refresh()
+        with self._lock:
+            # Many recipes share a prompt, so look further down both lists before merging
+            candidates = (self._content.search(prompt, k * 4, owner=user_id)
+                          + self._prompts.search(prompt, k * 4, owner=user_id))
+        best = {}
+        for recipe_id, score in candidates:
+            best[recipe_id] = max(score, best.get(recipe_id, 0.0))
+        return sorted(best.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+    def match(self, prompt, count, threshold=None, user_id=None):
+        """
+        Return count library meals for the prompt, or None
+
+        Only answers when at least count recipes reach the similarity
+        threshold (the configured one unless given), so a weak match never
+        replaces a model call. Meals saved by other users are never returned.
+        """
+        if not self.enabled:
+            return None
+        try:
+            return self._match(prompt, count, self.threshold if threshold is None else threshold, user_id)
+        except SQLAlchemyError as e:
+            current_app.logger.warning(f'Recipe library: lookup failed: {e}')
+            return None
+
+    def _match(self, prompt, count, threshold, user_id):
+        results = [(recipe_id, score) for recipe_id, score in self.search(prompt, k=count, user_id=user_id)
+                   if score >= threshold]
+        if len(results) < count:
+            self._count('misses')
+            return None
+
+        ids = [recipe_id for recipe_id, _ in results]
+        recipes = {recipe.id: recipe for recipe in Recipe.query.filter(Recipe.id.in_(ids))}
+        meals = [recipes[recipe_id].to_meal() for recipe_id in ids if recipe_id in recipes]
+        if len(meals) < count:
+            self._count('misses')
+            return None
+
+        self._count('hits')
+        return meals
+
+    def stats(self):
+        """Library counters and index size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['indexed'] = len(self._content)
+            stats['vocabulary'] = len(self._content.vocabulary) + len(self._prompts.vocabulary)
+        stats['threshold'] = self.threshold
+        return stats
+
+# Process-wide library, configured in create_app
+recipe_library = RecipeLibrary()
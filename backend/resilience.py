@@ -0,0 +1,346 @@
+"""
+Deadlines, circuit breaking and hedging for calls to the AI provider
+
+Provider SDK calls can hang far beyond their nominal timeout. Every call
+therefore runs on a bounded thread pool and the request thread waits only
+until the call's deadline, so a slow provider cannot pin gunicorn workers
+that also serve the plan and grocery endpoints.
+
+- CircuitBreaker opens after AI_BREAKER_FAILURE_THRESHOLD consecutive
+  failures or timeouts and rejects calls for AI_BREAKER_RESET_SECONDS; then
+  a single trial call decides whether it closes again.
+- Hedged calls: if a call has not returned after the hedge delay (fixed, or
+  the observed p95 latency) a second identical call is started and the
+  first result to arrive wins.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+class UpstreamUnavailable(Exception):
+    """The AI provider cannot serve the call right now"""
+
+class CircuitOpenError(UpstreamUnavailable):
+    """Raised without calling the provider while the breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__('AI service circuit breaker is open')
+        self.retry_after = retry_after
+
+class DeadlineExceeded(UpstreamUnavailable, TimeoutError):
+    """The call did not complete before its deadline"""
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with a half-open trial call
+
+    Usage:
+        breaker.before_call()      # raises CircuitOpenError when open
+        try:
+            result = call()
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._stats = {'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    def configure(self, failure_threshold, reset_timeout):
+        with self._lock:
+            self.failure_threshold = failure_threshold
+            self.reset_timeout = reset_timeout
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = True
+                return
+            self._stats['rejected'] += 1
+            retry_after = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        raise CircuitOpenError(retry_after)
+
+    def record_success(self):
+        with self._lock:
+            self._stats['successes'] += 1
+            self._failures = 0
+            self._state = self.CLOSED
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._stats['failures'] += 1
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._stats['opened'] += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def release_trial(self):
+        """Give up a half-open trial call without counting a success or a failure"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['state'] = self._current_state()
+            stats['consecutive_failures'] = self._failures
+            if stats['state'] != self.CLOSED:
+                stats['retry_after'] = round(max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)), 1)
+        return stats
+
+class ResilientCaller:
+    """
+    Run provider calls with a deadline, a circuit breaker and optional hedging
+
+    Usage:
+        ai_calls = ResilientCaller()
+        ai_calls.init_app(app)
+        text = ai_calls.call(lambda: provider.generate(...))
+    """
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.timeout = 30.0
+        self.hedge_enabled = False
+        self.hedge_delay = None      # fixed delay in seconds; None means adaptive p95
+        self.hedge_min_samples = 20
+        self.max_workers = 16
+        self._executor = None
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=200)
+        self._observers = []
+        self._stats = {'calls': 0, 'timeouts': 0, 'errors': 0, 'hedged': 0, 'hedge_wins': 0}
+
+    def init_app(self, app):
+        """Read deadlines, breaker limits and hedging settings from the app config"""
+        self.breaker.configure(
+            app.config.get('AI_BREAKER_FAILURE_THRESHOLD', 5),
+            app.config.get('AI_BREAKER_RESET_SECONDS', 30.0)
+        )
+        self.timeout = app.config.get('AI_CALL_TIMEOUT_SECONDS', 30.0)
+        self.hedge_enabled = app.config.get('AI_HEDGE_ENABLED', False)
+        self.hedge_delay = app.config.get('AI_HEDGE_DELAY_SECONDS')
+        self.max_workers = app.config.get('AI_CALL_MAX_WORKERS', 16)
+        with self._lock:
+            self._latencies.clear()
+
+    def add_observer(self, observer):
+        """Call observer(kind, seconds, outcome) after every call or stream ('ok', 'timeout', 'rejected' or 'error')"""
+        if observer not in self._observers:
+            self._observers.append(observer)
+
+    def _observe(self, kind, started, error):
+        if not self._observers:
+            return
+        if error is None or isinstance(error, GeneratorExit):
+            outcome = 'ok'
+        elif isinstance(error, CircuitOpenError):
+            outcome = 'rejected'
+        elif isinstance(error, DeadlineExceeded):
+            outcome = 'timeout'
+        else:
+            outcome = 'error'
+        seconds = time.monotonic() - started
+        for observer in self._observers:
+            observer(kind, seconds, outcome)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ai-call')
+            return self._executor
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def current_hedge_delay(self):
+        """Seconds to wait before hedging, or None when hedging is off or not yet calibrated"""
+        if not self.hedge_enabled:
+            return None
+        if self.hedge_delay:
+            return self.hedge_delay
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def call(self, func, timeout=None, hedge=True):
+        """
+        Run func with the breaker and a deadline, hedging slow calls if enabled
+
+        Raises CircuitOpenError without calling func while the breaker is
+        open, DeadlineExceeded when no attempt finishes in time or the
+        provider reports a timeout itself, or the exception raised by the
+        last failed attempt.
+        """
+        started = time.monotonic()
+        try:
+            result = self._call(func, timeout, hedge)
+        except Exception as e:
+            self._observe('call', started, e)
+            raise
+        self._observe('call', started, None)
+        return result
+
+    def _call(self, func, timeout, hedge):
+        self.breaker.before_call()
+        self._count('calls')
+        timeout = timeout or self.timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        executor = self._get_executor()
+
+        attempts = [executor.submit(func)]
+        hedge_delay = self.current_hedge_delay() if hedge else None
+        if hedge_delay is not None and hedge_delay < timeout:
+            done, _ = wait(attempts, timeout=hedge_delay)
+            if not done:
+                attempts.append(executor.submit(func))
+                self._count('hedged')
+
+        pending = set(attempts)
+        error = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if future is not attempts[0]:
+                        self._count('hedge_wins')
+                    with self._lock:
+                        self._latencies.append(time.monotonic() - started)
+                    self.breaker.record_success()
+                    return future.result()
+                error = future.exception()
+
+        for future in pending:
+            future.cancel()
+        self.breaker.record_failure()
+        if pending or error is None:
+            self._count('timeouts')
+            raise DeadlineExceeded(f'AI call did not complete within {timeout:g}s')
+        if isinstance(error, TimeoutError):
+            self._count('timeouts')
+            raise DeadlineExceeded(str(error)) from error
+        self._count('errors')
+        raise error
+
+    def stream(self, open_stream, timeout=None):
+        """
+        Iterate a provider stream with the breaker and an overall deadline
+
+        The stream is consumed on a pool thread and handed over through a
+        queue, so a stalled stream raises DeadlineExceeded in the caller
+        instead of blocking it.
+        """
+        started = time.monotonic()
+        error = None
+        try:
+            yield from self._stream(open_stream, timeout)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._observe('stream', started, error)
+
+    def _stream(self, open_stream, timeout):
+        self.breaker.before_call()
+        self._count('calls')
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        chunks = queue.Queue()
+        done = object()
+
+        def pump():
+            try:
+                for chunk in open_stream():
+                    chunks.put((chunk, None))
+                chunks.put((done, None))
+            except BaseException as e:
+                chunks.put((done, e))
+
+        self._get_executor().submit(pump)
+        received = False
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        raise queue.Empty
+                    chunk, error = chunks.get(timeout=remaining)
+                except queue.Empty:
+                    self.breaker.record_failure()
+                    self._count('timeouts')
+                    raise DeadlineExceeded(f'AI stream did not complete within {timeout:g}s')
+                if chunk is done:
+                    if error is not None:
+                        self.breaker.record_failure()
+                        if isinstance(error, TimeoutError):
+                            self._count('timeouts')
+                            raise DeadlineExceeded(str(error)) from error
+                        self._count('errors')
+                        raise error
+                    self.breaker.record_success()
+                    return
+                received = True
+                yield chunk
+        except GeneratorExit:
+            # The consumer stopped early; chunks were flowing, so the provider is healthy
+            if received:
+                self.breaker.record_success()
+            else:
+                self.breaker.release_trial()
+            raise
+
+    def stats(self):
+        """Call counters, hedge settings and the breaker state"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['hedge_delay'] = self.current_hedge_delay()
+        stats['breaker'] = self.breaker.stats()
+        return stats
+
+# Process-wide guard for AI provider calls, configured in create_app
+ai_calls = ResilientCaller()
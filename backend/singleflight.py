@@ -0,0 +1,151 @@
+"""
+Single-flight coalescing of identical concurrent calls
+
+Concurrent callers that ask for the same key share one execution of the
+underlying function: the first caller (the leader) runs it and the others
+wait for its result. In 'file' mode the leader additionally holds an
+exclusive lock file for the key, so leaders in other gunicorn workers on the
+same host queue behind it instead of running in parallel; the wrapped
+function is expected to re-check a shared cache once it gets the lock.
+
+Waiting for another caller's result, or for the lock file, is bounded by
+AI_SINGLEFLIGHT_WAIT_SECONDS and ends in DeadlineExceeded, which callers
+already handle as the provider being unavailable.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from resilience import DeadlineExceeded
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process coalescing is available
+    fcntl = None
+
+# How often a leader retries a lock file held by another worker
+_LOCK_POLL_SECONDS = 0.05
+
+class _Call:
+    """State of one in-flight execution"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesce identical in-flight calls
+
+    Usage:
+        flight = SingleFlight()
+        result, shared = flight.do(key, lambda: expensive(key))
+    """
+
+    def __init__(self):
+        self.mode = 'thread'
+        self.lock_dir = os.path.join(tempfile.gettempdir(), 'mealmate-singleflight')
+        self.lock_stripes = 64
+        self.wait_timeout = 60.0
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'calls': 0, 'leaders': 0, 'coalesced': 0, 'lock_waits': 0, 'wait_timeouts': 0}
+
+    def init_app(self, app):
+        """Read the coalescing mode and limits from the app config"""
+        mode = app.config.get('AI_SINGLEFLIGHT_MODE', 'thread')
+        if mode == 'file' and fcntl is None:
+            app.logger.warning('AI_SINGLEFLIGHT_MODE=file needs fcntl; falling back to thread mode')
+            mode = 'thread'
+        self.mode = mode
+        self.lock_dir = app.config.get('AI_SINGLEFLIGHT_LOCK_DIR') or self.lock_dir
+        self.lock_stripes = app.config.get('AI_SINGLEFLIGHT_LOCK_STRIPES', 64)
+        self.wait_timeout = app.config.get('AI_SINGLEFLIGHT_WAIT_SECONDS', 60.0)
+        if self.mode == 'file':
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key, func):
+        """
+        Run func once for all concurrent callers with the same key
+
+        Returns (result, shared) where shared is True if the result came from
+        another caller's execution. Exceptions raised by the leader are
+        re-raised in every waiting caller; DeadlineExceeded is raised when
+        the wait_timeout runs out first.
+        """
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self._stats['leaders'] += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self._stats['coalesced'] += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(self.wait_timeout):
+                with self._lock:
+                    self._stats['wait_timeouts'] += 1
+                raise DeadlineExceeded('Timed out waiting for an identical in-flight request')
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            if self.mode == 'file':
+                call.result = self._run_locked(key, func)
+            else:
+                call.result = func()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run_locked(self, key, func):
+        """Run func while holding the key's lock file, shared by all workers on the host"""
+        stripe = int(hashlib.sha256(key.encode()).hexdigest(), 16) % self.lock_stripes
+        path = os.path.join(self.lock_dir, f'{stripe}.lock')
+        with open(path, 'a') as lock_file:
+            deadline = time.monotonic() + self.wait_timeout
+            waited = False
+            # Poll rather than block, so a stuck holder cannot pin this worker past the deadline
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if not waited:
+                        waited = True
+                        with self._lock:
+                            self._stats['lock_waits'] += 1
+                    if time.monotonic() >= deadline:
+                        with self._lock:
+                            self._stats['wait_timeouts'] += 1
+                        raise DeadlineExceeded('Timed out waiting for an identical request in another worker')
+                    time.sleep(_LOCK_POLL_SECONDS)
+            try:
+                return func()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self):
+        """Coalescing counters and the number of calls currently in flight"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        stats['mode'] = self.mode
+        return stats
+
+# Process-wide instance for AI generation requests, configured in create_app
+ai_singleflight = SingleFlight()
@@ -0,0 +1,97 @@
+"""
+SQLite connection profile for running several gunicorn workers on one database file
+
+With SQLITE_PROFILE = 'production' and a SQLite database, init_sqlite():
+- applies SQLITE_PRAGMAS (WAL journal, synchronous=NORMAL, mmap_size,
+  cache_size, busy_timeout, foreign_keys, ...) to every new connection;
+- takes transaction control from the sqlite3 driver. By default the driver
+  starts a deferred transaction before the first write, so a request that
+  reads and then writes only asks for the write lock halfway through. If
+  another worker committed in the meantime, SQLite fails that request at
+  once with "database is locked" and does not wait out busy_timeout. Every
+  transaction now starts with an explicit BEGIN. In views decorated with
+  @write_transaction, the first transaction starts with BEGIN IMMEDIATE
+  instead, which takes the write lock up front and waits for it. Later
+  transactions in the view are plain again, such as reloading rows for the
+  response after the commit. Otherwise such a read would hold the write
+  lock while the recipe library writes on its own connection.
+
+The 'default' profile leaves SQLite's and the driver's behaviour alone.
+
+Usage:
+    db.init_app(app)
+    init_sqlite(app)
+
+    @write_transaction
+    def toggle_grocery_item(item_id): ...
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from sqlalchemy import event
+
+from models import db
+
+# Whether the next transaction begun in this context takes the write lock at once
+_immediate = ContextVar('sqlite_begin_immediate', default=False)
+
+def _on_connect(pragmas):
+    def configure(dbapi_connection, connection_record):
+        # Autocommit at the driver level: _on_begin emits BEGIN itself
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+    return configure
+
+def _on_begin(conn):
+    immediate = _immediate.get()
+    if immediate:
+        _immediate.set(False)
+    # On the driver connection, so BEGIN is not counted as a statement in metrics
+    conn.connection.driver_connection.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+
+def init_sqlite(app):
+    """Apply the configured SQLite profile to the app's engine; other databases are left alone"""
+    profile = app.config.get('SQLITE_PROFILE', 'default')
+    if profile == 'default':
+        return
+    if profile != 'production':
+        raise ValueError(f'Unknown SQLite profile: {profile}')
+
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+    event.listen(engine, 'connect', _on_connect(app.config.get('SQLITE_PRAGMAS', {})))
+    event.listen(engine, 'begin', _on_begin)
+    engine.dispose()  # connections opened before the listeners existed lack the pragmas
+
+def manages_transactions(engine):
+    """Whether init_sqlite took transaction control for this engine"""
+    return event.contains(engine, 'begin', _on_begin)
+
+def write_transaction(view):
+    """Start the view's first transaction with BEGIN IMMEDIATE (under the production profile)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _immediate.set(True)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _immediate.reset(token)
+    return wrapper
+
+@contextmanager
+def immediate_transaction(connection):
+    """connection.begin() that takes SQLite's write lock at once, whatever the profile"""
+    token = _immediate.set(True)
+    try:
+        with connection.begin() as transaction:
+            if connection.dialect.name == 'sqlite' and not manages_transactions(connection.engine):
+                connection.connection.driver_connection.execute('BEGIN IMMEDIATE')
+            yield transaction
+    finally:
+        _immediate.reset(token)
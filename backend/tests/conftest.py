@@ -0,0 +1,106 @@
+"""
+Shared fixtures: an app on a temporary SQLite file with the local AI provider,
+seeded users and SQL statement counting
+"""
+from contextlib import contextmanager
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from app import create_app
+from config import config, TestingConfig
+from models import db, User, Meal, Ingredient, GroceryItem
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+@pytest.fixture
+def app(tmp_path):
+    class FileTestingConfig(TestingConfig):
+        # A file database: the in-memory one is a single shared connection,
+        # which breaks as soon as worker threads touch it
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "test.db"}'
+        AI_PROVIDER = 'local'
+    
+    config['file-testing'] = FileTestingConfig
+    app = create_app('file-testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(email='user@example.com', password_hash='x'))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def auth_headers(app):
+    """Authorization headers for the user created by the app fixture"""
+    with app.app_context():
+        return {'Authorization': f'Bearer {create_access_token(identity="1")}'}
+
+@pytest.fixture
+def seed_user(app):
+    """
+    Factory that creates a user with a meal plan and grocery list
+
+    Meals go on consecutive days from Monday, each with the given number of
+    ingredients; returns (auth headers, {'user': id, 'meals': [...], 'groceries': [...]}).
+    """
+    created = [0]
+    
+    def seed(meals=0, ingredients=0, groceries=0):
+        created[0] += 1
+        with app.app_context():
+            user = User(email=f'seeded{created[0]}@example.com', password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            meal_ids = db.session.scalars(db.insert(Meal).returning(Meal.id), [
+                {'user_id': user.id, 'day_of_week': DAYS[i], 'name': f'Meal {i}', 'notes': f'Notes {i}'}
+                for i in range(meals)
+            ]).all() if meals else []
+            if meal_ids and ingredients:
+                db.session.execute(db.insert(Ingredient), [
+                    {'meal_id': meal_id, 'name': f'Ingredient {j}', 'quantity': f'{j + 1}00 g'}
+                    for meal_id in meal_ids for j in range(ingredients)
+                ])
+            grocery_ids = db.session.scalars(db.insert(GroceryItem).returning(GroceryItem.id), [
+                {'user_id': user.id, 'name': f'Item {i}', 'quantity': str(i % 5 + 1), 'purchased': i % 3 == 0}
+                for i in range(groceries)
+            ]).all() if groceries else []
+            db.session.commit()
+            headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+            return headers, {'user': user.id, 'meals': list(meal_ids), 'groceries': list(grocery_ids)}
+    
+    return seed
+
+@pytest.fixture
+def count_queries(app):
+    """
+    Context manager factory collecting the SQL statements run on the app engine
+
+    Usage:
+        with count_queries() as statements:
+            client.get(...)
+        assert len(statements) <= 3
+    """
+    with app.app_context():
+        engine = db.engine
+    
+    @contextmanager
+    def counter():
+        statements = []
+        
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(engine, 'after_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'after_cursor_execute', record)
+    
+    return counter
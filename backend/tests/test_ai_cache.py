@@ -0,0 +1,98 @@
+"""
+Tests for the two-tier AI response cache
+"""
+from datetime import timedelta
+
+import ai_service
+from ai_cache import AIResponseCache, ai_cache, make_cache_key
+from models import db, AIResponseCacheEntry
+from recipe_library import recipe_library
+
+MEALS = [{'name': 'Chickpea Curry', 'ingredients': []}]
+
+def _cache(app, **settings):
+    cache = AIResponseCache()
+    cache.init_app(app)
+    for name, value in settings.items():
+        setattr(cache, name, value)
+    return cache
+
+def test_cache_key_ignores_case_whitespace_and_trailing_punctuation():
+    key = make_cache_key('Quick  vegetarian dinners!', 3, 'model', {'temperature': 0.7})
+    assert make_cache_key('quick vegetarian dinners', 3, 'model', {'temperature': 0.7}) == key
+    assert make_cache_key('quick vegetarian dinners', 4, 'model', {'temperature': 0.7}) != key
+    assert make_cache_key('quick vegetarian dinners', 3, 'model', {'temperature': 0.2}) != key
+
+def test_memory_tier_is_refilled_from_the_table(app):
+    cache = _cache(app)
+    with app.app_context():
+        assert cache.get('key') is None
+        cache.set('key', MEALS, prompt='curry', count=1)
+        assert cache.get('key') == MEALS
+
+        # A new worker (empty memory tier) reads the table, then memory again
+        cache.clear_memory()
+        assert cache.get('key') == MEALS
+        assert cache.get('key') == MEALS
+
+    stats = cache.stats()
+    assert (stats['memory_hits'], stats['persistent_hits'], stats['misses']) == (2, 1, 1)
+    assert stats['hit_ratio'] == 0.75
+
+def test_expired_entries_miss_in_both_tiers(app):
+    cache = _cache(app, ttl=timedelta(seconds=-1))
+    with app.app_context():
+        cache.set('key', MEALS)
+        assert cache.get('key') is None
+        cache.clear_memory()
+        assert cache.get('key') is None
+        assert cache.stats()['memory_size'] == 0
+
+        # Pruning drops the expired row
+        assert cache.prune() == 1
+        assert db.session.query(AIResponseCacheEntry).count() == 0
+
+def test_memory_tier_evicts_least_recently_used(app):
+    cache = _cache(app, memory_entries=2)
+    with app.app_context():
+        cache.set('a', MEALS)
+        cache.set('b', MEALS)
+        cache.get('a')
+        cache.set('c', MEALS)
+        assert cache.stats()['memory_evictions'] == 1
+
+        hits = cache.stats()['memory_hits']
+        cache.get('a')
+        cache.get('c')
+        assert cache.stats()['memory_hits'] == hits + 2
+        cache.get('b')  # evicted from memory, still in the table
+        assert cache.stats()['persistent_hits'] == 1
+
+def test_prune_trims_table_to_most_recently_used(app):
+    cache = _cache(app, persistent_entries=2)
+    with app.app_context():
+        for key in ('a', 'b', 'c'):
+            cache.set(key, MEALS)
+        assert cache.prune() == 1
+        assert db.session.query(AIResponseCacheEntry.key).count() == 2
+
+def test_disabled_cache_stores_nothing(app):
+    cache = _cache(app, enabled=False)
+    with app.app_context():
+        cache.set('key', MEALS)
+        assert cache.get('key') is None
+        assert db.session.query(AIResponseCacheEntry).count() == 0
+
+def test_repeated_prompt_is_served_from_the_cache(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(recipe_library, 'enabled', False)
+    first = client.post('/api/generate-ideas', json={'prompt': 'Hearty winter stews', 'count': 2}, headers=auth_headers)
+    assert first.status_code == 200
+
+    def fail(*args, **kwargs):
+        raise AssertionError('the model should not be called')
+    monkeypatch.setattr(ai_service._provider, 'generate', fail)
+    hits = ai_cache.stats()['memory_hits']
+
+    second = client.post('/api/generate-ideas', json={'prompt': 'hearty winter  stews.', 'count': 2}, headers=auth_headers)
+    assert second.get_json()['meals'] == first.get_json()['meals']
+    assert ai_cache.stats()['memory_hits'] == hits + 1
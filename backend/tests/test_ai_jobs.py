@@ -0,0 +1,141 @@
+"""
+Tests for the persisted AI job queue
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from ai_jobs import JobQueue, RetryJob, ai_jobs
+from models import db, AIJob
+
+def _queue(app, handler, **settings):
+    queue = JobQueue()
+    queue.init_app(app)
+    queue.register_handler(handler)
+    for name, value in settings.items():
+        setattr(queue, name, value)
+    return queue
+
+def test_submitted_job_runs_and_stores_result(app):
+    queue = _queue(app, lambda job: {'meals': [{'name': job.prompt}]})
+    
+    with app.app_context():
+        job_id = queue.submit(1, 'pasta', 2)
+        assert db.session.get(AIJob, job_id).status == 'queued'
+        assert queue.run_one() is True
+        assert queue.run_one() is False
+        
+        job = db.session.get(AIJob, job_id)
+        assert job.status == 'succeeded'
+        assert json.loads(job.result) == {'meals': [{'name': 'pasta'}]}
+        assert job.to_dict()['meals'] == [{'name': 'pasta'}]
+        assert queue.stats()['succeeded'] == 1
+
+def test_concurrent_claims_take_each_job_once(app):
+    queue = _queue(app, lambda job: {})
+    with app.app_context():
+        job_ids = {queue.submit(1, f'prompt {i}', 1) for i in range(20)}
+    
+    claimed = []
+    lock = threading.Lock()
+    
+    def claimer():
+        with app.app_context():
+            while True:
+                row = queue.claim()
+                if row is None:
+                    return
+                with lock:
+                    claimed.append(row.id)
+    
+    threads = [threading.Thread(target=claimer) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert sorted(claimed) == sorted(job_ids)
+
+def test_jobs_survive_restart_and_expired_leases_are_requeued(app):
+    first = _queue(app, lambda job: {'meals': []})
+    with app.app_context():
+        job_id = first.submit(1, 'soup', 1)
+        assert first.claim().id == job_id  # the worker then dies mid-job
+        
+        # A new process picks the job up once its lease has expired
+        second = _queue(app, lambda job: {'meals': [{'name': 'Soup'}]})
+        assert second.run_one() is False
+        db.session.execute(db.update(AIJob).values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        db.session.commit()
+        assert second.reclaim_expired() == 1
+        assert second.run_one() is True
+        
+        job = db.session.get(AIJob, job_id)
+        assert (job.status, job.attempts) == ('succeeded', 2)
+
+def test_each_claim_has_its_own_worker_id(app):
+    queue = _queue(app, lambda job: {})
+    with app.app_context():
+        queue.submit(1, 'soup', 1)
+        queue.submit(1, 'stew', 1)
+        first, second = queue.claim(), queue.claim()
+
+        assert first.worker != second.worker
+        assert first.worker.startswith(queue.worker_id + ':')
+        # Another claim of the same process cannot extend this one's lease
+        assert queue.renew_lease(first.id, second.worker) is False
+        assert queue.renew_lease(first.id, first.worker) is True
+
+def test_lease_is_renewed_while_the_job_runs(app):
+    other = _queue(app, lambda job: {})
+    checks = []
+
+    def slow(job):
+        # Outlives the lease several times over; another worker must not requeue it
+        for _ in range(5):
+            time.sleep(0.1)
+            with app.app_context():
+                checks.append(other.reclaim_expired())
+        return {'meals': []}
+
+    queue = _queue(app, slow, lease=timedelta(seconds=0.15))
+    with app.app_context():
+        job_id = queue.submit(1, 'slow soup', 1)
+        assert queue.run_one() is True
+
+        job = db.session.get(AIJob, job_id)
+        assert (job.status, job.attempts) == ('succeeded', 1)
+        assert job.lease_expires_at is None
+    assert checks == [0] * 5
+
+def test_retry_then_fail_after_max_attempts(app):
+    def unavailable(job):
+        raise RetryJob({'error': 'AI service is temporarily unavailable'}, delay=0)
+    
+    queue = _queue(app, unavailable, max_attempts=2)
+    with app.app_context():
+        job_id = queue.submit(1, 'tacos', 1)
+        assert queue.run_one() and queue.run_one()
+        assert queue.run_one() is False
+        
+        job = db.session.get(AIJob, job_id)
+        assert (job.status, job.attempts) == ('failed', 2)
+        assert job.to_dict()['error'] == 'AI service is temporarily unavailable'
+
+def test_async_request_returns_job_and_result(app, client, auth_headers):
+    response = client.post('/api/generate-ideas', json={'prompt': 'curry', 'count': 2, 'async': True}, headers=auth_headers)
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    assert response.headers['Location'] == f'/api/generate-ideas/{job_id}'
+    
+    assert client.get(f'/api/generate-ideas/{job_id}', headers=auth_headers).get_json()['status'] == 'queued'
+    with app.app_context():
+        assert ai_jobs.run_one() is True
+    
+    body = client.get(f'/api/generate-ideas/{job_id}', headers=auth_headers).get_json()
+    assert body['status'] == 'succeeded'
+    assert len(body['meals']) == 2
+    
+    events = client.get(f'/api/generate-ideas/{job_id}/events', headers=auth_headers).get_data(as_text=True)
+    assert events.startswith('event: result\n')
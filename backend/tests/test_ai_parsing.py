@@ -0,0 +1,83 @@
+"""
+Tests for tolerant parsing and salvage of AI responses
+
+The corpus in fixtures/ai_responses.json collects malformed model outputs
+(prose, fences, truncation, trailing commas...) with the meal names that
+must be recovered from each.
+"""
+import json
+import os
+
+import pytest
+
+import ai_service
+from ai_parsing import IncrementalArrayParser, extract_objects
+from ai_service import AIServiceError, parse_meals, _generate_single
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'ai_responses.json')
+
+with open(CORPUS_PATH, encoding='utf-8') as corpus_file:
+    CORPUS = json.load(corpus_file)
+
+def _meal(name):
+    return {'name': name, 'notes': 'Tasty', 'ingredients': [{'name': 'Rice', 'quantity': '200g'}]}
+
+@pytest.mark.parametrize('case', CORPUS, ids=[case['name'] for case in CORPUS])
+def test_corpus_recovery(case):
+    assert [meal['name'] for meal in parse_meals(case['text'])] == case['expected']
+
+# Responses that are a bare array, optionally fenced, as a streaming model emits them
+STREAMED = [case for case in CORPUS if case['text'].startswith(('[', '`'))]
+
+@pytest.mark.parametrize('case', STREAMED, ids=[case['name'] for case in STREAMED])
+@pytest.mark.parametrize('chunk_size', [1, 7, 64])
+def test_incremental_parser_matches_whole_text(case, chunk_size):
+    text = case['text']
+    parser = IncrementalArrayParser()
+    objects = []
+    for start in range(0, len(text), chunk_size):
+        objects.extend(parser.feed(text[start:start + chunk_size]))
+    
+    assert objects == extract_objects(text)
+
+def test_continuation_requests_only_missing_meals(monkeypatch):
+    calls = []
+    
+    def fake_call_model(prompt, count, variant=None, timeout=None, exclude=None):
+        calls.append((count, exclude))
+        if len(calls) == 1:
+            text = json.dumps([_meal('One'), _meal('Two'), _meal('Three')])
+            return text[:text.index('Three') + 10]  # truncated third meal
+        return json.dumps([_meal('Two'), _meal('Four')])
+    
+    monkeypatch.setattr(ai_service, 'call_model', fake_call_model)
+    
+    meals, partial = _generate_single('dinner', 3)
+    
+    assert [meal['name'] for meal in meals] == ['One', 'Two', 'Four']
+    assert partial is False
+    assert calls == [(3, None), (1, ['One', 'Two'])]
+
+def test_continuation_failure_keeps_salvaged_meals(monkeypatch):
+    calls = []
+    
+    def fake_call_model(prompt, count, variant=None, timeout=None, exclude=None):
+        calls.append(count)
+        if len(calls) == 1:
+            return 'Here you go: [' + json.dumps(_meal('One')) + ', {"name": "Tw'
+        raise TimeoutError('model timed out')
+    
+    monkeypatch.setattr(ai_service, 'call_model', fake_call_model)
+    
+    meals, partial = _generate_single('dinner', 2)
+    
+    assert [meal['name'] for meal in meals] == ['One']
+    assert partial is True
+
+def test_unrecoverable_response_raises(monkeypatch):
+    monkeypatch.setattr(ai_service, 'call_model', lambda *args, **kwargs: 'Sorry, no.')
+    
+    with pytest.raises(AIServiceError) as excinfo:
+        _generate_single('dinner', 2, continuations=0)
+    
+    assert excinfo.value.payload['error'] == 'Failed to parse AI response'
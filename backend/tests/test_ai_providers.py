@@ -0,0 +1,55 @@
+"""
+Tests for the AI providers
+"""
+import time
+
+import pytest
+
+from ai_providers import GeminiProvider, LocalProvider, create_provider
+from ai_service import parse_meals
+
+def test_local_provider_is_deterministic_and_well_formed():
+    provider = LocalProvider(ingredients_per_meal=3)
+    text = provider.generate('Generate exactly 4 meal ideas', 4, '', {})
+    assert provider.generate('Generate exactly 4 meal ideas', 4, '', {}) == text
+    assert provider.generate('Generate exactly 4 other ideas', 4, '', {}) != text
+
+    meals = parse_meals(text)
+    assert len(meals) == 4
+    assert all(len(meal['ingredients']) == 3 for meal in meals)
+
+def test_local_stream_yields_the_same_meals_in_chunks():
+    provider = LocalProvider()
+    chunks = list(provider.stream('dinners', 3, '', {}))
+    assert len(chunks) > 3
+    assert parse_meals(''.join(chunks)) == parse_meals(provider.generate('dinners', 3, '', {}))
+
+def test_local_latency_and_timeout():
+    provider = LocalProvider(latency_ms=20, latency_per_meal_ms=10)
+    started = time.monotonic()
+    provider.generate('dinners', 2, '', {})
+    assert time.monotonic() - started >= 0.04
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        provider.generate('dinners', 2, '', {}, timeout=0.01)
+    assert time.monotonic() - started < 0.04
+
+def test_create_provider_from_config():
+    local = create_provider({'AI_PROVIDER': 'local', 'AI_LOCAL_LATENCY_MS': 5, 'AI_LOCAL_INGREDIENTS_PER_MEAL': 2}, '')
+    assert isinstance(local, LocalProvider)
+    assert (local.latency_ms, local.ingredients_per_meal) == (5, 2)
+
+    gemini = create_provider({'AI_PROVIDER': 'gemini', 'AI_MODEL': 'model'}, 'instruction')
+    assert isinstance(gemini, GeminiProvider)
+    assert not gemini.is_configured()
+
+    with pytest.raises(ValueError):
+        create_provider({'AI_PROVIDER': 'other'}, '')
+
+def test_endpoint_uses_the_local_provider(client, auth_headers):
+    response = client.post('/api/generate-ideas', json={'prompt': 'quick lunches', 'count': 3}, headers=auth_headers)
+    assert response.status_code == 200
+    meals = response.get_json()['meals']
+    assert len(meals) == 3
+    assert {meal['name'].split()[0] for meal in meals} <= set(LocalProvider.ADJECTIVES)
@@ -0,0 +1,64 @@
+"""
+Tests for the streaming generate-ideas endpoint
+"""
+import json
+
+import ai_service
+
+URL = '/api/generate-ideas/stream'
+
+def _ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+
+def _sse(response):
+    events = []
+    for block in response.get_data(as_text=True).split('\n\n'):
+        if block.strip():
+            fields = dict(line.split(': ', 1) for line in block.splitlines())
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+def test_ndjson_stream_sends_each_meal_then_done(client, auth_headers):
+    response = client.post(URL, json={'prompt': 'quick lunches', 'count': 3}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    events = _ndjson(response)
+    assert [event['type'] for event in events] == ['meal', 'meal', 'meal', 'done']
+    assert events[-1]['data'] == {'count': 3, 'partial': False}
+    assert all(event['data']['ingredients'] for event in events[:3])
+
+def test_sse_stream_and_cached_replay(client, auth_headers, monkeypatch):
+    headers = dict(auth_headers, Accept='text/event-stream')
+    response = client.post(URL, json={'prompt': 'quick lunches', 'count': 2}, headers=headers)
+    assert response.mimetype == 'text/event-stream'
+    events = _sse(response)
+    assert [name for name, _ in events] == ['meal', 'meal', 'done']
+
+    # A complete stream is cached: the same request replays it without the model
+    def fail(*args, **kwargs):
+        raise AssertionError('the model should not be called')
+    monkeypatch.setattr(ai_service._provider, 'stream', fail)
+    assert _sse(client.post(URL, json={'prompt': 'Quick lunches', 'count': 2}, headers=headers)) == events
+
+def test_short_stream_is_completed_by_a_continuation(client, auth_headers, monkeypatch):
+    meal = {'name': 'Curry', 'notes': 'Tasty', 'ingredients': [{'name': 'Rice', 'quantity': '200g'}]}
+    monkeypatch.setattr(ai_service._provider, 'stream', lambda *args, **kwargs: iter(['[', json.dumps(meal), ']']))
+
+    events = _ndjson(client.post(URL, json={'prompt': 'curries', 'count': 2}, headers=auth_headers))
+    assert [event['type'] for event in events] == ['meal', 'meal', 'done']
+    assert events[0]['data']['name'] == 'Curry'
+    assert events[-1]['data'] == {'count': 2, 'partial': False}
+
+def test_unusable_output_ends_with_an_error_event(app, client, auth_headers, monkeypatch):
+    app.config['AI_CONTINUATION_ATTEMPTS'] = 0
+    monkeypatch.setattr(ai_service._provider, 'stream', lambda *args, **kwargs: iter(['Sorry, ', 'no.']))
+
+    events = _ndjson(client.post(URL, json={'prompt': 'curries', 'count': 2}, headers=auth_headers))
+    assert [event['type'] for event in events] == ['error']
+    assert events[0]['data']['error'] == 'No valid meals generated'
+
+def test_invalid_request_is_rejected_before_streaming(client, auth_headers):
+    response = client.post(URL, json={'count': 2}, headers=auth_headers)
+    assert response.status_code == 400
@@ -0,0 +1,100 @@
+"""
+Tests for the bulk import commands
+"""
+import json
+
+from sqlalchemy import inspect
+
+from bulk_import import deferred_indexes
+from models import db, User, Meal, GroceryItem
+
+def _write_ndjson(path, documents):
+    path.write_text('\n'.join(json.dumps(document) for document in documents) + '\n')
+    return str(path)
+
+def test_ndjson_import_links_meals_ingredients_and_groceries(app, tmp_path):
+    path = _write_ndjson(tmp_path / 'users.ndjson', [
+        {'email': 'Ana@Example.com', 'password_hash': 'pbkdf2:sha256:1$salt$hash',
+         'meals': [{'day_of_week': 'Monday', 'name': 'Curry',
+                    'ingredients': [{'name': 'Rice', 'quantity': '200g'}, {'name': 'Onion', 'quantity': '1'}]},
+                   {'day_of_week': 'Friday', 'name': 'Tacos', 'ingredients': [{'name': 'Beans', 'quantity': '1 can'}]}],
+         'groceries': [{'name': 'Milk', 'quantity': '1L', 'purchased': True}]},
+        {'email': 'ben@example.com', 'meals': [{'day_of_week': 'Sunday', 'name': 'Roast'}]},
+    ])
+
+    result = app.test_cli_runner().invoke(args=['import-data', path, '--batch-size', '3'])
+    assert result.exit_code == 0, result.output
+    assert 'Imported 2 users, 3 meals, 3 ingredients and 1 grocery items' in result.output
+
+    with app.app_context():
+        ana = User.query.filter_by(email='ana@example.com').one()
+        assert ana.password_hash == 'pbkdf2:sha256:1$salt$hash'
+        meals = {meal.name: meal for meal in Meal.query.filter_by(user_id=ana.id)}
+        assert [(i.name, i.quantity) for i in meals['Curry'].ingredients] == [('Rice', '200g'), ('Onion', '1')]
+        assert [i.name for i in meals['Tacos'].ingredients] == ['Beans']
+        assert GroceryItem.query.filter_by(user_id=ana.id).one().purchased is True
+        ben = User.query.filter_by(email='ben@example.com').one()
+        assert ben.password_hash == '!'
+        assert Meal.query.filter_by(user_id=ben.id).one().name == 'Roast'
+
+def test_rows_for_existing_users_bump_their_versions(app, tmp_path, client, auth_headers):
+    etag = client.get('/api/plan', headers=auth_headers).headers['ETag']
+    path = tmp_path / 'meals.csv'
+    path.write_text('email,day_of_week,name,notes,ingredients\n'
+                    'user@example.com,Tuesday,Soup,,Stock=500 ml;Leek=2\n')
+
+    result = app.test_cli_runner().invoke(args=['import-data', str(path), '--kind', 'meals'])
+    assert result.exit_code == 0, result.output
+
+    response = client.get('/api/plan', headers=dict(auth_headers, **{'If-None-Match': etag}))
+    assert response.status_code == 200
+    [meal] = response.get_json()['meals']
+    assert (meal['day_of_week'], meal['name']) == ('Tuesday', 'Soup')
+    assert [(i['name'], i['quantity']) for i in meal['ingredients']] == [('Stock', '500 ml'), ('Leek', '2')]
+
+def test_invalid_records_are_skipped_and_reported(app, tmp_path):
+    path = tmp_path / 'users.ndjson'
+    path.write_text('{"email": "ok@example.com"}\n'
+                    'not json\n'
+                    '{"email": "bad@example.com", "meals": [{"day_of_week": "Someday", "name": "X"}]}\n')
+
+    result = app.test_cli_runner().invoke(args=['import-data', str(path)])
+    assert result.exit_code == 1
+    assert f'{path}:2: invalid JSON' in result.output
+    assert f"{path}:3: invalid day_of_week 'Someday'" in result.output
+    with app.app_context():
+        assert db.session.scalar(db.select(db.func.count()).select_from(User)) == 2
+
+def test_deferred_indexes_are_restored(app, tmp_path):
+    path = _write_ndjson(tmp_path / 'users.ndjson', [{'email': 'a@example.com', 'meals': [{'day_of_week': 'Monday', 'name': 'X'}]}])
+    assert app.test_cli_runner().invoke(args=['import-data', path]).exit_code == 0
+
+    with app.app_context():
+        inspector = inspect(db.engine)
+        existing = {index['name'] for table in ('meals', 'ingredients', 'grocery_items')
+                    for index in inspector.get_indexes(table)}
+    assert {index.name for index in deferred_indexes()} <= existing
+
+def test_seed_data(app):
+    result = app.test_cli_runner().invoke(args=['seed-data', '--users', '3', '--meals-per-user', '2',
+                                                '--ingredients-per-meal', '3', '--groceries-per-user', '4'])
+    assert result.exit_code == 0, result.output
+    assert 'Imported 3 users, 6 meals, 18 ingredients and 12 grocery items' in result.output
+
+def test_meals_on_taken_days_are_skipped(app, tmp_path, client, auth_headers):
+    client.post('/api/meals', json={'day_of_week': 'Monday', 'name': 'Curry'}, headers=auth_headers)
+    path = _write_ndjson(tmp_path / 'users.ndjson', [
+        {'email': 'user@example.com', 'meals': [{'day_of_week': 'Monday', 'name': 'Soup'},
+                                                {'day_of_week': 'Friday', 'name': 'Tacos'}]},
+        {'email': 'user@example.com', 'meals': [{'day_of_week': 'Friday', 'name': 'Fish'}]},
+        {'email': 'new@example.com', 'meals': [{'day_of_week': 'Sunday', 'name': 'Roast'},
+                                               {'day_of_week': 'Sunday', 'name': 'Stew'}]},
+    ])
+
+    result = app.test_cli_runner().invoke(args=['import-data', path])
+    assert result.exit_code == 1
+    assert f'{path}:1: user@example.com already has a meal on Monday' in result.output
+    assert f'{path}:2: user@example.com already has a meal on Friday' in result.output
+    assert f'{path}:3: more than one meal on Sunday' in result.output
+    with app.app_context():
+        assert {meal.day_of_week: meal.name for meal in Meal.query.filter_by(user_id=1)} == {'Monday': 'Curry', 'Friday': 'Tacos'}
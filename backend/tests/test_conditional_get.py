@@ -0,0 +1,78 @@
+"""
+Tests for ETag/Last-Modified validation of plan and grocery list reads
+"""
+from datetime import datetime
+
+import pytest
+
+from models import db, User
+
+def _conditional(headers, etag):
+    return dict(headers, **{'If-None-Match': etag})
+
+@pytest.mark.parametrize('url, write', [
+    ('/api/plan', lambda client, headers, ids: client.put(
+        f"/api/meals/{ids['meals'][0]}", json={'notes': 'changed'}, headers=headers)),
+    ('/api/groceries', lambda client, headers, ids: client.put(
+        f"/api/groceries/{ids['groceries'][0]}", json={'purchased': True}, headers=headers)),
+])
+def test_unchanged_read_is_not_modified_until_a_write(client, seed_user, url, write):
+    headers, ids = seed_user(meals=2, ingredients=2, groceries=3)
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.headers['Last-Modified']
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+    response = client.get(url, headers=_conditional(headers, etag))
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'] == etag
+
+    assert write(client, headers, ids).status_code == 200
+    response = client.get(url, headers=_conditional(headers, etag))
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_each_page_and_the_stream_get_their_own_etag(client, seed_user):
+    headers, _ = seed_user(groceries=6)
+    first = client.get('/api/groceries?limit=2', headers=headers)
+    cursor = first.get_json()['next_cursor']
+    urls = ['/api/groceries', '/api/groceries?limit=2', f'/api/groceries?limit=2&cursor={cursor}',
+            '/api/groceries?stream=true']
+    etags = [client.get(url, headers=headers).headers['ETag'] for url in urls]
+    assert len(set(etags)) == len(urls)
+
+    # A page's tag does not validate another representation of the same list
+    response = client.get('/api/groceries', headers=_conditional(headers, etags[1]))
+    assert response.status_code == 200
+    # Argument order does not change the tag
+    response = client.get(f'/api/groceries?cursor={cursor}&limit=2', headers=_conditional(headers, etags[2]))
+    assert response.status_code == 304
+
+def test_other_users_writes_do_not_invalidate(client, seed_user):
+    headers, _ = seed_user(groceries=2)
+    other_headers, other_ids = seed_user(groceries=2)
+    etag = client.get('/api/groceries', headers=headers).headers['ETag']
+
+    client.delete(f"/api/groceries/{other_ids['groceries'][0]}", headers=other_headers)
+    assert client.get('/api/groceries', headers=_conditional(headers, etag)).status_code == 304
+
+def test_if_modified_since_never_hides_a_write_in_the_same_second(app, client, seed_user):
+    headers, ids = seed_user(groceries=1)
+    with app.app_context():
+        db.session.execute(db.update(User).where(User.id == ids['user'])
+                           .values(groceries_modified_at=datetime(2026, 1, 1, 12, 0, 0)))
+        db.session.commit()
+    response = client.get('/api/groceries', headers=headers)
+    since = dict(headers, **{'If-Modified-Since': response.headers['Last-Modified']})
+    assert client.get('/api/groceries', headers=since).status_code == 304
+
+    # A second write within the same second: the date alone cannot tell them apart
+    with app.app_context():
+        db.session.execute(db.update(User).where(User.id == ids['user'])
+                           .values(groceries_modified_at=datetime(2026, 1, 1, 12, 0, 0, 400000)))
+        db.session.commit()
+    response = client.get('/api/groceries', headers=since)
+    assert response.status_code == 200
+    assert response.headers['Last-Modified'] == since['If-Modified-Since']
@@ -0,0 +1,106 @@
+"""
+Tests for fan-out generation: concurrent sub-requests, partial results and
+the shared deadline
+"""
+import json
+import threading
+import time
+
+import pytest
+
+import ai_service
+from ai_service import AIServiceError, generate_fanout, _split_count
+from resilience import UpstreamUnavailable
+
+def _meals(*names):
+    return json.dumps([{'name': name, 'notes': 'Tasty', 'ingredients': [{'name': 'Rice', 'quantity': '200g'}]}
+                       for name in names])
+
+@pytest.fixture
+def fanout_app(app):
+    app.config.update(AI_FANOUT_CHUNK_SIZE=2, AI_CONTINUATION_ATTEMPTS=0, AI_CALL_TIMEOUT_SECONDS=1.0)
+    return app
+
+def _fake_model(monkeypatch, respond):
+    """Replace call_model; respond(index) returns the text for sub-request index or raises"""
+    def fake_call_model(prompt, count, variant=None, timeout=None, exclude=None):
+        return respond(variant[0])
+    monkeypatch.setattr(ai_service, 'call_model', fake_call_model)
+
+def test_split_count():
+    assert _split_count(7, 2) == [2, 2, 2, 1]
+    assert _split_count(4, 2) == [2, 2]
+    assert _split_count(1, 3) == [1]
+
+def test_results_are_merged_in_order_and_deduplicated(fanout_app, monkeypatch):
+    texts = [_meals('Curry', 'Soup'), _meals('soup', 'Stew'), _meals('Tacos', 'Salad')]
+    _fake_model(monkeypatch, lambda index: texts[index])
+    with fanout_app.app_context():
+        meals, partial = generate_fanout('dinners', 6)
+    assert [meal['name'] for meal in meals] == ['Curry', 'Soup', 'Stew', 'Tacos', 'Salad']
+    assert partial is True  # one duplicate left the request a meal short
+
+def test_failed_sub_request_gives_partial_result(fanout_app, monkeypatch):
+    def respond(index):
+        if index == 1:
+            raise RuntimeError('provider error')
+        return _meals(f'Meal {index}a', f'Meal {index}b')
+    _fake_model(monkeypatch, respond)
+    with fanout_app.app_context():
+        meals, partial = generate_fanout('dinners', 6)
+    assert [meal['name'] for meal in meals] == ['Meal 0a', 'Meal 0b', 'Meal 2a', 'Meal 2b']
+    assert partial is True
+
+def test_deadline_returns_what_arrived_in_time(fanout_app, monkeypatch):
+    fanout_app.config['AI_CALL_TIMEOUT_SECONDS'] = 0.1
+    release = threading.Event()
+
+    def respond(index):
+        if index == 0:
+            release.wait(2)
+        return _meals(f'Meal {index}')
+    _fake_model(monkeypatch, respond)
+    with fanout_app.app_context():
+        started = time.monotonic()
+        meals, partial = generate_fanout('dinners', 4)
+        elapsed = time.monotonic() - started
+    release.set()
+
+    assert elapsed < 0.5
+    assert [meal['name'] for meal in meals] == ['Meal 1']
+    assert partial is True
+
+def test_all_sub_requests_failing_raises(fanout_app, monkeypatch):
+    def unavailable(index):
+        raise UpstreamUnavailable('breaker open')
+    _fake_model(monkeypatch, unavailable)
+    with fanout_app.app_context(), pytest.raises(UpstreamUnavailable):
+        generate_fanout('dinners', 4)
+
+    _fake_model(monkeypatch, lambda index: 'Sorry, no.')
+    with fanout_app.app_context(), pytest.raises(AIServiceError):
+        generate_fanout('dinners', 4)
+
+def test_parallel_request_returns_every_meal(fanout_app, client, auth_headers):
+    response = client.post('/api/generate-ideas', json={'prompt': 'weeknight dinners', 'count': 5, 'parallel': True},
+                           headers=auth_headers)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(data['meals']) == 5
+    assert 'partial' not in data
+
+def test_partial_response_is_flagged_and_not_cached(fanout_app, client, auth_headers, monkeypatch):
+    def respond(index):
+        if index == 1:
+            raise RuntimeError('provider error')
+        return _meals(f'Meal {index}a', f'Meal {index}b')
+    _fake_model(monkeypatch, respond)
+    body = {'prompt': 'weeknight dinners', 'count': 4, 'parallel': True}
+
+    data = client.post('/api/generate-ideas', json=body, headers=auth_headers).get_json()
+    assert (len(data['meals']), data['partial'], data['requested']) == (2, True, 4)
+
+    _fake_model(monkeypatch, lambda index: _meals(f'Meal {index}a', f'Meal {index}b'))
+    data = client.post('/api/generate-ideas', json=body, headers=auth_headers).get_json()
+    assert len(data['meals']) == 4
+    assert 'partial' not in data
@@ -0,0 +1,217 @@
+"""
+Tests for the grocery list endpoints
+"""
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from models import db, GroceryItem
+
+def _cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+def _batch(client, headers, operations):
+    response = client.post('/api/groceries/batch', headers=headers, json={'operations': operations})
+    assert response.status_code == 200
+    return response.get_json()['results']
+
+def _items(client, headers):
+    return {item['id']: item for item in client.get('/api/groceries', headers=headers).get_json()['grocery_items']}
+
+def test_batch_reports_a_result_per_operation(client, seed_user):
+    headers, ids = seed_user(groceries=5)
+    first, second, third, fourth, _ = ids['groceries']
+
+    results = _batch(client, headers, [
+        {'op': 'create', 'name': 'Milk', 'quantity': '1L'},
+        {'op': 'update', 'id': first, 'name': 'Oat Milk'},
+        {'op': 'toggle', 'id': second, 'purchased': True},
+        {'op': 'toggle', 'id': third},
+        {'op': 'delete', 'id': fourth},
+        {'op': 'delete', 'id': 9999},
+        {'op': 'create', 'name': ''},
+        {'op': 'rename', 'id': first},
+        {'op': 'update', 'id': second},
+    ])
+
+    assert [result['status'] for result in results] == [201, 200, 200, 200, 200, 404, 400, 400, 400]
+    assert [result['index'] for result in results] == list(range(9))
+    assert results[0]['item']['name'] == 'Milk'
+    assert results[1]['item']['name'] == 'Oat Milk'
+    assert results[2]['item']['purchased'] is True
+    assert results[3]['item']['purchased'] is True  # 'Item 2' started unpurchased
+    assert 'item' not in results[4]
+
+    items = _items(client, headers)
+    assert fourth not in items
+    assert items[results[0]['id']]['quantity'] == '1L'
+
+def test_batch_rejects_every_operation_on_a_repeated_id(client, seed_user):
+    headers, ids = seed_user(groceries=3)
+    first, second, third = ids['groceries']
+    before = _items(client, headers)
+
+    results = _batch(client, headers, [
+        {'op': 'toggle', 'id': first},
+        {'op': 'toggle', 'id': first},
+        {'op': 'delete', 'id': second},
+        {'op': 'update', 'id': second, 'name': 'Renamed'},
+        {'op': 'update', 'id': third, 'quantity': '9'},
+    ])
+
+    assert [(result['status'], result['id']) for result in results] == [
+        (409, first), (409, first), (409, second), (409, second), (200, third)
+    ]
+    items = _items(client, headers)
+    assert items[first] == before[first]
+    assert items[second] == before[second]
+    assert items[third]['quantity'] == '9'
+
+def test_batch_result_matches_request_order_across_operation_kinds(client, seed_user):
+    headers, ids = seed_user(groceries=3)
+    first, second, third = ids['groceries']
+
+    # Applied in request order, and in the grouped create/update/toggle/delete
+    # order, these give the same final list
+    results = _batch(client, headers, [
+        {'op': 'delete', 'id': first},
+        {'op': 'toggle', 'id': second, 'purchased': False},
+        {'op': 'update', 'id': third, 'purchased': True},
+        {'op': 'create', 'name': 'Bread', 'quantity': '1'},
+    ])
+
+    assert [result['status'] for result in results] == [200, 200, 200, 201]
+    items = _items(client, headers)
+    assert set(items) == {second, third, results[3]['id']}
+    assert items[second]['purchased'] is False
+    assert items[third]['purchased'] is True
+
+def _walk_pages(client, headers, limit):
+    pages, cursor = [], None
+    while True:
+        url = f'/api/groceries?limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        data = client.get(url, headers=headers).get_json()
+        pages.append([item['id'] for item in data['grocery_items']])
+        cursor = data['next_cursor']
+        if cursor is None:
+            return pages
+
+def test_cursor_pages_cover_the_list_once_in_order(client, seed_user):
+    headers, _ = seed_user(groceries=11)
+    full = [item['id'] for item in client.get('/api/groceries', headers=headers).get_json()['grocery_items']]
+    assert len(full) == 11
+
+    pages = _walk_pages(client, headers, 4)
+    assert [len(page) for page in pages] == [4, 4, 3]
+    assert [item_id for page in pages for item_id in page] == full
+
+    # An exact multiple of the page size ends without an empty extra page
+    assert [len(page) for page in _walk_pages(client, headers, 11)] == [11]
+
+def test_cursor_survives_deleting_its_anchor_row(client, seed_user):
+    headers, _ = seed_user(groceries=6)
+    first = client.get('/api/groceries?limit=3', headers=headers).get_json()
+    anchor = first['grocery_items'][-1]['id']
+    assert client.delete(f'/api/groceries/{anchor}', headers=headers).status_code == 200
+
+    rest = client.get(f"/api/groceries?limit=3&cursor={first['next_cursor']}", headers=headers).get_json()
+    assert len(rest['grocery_items']) == 3
+    assert not {item['id'] for item in rest['grocery_items']} & {item['id'] for item in first['grocery_items']}
+
+def test_cursor_ignores_another_users_anchor_row(app, client, seed_user):
+    _, other_ids = seed_user(groceries=1)
+    headers, ids = seed_user(groceries=6)
+    with app.app_context():
+        db.session.execute(db.update(GroceryItem).values(created_at=datetime(2024, 1, 1)))
+        db.session.execute(db.update(GroceryItem).where(GroceryItem.id == other_ids['groceries'][0])
+                           .values(created_at=datetime(2030, 1, 1)))
+        db.session.commit()
+
+    # A cursor naming the other user's item falls back to its own timestamp
+    # instead of taking the position of that item
+    cursor = _cursor(['2024-01-01T00:00:00', other_ids['groceries'][0]])
+    data = client.get(f'/api/groceries?limit=10&cursor={cursor}', headers=headers).get_json()
+    assert data['grocery_items'] == []
+
+    cursor = _cursor(['2024-01-01T00:00:00', ids['groceries'][3]])
+    data = client.get(f'/api/groceries?limit=10&cursor={cursor}', headers=headers).get_json()
+    assert [item['id'] for item in data['grocery_items']] == ids['groceries'][2::-1]
+
+def test_invalid_cursor_and_limit_are_rejected(client, auth_headers):
+    assert client.get('/api/groceries?cursor=not-a-cursor', headers=auth_headers).status_code == 400
+    assert client.get('/api/groceries?limit=0', headers=auth_headers).status_code == 400
+
+def test_stream_is_one_json_document_across_chunks(app, client, seed_user):
+    headers, _ = seed_user(groceries=7)
+    app.config['GROCERY_STREAM_CHUNK_SIZE'] = 3
+    full = client.get('/api/groceries', headers=headers).get_json()
+
+    response = client.get('/api/groceries?stream=true', headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/json'
+    assert json.loads(response.get_data()) == full
+
+    empty_headers, _ = seed_user()
+    response = client.get('/api/groceries?stream=true', headers=empty_headers)
+    assert json.loads(response.get_data()) == {'grocery_items': []}
+
+def _plan_with_ingredients(client, headers):
+    response = client.put('/api/plan', headers=headers, json={'meals': [
+        {'day_of_week': 'Monday', 'name': 'Pancakes', 'ingredients': [
+            {'name': 'Flour', 'quantity': '200g'}, {'name': 'Eggs', 'quantity': '2'},
+            {'name': 'Milk', 'quantity': '300 ml'}]},
+        {'day_of_week': 'Tuesday', 'name': 'Bread', 'ingredients': [
+            {'name': 'flour', 'quantity': '1 kg'}, {'name': 'Salt', 'quantity': 'a pinch'}]},
+        {'day_of_week': 'Wednesday', 'name': 'Omelette', 'ingredients': [
+            {'name': 'Egg', 'quantity': '3'}, {'name': 'Garlic', 'quantity': '2 cloves'}]},
+    ]})
+    assert response.status_code == 200
+
+def _generate(client, headers, **options):
+    response = client.post('/api/groceries/generate', json=options, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_generate_combines_ingredients_across_meals(client, auth_headers):
+    _plan_with_ingredients(client, auth_headers)
+    data = _generate(client, auth_headers)
+    assert data['summary'] == {'created': 5, 'updated': 0, 'deleted': 0}
+    assert {item['name']: item['quantity'] for item in data['items']} == {
+        'Flour': '1.2 kg', 'Eggs': '5', 'Milk': '300 ml', 'Salt': 'a pinch', 'Garlic': '2 cloves'
+    }
+
+    # Merging again adds the day's ingredients to the items already listed
+    data = _generate(client, auth_headers, days=['Tuesday'])
+    assert data['summary'] == {'created': 0, 'updated': 2, 'deleted': 0}
+    assert {item['name']: item['quantity'] for item in data['items']} == {'Flour': '2.2 kg', 'Salt': 'a pinch'}
+
+def test_generate_merge_adds_to_existing_items(client, auth_headers):
+    _plan_with_ingredients(client, auth_headers)
+    client.post('/api/groceries', json={'name': 'Eggs', 'quantity': '12'}, headers=auth_headers)
+    client.post('/api/groceries', json={'name': 'Coffee', 'quantity': '1 bag'}, headers=auth_headers)
+    client.post('/api/groceries', json={'name': 'garlic', 'quantity': '1 head'}, headers=auth_headers)
+
+    data = _generate(client, auth_headers, mode='merge')
+    assert data['summary'] == {'created': 3, 'updated': 2, 'deleted': 0}
+    items = [(item['name'], item['quantity']) for item in _items(client, auth_headers).values()]
+    assert ('Eggs', '17') in items and ('Coffee', '1 bag') in items
+    assert ('garlic', '1 head + 2 cloves') in items
+    assert len(items) == 6
+
+def test_generate_replace_clears_unpurchased_items(client, auth_headers):
+    _plan_with_ingredients(client, auth_headers)
+    client.post('/api/groceries', json={'name': 'Coffee', 'quantity': '1 bag'}, headers=auth_headers)
+    bought = client.post('/api/groceries', json={'name': 'Tea', 'quantity': '1 box'}, headers=auth_headers)
+    client.put(f"/api/groceries/{bought.get_json()['item']['id']}", json={'purchased': True}, headers=auth_headers)
+
+    data = _generate(client, auth_headers, mode='replace', days=['Monday'])
+    assert data['summary'] == {'created': 3, 'updated': 0, 'deleted': 1}
+    names = {item['name'] for item in _items(client, auth_headers).values()}
+    assert names == {'Tea', 'Flour', 'Eggs', 'Milk'}
+
+@pytest.mark.parametrize('options', [{'mode': 'append'}, {'days': 'Monday'}, {'days': [1]},
+                                     {'days': ['Monday', 'Funday']}, {'days': ['monday']}])
+def test_generate_rejects_invalid_options(client, auth_headers, options):
+    assert client.post('/api/groceries/generate', json=options, headers=auth_headers).status_code == 400
@@ -0,0 +1,83 @@
+"""
+Tests for the user cache and the token blocklist
+"""
+from datetime import datetime
+
+from flask_jwt_extended import create_access_token, decode_token
+
+from identity import TokenBlocklist, user_cache, token_blocklist
+from models import db, User, RevokedToken
+
+def _set_email(app, email):
+    with app.app_context():
+        db.session.execute(db.update(User).where(User.id == 1).values(email=email))
+        db.session.commit()
+
+def test_profile_is_served_from_cache_until_invalidated(app, client, auth_headers):
+    first = client.get('/api/auth/profile', headers=auth_headers)
+    assert first.get_json()['user']['email'] == 'user@example.com'
+
+    _set_email(app, 'changed@example.com')
+    cached = client.get('/api/auth/profile', headers=auth_headers)
+    assert cached.get_json()['user']['email'] == 'user@example.com'
+
+    user_cache.invalidate(1)
+    fresh = client.get('/api/auth/profile', headers=auth_headers)
+    assert fresh.get_json()['user']['email'] == 'changed@example.com'
+    assert user_cache.stats()['hits'] >= 1
+
+def test_missing_user_is_not_cached(app, client):
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {create_access_token(identity="2")}'}
+    assert client.get('/api/auth/profile', headers=headers).status_code == 404
+
+    with app.app_context():
+        db.session.add(User(email='second@example.com', password_hash='x'))
+        db.session.commit()
+    assert client.get('/api/auth/profile', headers=headers).status_code == 200
+
+def test_logout_revokes_only_that_token(app, client, auth_headers):
+    with app.app_context():
+        other = {'Authorization': f'Bearer {create_access_token(identity="1")}'}
+
+    assert client.post('/api/auth/logout', headers=auth_headers).status_code == 200
+    assert client.get('/api/auth/profile', headers=auth_headers).status_code == 401
+    assert client.get('/api/plan', headers=auth_headers).status_code == 401
+    assert client.get('/api/auth/profile', headers=other).status_code == 200
+
+def test_revocations_from_other_processes_are_picked_up_on_sync(app):
+    blocklist = TokenBlocklist()
+    blocklist.init_app(app)
+    blocklist.sync_interval = 3600
+
+    with app.app_context():
+        jti = decode_token(create_access_token(identity='1'))['jti']
+        assert not blocklist.is_revoked(jti)
+
+        # Revoked by another worker: not visible until the next sync
+        db.session.add(RevokedToken(jti=jti, user_id=1, revoked_at=datetime.utcnow()))
+        db.session.commit()
+        assert not blocklist.is_revoked(jti)
+
+        blocklist.sync(force=True)
+        assert blocklist.is_revoked(jti)
+
+def test_expired_revocations_are_not_loaded(app):
+    with app.app_context():
+        db.session.add(RevokedToken(jti='expired', user_id=1, revoked_at=datetime.utcnow(),
+                                    expires_at=datetime(2000, 1, 1)))
+        db.session.commit()
+        token_blocklist.sync(force=True)
+        assert not token_blocklist.is_revoked('expired')
+
+def test_login_issues_a_string_subject(app, client):
+    client.post('/api/auth/register', json={'email': 'subject@example.com', 'password': 'password123'})
+    response = client.post('/api/auth/login', json={'email': 'subject@example.com', 'password': 'password123'})
+    token = response.get_json()['access_token']
+    user_id = response.get_json()['user']['id']
+
+    # PyJWT 2.10+ rejects tokens whose "sub" claim is not a string
+    with app.app_context():
+        assert decode_token(token)['sub'] == str(user_id)
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.get('/api/auth/profile', headers=headers).get_json()['user']['id'] == user_id
@@ -0,0 +1,80 @@
+"""
+Tests for the meal and weekly plan endpoints
+"""
+import pytest
+
+def _plan(client, headers):
+    return {meal['day_of_week']: meal for meal in client.get('/api/plan', headers=headers).get_json()['meals']}
+
+def _save(client, headers, meals, **options):
+    response = client.put('/api/plan', json=dict(options, meals=meals), headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_saving_the_plan_only_touches_changed_rows(client, seed_user):
+    headers, _ = seed_user(meals=3, ingredients=3)
+    before = _plan(client, headers)
+    monday, tuesday = before['Monday'], before['Tuesday']
+
+    data = _save(client, headers, [
+        # Unchanged
+        {'day_of_week': 'Monday', 'name': monday['name'], 'notes': monday['notes'],
+         'ingredients': [{'name': i['name'], 'quantity': i['quantity']} for i in monday['ingredients']]},
+        # One quantity changed, one ingredient dropped, one added
+        {'day_of_week': 'Tuesday', 'name': tuesday['name'], 'ingredients': [
+            {'name': 'Ingredient 0', 'quantity': '999 g'},
+            {'name': 'Ingredient 1', 'quantity': tuesday['ingredients'][1]['quantity']},
+            {'name': 'Salt', 'quantity': 'a pinch'},
+        ]},
+        # New day
+        {'day_of_week': 'Sunday', 'name': 'Roast', 'ingredients': [{'name': 'Chicken', 'quantity': '1'}]},
+    ])
+    assert data['summary'] == {'created': 1, 'updated': 1, 'unchanged': 1, 'deleted': 0}
+
+    after = _plan(client, headers)
+    assert after['Monday'] == monday
+    assert after['Wednesday'] == before['Wednesday']  # left out, kept without replace
+
+    ingredients = {i['name']: i for i in after['Tuesday']['ingredients']}
+    assert set(ingredients) == {'Ingredient 0', 'Ingredient 1', 'Salt'}
+    assert ingredients['Ingredient 0']['id'] == tuesday['ingredients'][0]['id']
+    assert ingredients['Ingredient 0']['quantity'] == '999 g'
+    assert ingredients['Ingredient 1'] == tuesday['ingredients'][1]
+    assert after['Tuesday']['version'] == tuesday['version'] + 1
+    assert after['Sunday']['ingredients'][0]['name'] == 'Chicken'
+
+def test_replace_deletes_days_left_out(client, seed_user):
+    headers, _ = seed_user(meals=3, ingredients=1)
+    data = _save(client, headers, [{'day_of_week': 'Monday', 'name': 'Meal 0'}], replace=True)
+    assert data['summary'] == {'created': 0, 'updated': 0, 'unchanged': 1, 'deleted': 2}
+    assert set(_plan(client, headers)) == {'Monday'}
+
+def test_update_meal_keeps_unchanged_ingredient_rows(client, seed_user):
+    headers, ids = seed_user(meals=1, ingredients=2)
+    meal = _plan(client, headers)['Monday']
+    response = client.put(f"/api/meals/{ids['meals'][0]}", headers=headers, json={'ingredients': [
+        {'name': 'Ingredient 1', 'quantity': meal['ingredients'][1]['quantity']},
+        {'name': 'Rice', 'quantity': '200g'},
+    ]})
+    assert response.status_code == 200
+    ingredients = response.get_json()['meal']['ingredients']
+    assert meal['ingredients'][1] in ingredients
+    assert {i['name'] for i in ingredients} == {'Ingredient 1', 'Rice'}
+
+@pytest.mark.parametrize('ingredients', ['Rice', [['Rice', '200g']], [{'name': 'Rice', 'quantity': '1'}, 'Salt']])
+def test_malformed_ingredients_are_rejected(client, seed_user, ingredients):
+    headers, ids = seed_user(meals=1, ingredients=1)
+    before = _plan(client, headers)
+
+    response = client.put(f"/api/meals/{ids['meals'][0]}", json={'name': 'Changed', 'ingredients': ingredients},
+                          headers=headers)
+    assert response.status_code == 400
+    response = client.put('/api/plan', json={'meals': [
+        {'day_of_week': 'Monday', 'name': 'Changed', 'ingredients': ingredients}
+    ]}, headers=headers)
+    assert response.status_code == 400
+    response = client.post('/api/meals', json={'day_of_week': 'Friday', 'name': 'New', 'ingredients': ingredients},
+                           headers=headers)
+    assert response.status_code == 400
+
+    assert _plan(client, headers) == before
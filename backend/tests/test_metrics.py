@@ -0,0 +1,89 @@
+"""
+Tests for the Prometheus metrics endpoint
+"""
+import re
+
+import pytest
+from flask import Flask
+
+from config import ProductionConfig
+from metrics import Metrics, metrics
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.reset()
+
+def _value(text, name, **labels):
+    """Value of the sample with exactly these labels, or None"""
+    label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = '^' + re.escape(f'{name}{{{label_text}}}' if labels else name) + r' (\S+)$'
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+def test_requests_are_counted_by_route_template_and_status(client, auth_headers):
+    client.get('/api/plan', headers=auth_headers)
+    client.get('/api/plan', headers=auth_headers)
+    client.delete('/api/meals/999', headers=auth_headers)
+    client.get('/no-such-page')
+
+    text = client.get('/metrics').get_data(as_text=True)
+    assert _value(text, 'mealmate_http_requests_total', method='GET', route='/api/plan', status=200) == 2
+    assert _value(text, 'mealmate_http_requests_total', method='DELETE', route='/api/meals/<int:meal_id>', status=404) == 1
+    assert _value(text, 'mealmate_http_requests_total', method='GET', route='<unmatched>', status=404) == 1
+    assert _value(text, 'mealmate_http_request_duration_seconds_count', method='GET', route='/api/plan') == 2
+
+def test_sql_statements_are_counted_per_request(client, auth_headers):
+    client.get('/api/plan', headers=auth_headers)
+
+    text = client.get('/metrics').get_data(as_text=True)
+    queries = _value(text, 'mealmate_http_request_db_queries_sum', route='/api/plan')
+    assert queries >= 1
+    assert _value(text, 'mealmate_http_request_db_queries_count', route='/api/plan') == 1
+    assert _value(text, 'mealmate_db_queries_total') >= queries
+
+def test_ai_calls_and_component_stats_are_exported(client, auth_headers):
+    response = client.post('/api/generate-ideas', json={'prompt': 'soups', 'count': 2}, headers=auth_headers)
+    assert response.status_code == 200
+
+    text = client.get('/metrics').get_data(as_text=True)
+    assert _value(text, 'mealmate_ai_call_duration_seconds_count', provider='local', kind='call', outcome='ok') == 1
+    assert _value(text, 'mealmate_ai_cache_misses') is not None
+    assert _value(text, 'mealmate_ai_calls_breaker_state', value='closed') == 1
+
+def test_metrics_token(app, client):
+    metrics.token = 'secret'
+    try:
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+    finally:
+        metrics.token = None
+
+def test_server_timing_header_reports_request_sql(client, auth_headers):
+    assert 'Server-Timing' not in client.get('/api/plan', headers=auth_headers).headers
+
+    metrics.server_timing = True
+    try:
+        header = client.get('/api/plan', headers=auth_headers).headers['Server-Timing']
+    finally:
+        metrics.server_timing = False
+    match = re.fullmatch(r'db;dur=([\d.]+);desc="(\d+) queries"', header)
+    assert match and int(match.group(2)) >= 1
+
+def test_required_token_is_checked_at_startup():
+    class Config:
+        METRICS_ENABLED = True
+        METRICS_REQUIRE_TOKEN = True
+        METRICS_TOKEN = None
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    with pytest.raises(ValueError, match='METRICS_TOKEN'):
+        Metrics().init_app(app)
+    assert 'metrics' not in app.view_functions
+
+    app.config['METRICS_ENABLED'] = False
+    Metrics().init_app(app)
+    assert 'metrics' not in app.view_functions
+
+def test_production_requires_a_metrics_token():
+    assert ProductionConfig.METRICS_REQUIRE_TOKEN
@@ -0,0 +1,60 @@
+"""
+Tests for the Alembic migrations in migrations/
+"""
+import os
+
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask_migrate import downgrade, upgrade
+from sqlalchemy.exc import IntegrityError
+
+from app import create_app
+from config import config, TestingConfig
+from models import db
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+INITIAL = 'fcb33fdcaf00'
+
+@pytest.fixture
+def empty_app(tmp_path):
+    class MigrationTestingConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "migrations.db"}'
+        AI_PROVIDER = 'local'
+
+    config['migration-testing'] = MigrationTestingConfig
+    app = create_app('migration-testing')
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+def _execute(statement):
+    return db.session.execute(db.text(statement))
+
+def test_head_matches_the_models(empty_app):
+    with empty_app.app_context():
+        upgrade(directory=MIGRATIONS)
+        with db.engine.connect() as conn:
+            assert compare_metadata(MigrationContext.configure(conn), db.metadata) == []
+
+def test_upgrade_keeps_the_newest_meal_per_day(empty_app):
+    with empty_app.app_context():
+        upgrade(directory=MIGRATIONS, revision=INITIAL)
+        _execute("INSERT INTO users (id, email, password_hash) VALUES (1, 'a@example.com', 'x'), (2, 'b@example.com', 'x')")
+        _execute("INSERT INTO meals (id, user_id, day_of_week, name) VALUES "
+                 "(1, 1, 'Monday', 'Old'), (2, 1, 'Monday', 'New'), (3, 1, 'Tuesday', 'Soup'), (4, 2, 'Monday', 'Other')")
+        _execute("INSERT INTO ingredients (meal_id, name, quantity) VALUES (1, 'Rice', '1'), (2, 'Pasta', '1')")
+        db.session.commit()
+
+        upgrade(directory=MIGRATIONS)
+        assert _execute('SELECT id, name, version FROM meals ORDER BY id').all() == [
+            (2, 'New', 1), (3, 'Soup', 1), (4, 'Other', 1)
+        ]
+        assert _execute('SELECT meal_id FROM ingredients').scalars().all() == [2]
+        assert _execute('SELECT plan_version, groceries_version FROM users WHERE id = 1').one() == (0, 0)
+
+        with pytest.raises(IntegrityError):
+            _execute("INSERT INTO meals (user_id, day_of_week, name) VALUES (1, 'Monday', 'Again')")
+        db.session.rollback()
+
+        downgrade(directory=MIGRATIONS, revision=INITIAL)
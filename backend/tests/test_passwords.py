@@ -0,0 +1,93 @@
+"""
+Tests for password hashing, rehash on login and the hashing pool
+"""
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from models import db, User
+from passwords import MAX_PASSWORD_BYTES, HasherBusy, PasswordHasher, hash_parameters, password_hasher
+
+def _hasher(app, **settings):
+    hasher = PasswordHasher()
+    hasher.init_app(app)
+    for name, value in settings.items():
+        setattr(hasher, name, value)
+    return hasher
+
+@pytest.mark.parametrize('algorithm, cost', [('bcrypt', 4), ('scrypt', 10), ('pbkdf2', 1000)])
+def test_hash_and_verify_each_algorithm(app, algorithm, cost):
+    hasher = _hasher(app, algorithm=algorithm, cost=cost)
+    password_hash = hasher.hash('correct horse')
+
+    assert hash_parameters(password_hash) == (algorithm, cost)
+    assert hasher.verify(password_hash, 'correct horse')
+    assert not hasher.verify(password_hash, 'wrong horse')
+    assert not hasher.needs_rehash(password_hash)
+
+def test_unrecognized_hash_never_verifies(app):
+    hasher = _hasher(app)
+    assert not hasher.verify('x', 'anything')
+    assert hasher.needs_rehash('x')
+
+def test_login_upgrades_legacy_hash(app, client):
+    with app.app_context():
+        db.session.add(User(email='legacy@example.com', password_hash=generate_password_hash('password123')))
+        db.session.commit()
+
+    response = client.post('/api/auth/login', json={'email': 'legacy@example.com', 'password': 'password123'})
+    assert response.status_code == 200
+
+    with app.app_context():
+        upgraded = User.query.filter_by(email='legacy@example.com').one().password_hash
+    assert hash_parameters(upgraded) == ('bcrypt', 4)
+    assert password_hasher.verify(upgraded, 'password123')
+    assert password_hasher.stats()['rehashed'] >= 1
+
+def test_full_queue_is_rejected_with_503(app, client, monkeypatch):
+    busy = _hasher(app, workers=1, queue_timeout=0.01)
+    busy._slots = threading.BoundedSemaphore(1)
+    busy._slots.acquire()  # the only slot is taken
+    with pytest.raises(HasherBusy):
+        busy.verify('x', 'anything')
+    assert busy.stats()['rejected'] == 1
+
+    monkeypatch.setattr(password_hasher, '_run', busy._run)
+    response = client.post('/api/auth/register', json={'email': 'new@example.com', 'password': 'password123'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+def test_process_pool_hashes_off_the_request_thread(app):
+    hasher = _hasher(app, workers=1, cost=4)
+    try:
+        password_hash = hasher.hash('password123')
+        assert hasher.verify(password_hash, 'password123')
+        assert hasher._pool is not None
+    finally:
+        hasher.shutdown()
+
+def test_slow_hash_times_out_as_busy(app):
+    hasher = _hasher(app, workers=1, cost=12, timeout=0.01)
+    try:
+        with pytest.raises(HasherBusy):
+            hasher.hash('password123')
+        assert hasher.stats()['timed_out'] == 1
+        assert hasher.stats()['pending'] == 0
+    finally:
+        hasher.shutdown()
+
+def test_passwords_longer_than_bcrypt_reads_are_rejected(app, client):
+    password = 'p' * MAX_PASSWORD_BYTES
+    response = client.post('/api/auth/register', json={'email': 'long@example.com', 'password': password + 'x'})
+    assert response.status_code == 400
+    # Multi-byte characters count by their UTF-8 length
+    response = client.post('/api/auth/register', json={'email': 'long@example.com', 'password': 'é' * 40})
+    assert response.status_code == 400
+
+    response = client.post('/api/auth/register', json={'email': 'long@example.com', 'password': password})
+    assert response.status_code == 201
+    login = {'email': 'long@example.com', 'password': password + 'anything'}
+    assert client.post('/api/auth/login', json=login).status_code == 401
+    login['password'] = password
+    assert client.post('/api/auth/login', json=login).status_code == 200
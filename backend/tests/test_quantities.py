@@ -0,0 +1,97 @@
+"""
+Tests for quantity parsing and aggregation
+"""
+import pytest
+
+from quantities import Quantity, QuantityAggregator, normalize_name, parse_quantity
+
+@pytest.mark.parametrize('text, expected', [
+    # Mass
+    ('200g', Quantity(200.0, 'g', 'mass')),
+    ('1.5 kg', Quantity(1.5, 'kg', 'mass')),
+    ('2 pounds', Quantity(2.0, 'lb', 'mass')),
+    ('8 oz', Quantity(8.0, 'oz', 'mass')),
+    # Volume
+    ('400 ml', Quantity(400.0, 'ml', 'volume')),
+    ('2 Litres', Quantity(2.0, 'l', 'volume')),
+    ('3 tbsp.', Quantity(3.0, 'tbsp', 'volume')),
+    ('1 fluid ounce', Quantity(1.0, 'fl oz', 'volume')),
+    # Counts
+    ('2', Quantity(2.0, '', 'count')),
+    ('3 pieces', Quantity(3.0, '', 'count')),
+    ('1 head', Quantity(1.0, 'head', 'count')),
+    ('4 cloves', Quantity(4.0, 'clove', 'count')),
+    ('2 cans of tomatoes', Quantity(2.0, 'can of tomatoes', 'count')),
+    ('10 boxes', Quantity(10.0, 'box', 'count')),
+    ('3 pinches', Quantity(3.0, 'pinch', 'count')),
+    ('2 x 400g cans', Quantity(2.0, 'x 400g can', 'count')),
+    # A known unit followed by the ingredient name
+    ('2 cups flour', Quantity(2.0, 'cup', 'volume')),
+    ('2 cups of flour', Quantity(2.0, 'cup', 'volume')),
+    ('100 g. sugar', Quantity(100.0, 'g', 'mass')),
+    ('1 fl oz milk', Quantity(1.0, 'fl oz', 'volume')),
+    ('3 cloves garlic', Quantity(3.0, 'clove', 'count')),
+    ('2 pieces chicken', Quantity(2.0, '', 'count')),
+    # Fractions and ranges
+    ('1/2 cup', Quantity(0.5, 'cup', 'volume')),
+    ('1 1/2 cups', Quantity(1.5, 'cup', 'volume')),
+    ('1-2 cups', Quantity(2.0, 'cup', 'volume')),
+    ('2 to 3', Quantity(3.0, '', 'count')),
+    # Unicode fractions
+    ('½ tsp', Quantity(0.5, 'tsp', 'volume')),
+    ('1½ cups', Quantity(1.5, 'cup', 'volume')),
+    ('2 ¼ kg', Quantity(2.25, 'kg', 'mass')),
+    # Decimal and thousands separators
+    ('1,5 l', Quantity(1.5, 'l', 'volume')),
+    ('0,25 kg', Quantity(0.25, 'kg', 'mass')),
+    ('1,000 g', Quantity(1000.0, 'g', 'mass')),
+    ('2,500 ml', Quantity(2500.0, 'ml', 'volume')),
+    ('1,250,000 mg', Quantity(1250000.0, 'mg', 'mass')),
+    ('1,000.5 g', Quantity(1000.5, 'g', 'mass')),
+    ('1,0000 g', Quantity(1.0, 'g', 'mass')),
+    ('1,000-2,000 g', Quantity(2000.0, 'g', 'mass')),
+])
+def test_parse_quantity(text, expected):
+    assert parse_quantity(text) == pytest.approx(expected)
+
+@pytest.mark.parametrize('text', ['', 'a pinch', 'to taste', '1/0 cup'])
+def test_unparseable_quantities(text):
+    assert parse_quantity(text) is None
+
+def test_aggregator_combines_by_dimension():
+    aggregator = QuantityAggregator()
+    for name, quantity in [('Flour', '1,000 g'), ('flour', '0.5 kg'), ('Eggs', '2'), ('egg', '3 pieces'),
+                           ('Garlic', '1 head'), ('garlic', '2 cloves'), ('Salt', 'a pinch')]:
+        aggregator.add(name, quantity)
+    assert dict(aggregator.items()) == {
+        'Flour': '1.5 kg',
+        'Eggs': '5',
+        'Garlic': '1 head + 2 cloves',
+        'Salt': 'a pinch',
+    }
+
+@pytest.mark.parametrize('name, expected', [
+    ('Boxes', 'box'),
+    ('Tomatoes', 'tomato'),
+    ('Cherries', 'cherry'),
+    ('Bay Leaves', 'bay leaf'),
+    ('Peaches', 'peach'),
+    ('Hummus', 'hummus'),
+    ('Red Onions ', 'red onion'),
+])
+def test_normalize_name(name, expected):
+    assert normalize_name(name) == expected
+
+def test_aggregator_pluralizes_counting_units():
+    aggregator = QuantityAggregator()
+    for name, quantity in [('Cereal', '10 boxes'), ('cereal', '1 box'), ('Tomatoes', '2 tomatoes'),
+                           ('Eggs', '2 large eggs'), ('eggs', '1 large egg'), ('Salt', '2 pinches salt'),
+                           ('Flour', '2 cups flour'), ('flour', '1 cup')]:
+        aggregator.add(name, quantity)
+    assert dict(aggregator.items()) == {
+        'Cereal': '11 boxes',
+        'Tomatoes': '2 tomatoes',
+        'Eggs': '3 large eggs',
+        'Salt': '2 pinches',
+        'Flour': '3 cups',
+    }
@@ -0,0 +1,79 @@
+"""
+Per-route SQL query budgets
+
+Every route runs once against a small and once against a large data set
+(more meals, ingredients and grocery items for the user, and other users'
+data in the same tables) with the same request payload. The number of
+statements must be identical for both and within the route's budget, so an
+N+1 pattern such as lazily loading each meal's ingredients fails here
+whatever the budget.
+"""
+import pytest
+
+from models import db, Recipe
+
+SMALL = {'meals': 2, 'ingredients': 2, 'groceries': 5}
+LARGE = {'meals': 6, 'ingredients': 30, 'groceries': 400}  # Sunday stays free for POST /api/meals
+
+INGREDIENTS = [{'name': 'Rice', 'quantity': '200g'}, {'name': 'Onion', 'quantity': '1'}]
+
+# (name, budget, request builder taking the seeded ids)
+ROUTES = [
+    ('get plan', 3, lambda ids: ('GET', '/api/plan', None)),
+    ('add meal', 9, lambda ids: ('POST', '/api/meals', {
+        'day_of_week': 'Sunday', 'name': 'Risotto', 'notes': '', 'ingredients': INGREDIENTS})),
+    ('update meal', 13, lambda ids: ('PUT', f"/api/meals/{ids['meals'][0]}", {
+        'name': 'Risotto', 'ingredients': INGREDIENTS})),
+    ('delete meal', 3, lambda ids: ('DELETE', f"/api/meals/{ids['meals'][0]}", None)),
+    ('save week', 16, lambda ids: ('PUT', '/api/plan', {'meals': [
+        {'day_of_week': 'Monday', 'name': 'Risotto', 'ingredients': INGREDIENTS},
+        {'day_of_week': 'Tuesday', 'name': 'Meal 1'},
+    ]})),
+    ('get groceries', 2, lambda ids: ('GET', '/api/groceries', None)),
+    ('get groceries page', 2, lambda ids: ('GET', '/api/groceries?limit=50', None)),
+    ('add grocery item', 3, lambda ids: ('POST', '/api/groceries', {'name': 'Milk', 'quantity': '1L'})),
+    ('update grocery item', 2, lambda ids: ('PUT', f"/api/groceries/{ids['groceries'][0]}", {'purchased': True})),
+    ('delete grocery item', 2, lambda ids: ('DELETE', f"/api/groceries/{ids['groceries'][1]}", None)),
+    ('grocery batch', 7, lambda ids: ('POST', '/api/groceries/batch', {'operations': [
+        {'op': 'create', 'name': 'Eggs', 'quantity': '6'},
+        {'op': 'toggle', 'id': ids['groceries'][2]},
+        {'op': 'update', 'id': ids['groceries'][3], 'quantity': '2'},
+        {'op': 'delete', 'id': ids['groceries'][4]},
+    ]})),
+    ('generate groceries', 4, lambda ids: ('POST', '/api/groceries/generate', {'mode': 'replace'})),
+    ('clear purchased', 2, lambda ids: ('DELETE', '/api/groceries/clear-purchased', None)),
+    ('profile', 1, lambda ids: ('GET', '/api/auth/profile', None)),
+]
+
+def _statements(client, count_queries, seed_user, sizes, build):
+    headers, ids = seed_user(**sizes)
+    client.get('/api/auth/profile', headers=headers)  # load the token blocklist outside the measurement
+    with client.application.app_context():
+        # Saved meals go to the recipe library; start both runs from an empty one
+        db.session.execute(db.delete(Recipe))
+        db.session.commit()
+    method, path, body = build(ids)
+    with count_queries() as statements:
+        response = client.open(path, method=method, json=body, headers=headers)
+    assert response.status_code < 400, response.get_json()
+    return statements
+
+@pytest.mark.parametrize('name, budget, build', ROUTES, ids=[route[0] for route in ROUTES])
+def test_route_query_budget(client, count_queries, seed_user, name, budget, build):
+    # Other users' rows in the same tables must not change anything either
+    for _ in range(3):
+        seed_user(**LARGE)
+
+    small = _statements(client, count_queries, seed_user, SMALL, build)
+    large = _statements(client, count_queries, seed_user, LARGE, build)
+
+    assert len(large) == len(small), f'{name}: {len(small)} statements for small data, {len(large)} for large:\n' + '\n'.join(large)
+    assert len(large) <= budget, f'{name}: {len(large)} statements, budget {budget}:\n' + '\n'.join(large)
+
+def test_lazy_ingredient_loading_exceeds_budget(app, client, count_queries, seed_user):
+    """The suite catches the N+1 pattern it exists for"""
+    app.config['READ_PATH'] = 'orm'  # loading strategies only apply to model objects
+    app.config['MEAL_INGREDIENT_LOADING'] = 'lazy'
+    small = _statements(client, count_queries, seed_user, SMALL, ROUTES[0][2])
+    large = _statements(client, count_queries, seed_user, LARGE, ROUTES[0][2])
+    assert len(large) > len(small)
@@ -0,0 +1,76 @@
+"""
+Tests for token-bucket admission control
+"""
+import threading
+
+import pytest
+
+from rate_limit import RateLimited, TokenBucketLimiter
+
+def test_bucket_allows_burst_then_reports_retry_after(app):
+    limiter = TokenBucketLimiter()
+    bucket = [('test:user', 1.0, 3)]  # one token per second, burst of three
+    
+    with app.app_context():
+        for _ in range(3):
+            limiter.acquire(bucket)
+        with pytest.raises(RateLimited) as excinfo:
+            limiter.acquire(bucket)
+    
+    assert 0.9 < excinfo.value.retry_after <= 1.0
+    assert limiter.stats() == {'allowed': 3, 'rejected': 1, 'waited': 0}
+
+def test_bounded_wait_admits_request_once_token_refills(app):
+    limiter = TokenBucketLimiter()
+    bucket = [('test:user', 20.0, 1)]  # a token every 50 ms
+    
+    with app.app_context():
+        limiter.acquire(bucket)
+        limiter.acquire(bucket, max_wait=0.2)
+    
+    assert limiter.stats()['waited'] == 1
+
+def test_empty_global_bucket_does_not_charge_user_bucket(app):
+    limiter = TokenBucketLimiter()
+    user = ('test:user', 0.001, 2)
+    
+    with app.app_context():
+        limiter.acquire([('test:global', 0.001, 1)])
+        with pytest.raises(RateLimited) as excinfo:
+            limiter.acquire([user, ('test:global', 0.001, 1)])
+        assert excinfo.value.key == 'test:global'
+        
+        # The rolled-back attempt left both user tokens in place
+        limiter.acquire([user])
+        limiter.acquire([user])
+
+def test_concurrent_requests_never_exceed_burst(app):
+    limiter = TokenBucketLimiter()
+    bucket = [('test:shared', 0.001, 5)]
+    admitted = []
+    
+    def request():
+        with app.app_context():
+            try:
+                limiter.acquire(bucket)
+                admitted.append(1)
+            except RateLimited:
+                pass
+    
+    threads = [threading.Thread(target=request) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len(admitted) == 5
+
+def test_generate_ideas_returns_429_with_retry_after(app, client, auth_headers):
+    app.config.update(AI_RATE_LIMIT_USER_BURST=1, AI_RATE_LIMIT_MAX_WAIT_SECONDS=0)
+    
+    assert client.post('/api/generate-ideas', json={'prompt': 'soup', 'count': 1}, headers=auth_headers).status_code == 200
+    response = client.post('/api/generate-ideas', json={'prompt': 'stew', 'count': 1}, headers=auth_headers)
+    
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.get_json()['details'] == 'user rate limit exceeded'
@@ -0,0 +1,44 @@
+"""
+Tests for the Core read path and the JSON provider
+"""
+from datetime import datetime
+
+import pytest
+
+from json_provider import init_json, orjson
+
+PROVIDERS = ['stdlib', 'orjson'] if orjson is not None else ['stdlib']
+
+def _read_all(client, headers):
+    plan = client.get('/api/plan', headers=headers).get_json()
+    groceries = client.get('/api/groceries', headers=headers).get_json()
+    first_page = client.get('/api/groceries?limit=4', headers=headers).get_json()
+    second_page = client.get(f"/api/groceries?limit=4&cursor={first_page['next_cursor']}", headers=headers).get_json()
+    streamed = client.get('/api/groceries?stream=true', headers=headers).get_json()
+    return plan, groceries, first_page, second_page, streamed
+
+@pytest.mark.parametrize('provider', PROVIDERS)
+def test_core_rows_serialize_like_model_objects(app, client, seed_user, provider):
+    headers, _ = seed_user(meals=3, ingredients=4, groceries=10)
+    app.config['JSON_PROVIDER'] = provider
+    init_json(app)
+
+    app.config['READ_PATH'] = 'orm'
+    expected = _read_all(client, headers)
+    app.config['READ_PATH'] = 'core'
+    assert _read_all(client, headers) == expected
+
+    plan = expected[0]
+    assert [len(meal['ingredients']) for meal in plan['meals']] == [4, 4, 4]
+    assert datetime.fromisoformat(plan['meals'][0]['created_at'])
+
+@pytest.mark.parametrize('provider', PROVIDERS)
+def test_provider_encodes_datetimes_as_iso(app, provider):
+    app.config['JSON_PROVIDER'] = provider
+    init_json(app)
+    value = {'at': datetime(2024, 1, 2, 3, 4, 5, 678), 'big': 2 ** 70}
+    with app.test_request_context():
+        assert app.json.loads(app.json.dumps(value)) == {
+            'at': '2024-01-02T03:04:05.000678', 'big': 2 ** 70
+        }
+        assert app.json.loads(app.json.response(value).get_data()) == app.json.loads(app.json.dumps(value))
@@ -0,0 +1,127 @@
+"""
+Tests for the recipe library and its TF-IDF index
+"""
+import ai_service
+from models import Recipe
+from recipe_library import RecipeIndex, RecipeLibrary, recipe_hash, recipe_terms, recipe_library
+
+MEALS = [
+    {'name': 'Chickpea Curry', 'notes': 'Quick vegetarian dinner',
+     'ingredients': [{'name': 'Chickpeas', 'quantity': '400g'}, {'name': 'Coconut Milk', 'quantity': '400 ml'}]},
+    {'name': 'Lentil Soup', 'notes': 'Warming vegetarian soup',
+     'ingredients': [{'name': 'Lentils', 'quantity': '200g'}, {'name': 'Carrot', 'quantity': '2'}]},
+]
+
+def _library(app, **settings):
+    library = RecipeLibrary()
+    library.init_app(app)
+    for name, value in settings.items():
+        setattr(library, name, value)
+    return library
+
+def test_recipe_hash_ignores_case_order_and_plurals():
+    same = {'name': 'chickpea  curry', 'ingredients': [{'name': 'coconut milk', 'quantity': '1 can'},
+                                                      {'name': 'Chickpea', 'quantity': '1 tin'}]}
+    assert recipe_hash(same) == recipe_hash(MEALS[0])
+    assert recipe_hash(MEALS[1]) != recipe_hash(MEALS[0])
+
+def test_index_ranks_by_cosine_similarity():
+    index = RecipeIndex()
+    for recipe_id, meal in enumerate(MEALS, start=1):
+        index.add(recipe_id, recipe_terms(meal['name'], meal['notes'], meal['ingredients']))
+    index.build()
+
+    results = index.search('lentil soup', k=2)
+    assert results[0][0] == 2
+    assert results[0][1] > 0.5
+    assert index.search('beef burger') == []
+
+    # Unknown words still lengthen the query, lowering the similarity
+    assert index.search('lentil soup with tempeh', k=1)[0][1] < results[0][1]
+
+def test_add_meals_stores_each_recipe_once(app):
+    library = _library(app)
+    with app.app_context():
+        assert library.add_meals(MEALS, prompt='vegetarian dinners') == 2
+        assert library.add_meals(MEALS, prompt='something else') == 0
+        assert Recipe.query.count() == 2
+    assert library.stats()['duplicates'] == 2
+
+def test_paraphrased_prompt_matches_and_weak_match_does_not(app):
+    library = _library(app)
+    with app.app_context():
+        library.add_meals(MEALS, prompt='quick vegetarian dinners for the week')
+
+        meals = library.match('Quick vegetarian dinners please', 2)
+        assert {meal['name'] for meal in meals} == {'Chickpea Curry', 'Lentil Soup'}
+
+        assert library.match('vegetarian pasta bake', 2) is None
+        assert library.match('quick vegetarian dinners', 3) is None  # not enough recipes
+
+    assert library.stats()['hits'] == 1
+    assert library.stats()['misses'] == 2
+
+def test_store_waits_for_the_refresh_interval(app):
+    library = _library(app, refresh_interval=3600)
+    # One app context per step, like separate requests
+    with app.app_context():
+        library.add_meals(MEALS[:1], prompt='quick vegetarian dinners')
+    with app.app_context():
+        assert library.match('quick vegetarian dinners', 1)
+    assert library.stats()['indexed'] == 1
+
+    # Storing does not rebuild the index; searches keep the loaded one
+    with app.app_context():
+        library.add_meals(MEALS[1:], prompt='warming lentil soup')
+    with app.app_context():
+        assert library.match('warming lentil soup', 1) is None
+    assert library.stats()['indexed'] == 1
+
+    with app.app_context():
+        assert library.refresh(force=True) == 1
+        assert library.match('warming lentil soup', 1)[0]['name'] == 'Lentil Soup'
+
+def test_similar_prompt_is_answered_without_model_call(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(recipe_library, 'refresh_interval', 0)
+    first = client.post('/api/generate-ideas', json={'prompt': 'hearty winter stews', 'count': 2}, headers=auth_headers)
+    assert first.status_code == 200
+
+    def fail(*args, **kwargs):
+        raise AssertionError('the model should not be called')
+    monkeypatch.setattr(ai_service._provider, 'generate', fail)
+
+    second = client.post('/api/generate-ideas', json={'prompt': 'Hearty stews for winter', 'count': 2}, headers=auth_headers)
+    assert second.status_code == 200
+    assert [meal['name'] for meal in second.get_json()['meals']] == [meal['name'] for meal in first.get_json()['meals']]
+
+def test_saved_meals_are_only_matched_for_their_owner(app, seed_user):
+    library = _library(app)
+    other = seed_user()[1]['user']
+    with app.app_context():
+        assert library.add_meals(MEALS[:1], source='user', user_id=1) == 1
+        # The same meal saved by someone else is a separate, private recipe
+        assert library.add_meals(MEALS[:1], source='user', user_id=other) == 1
+    with app.app_context():
+        assert library.match('chickpea curry', 1, user_id=1)[0]['name'] == 'Chickpea Curry'
+        assert library.match('chickpea curry', 1, user_id=seed_user()[1]['user']) is None
+        assert library.match('chickpea curry', 1) is None
+
+def test_saved_meal_is_never_served_to_another_user(client, auth_headers, seed_user, monkeypatch):
+    monkeypatch.setattr(recipe_library, 'refresh_interval', 0)
+    meal = {'day_of_week': 'Monday', 'name': 'Grandma Rosa Secret Lasagne', 'notes': 'Private family recipe',
+            'ingredients': [{'name': 'Lasagne Sheets', 'quantity': '250g'}, {'name': 'Ricotta', 'quantity': '500g'}]}
+    assert client.post('/api/meals', json=meal, headers=auth_headers).status_code == 201
+
+    def fail(*args, **kwargs):
+        raise AssertionError('the model should not be called')
+    monkeypatch.setattr(ai_service._provider, 'generate', fail)
+    request = {'prompt': 'Grandma Rosa secret lasagne', 'count': 1}
+    owner = client.post('/api/generate-ideas', json=request, headers=auth_headers)
+    assert owner.get_json()['meals'][0]['name'] == meal['name']
+
+    monkeypatch.undo()
+    other_headers, _ = seed_user()
+    other = client.post('/api/generate-ideas', json=request, headers=other_headers)
+    assert other.status_code == 200
+    assert meal['name'] not in [m['name'] for m in other.get_json()['meals']]
+    assert meal['notes'] not in [m['notes'] for m in other.get_json()['meals']]
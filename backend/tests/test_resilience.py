@@ -0,0 +1,162 @@
+"""
+Tests for the circuit breaker, deadlines and hedging of provider calls
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import ai_service
+from ai_cache import ai_cache
+from models import db, AIResponseCacheEntry
+from recipe_library import recipe_library
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, ResilientCaller
+
+def _caller(**settings):
+    caller = ResilientCaller()
+    caller.breaker.configure(settings.pop('failure_threshold', 3), settings.pop('reset_timeout', 0.2))
+    caller.timeout = settings.pop('timeout', 1.0)
+    for name, value in settings.items():
+        setattr(caller, name, value)
+    return caller
+
+def _fail():
+    raise RuntimeError('provider error')
+
+def test_breaker_opens_after_consecutive_failures_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.before_call()
+    assert 0 < excinfo.value.retry_after <= 0.1
+    
+    time.sleep(0.12)
+    assert breaker.state == 'half_open'
+    breaker.before_call()                 # the single trial call
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()             # others are still rejected
+    breaker.record_success()
+    assert breaker.state == 'closed'
+
+def test_failed_trial_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+def test_call_fails_fast_once_breaker_is_open():
+    caller = _caller(failure_threshold=2)
+    calls = []
+    
+    def failing():
+        calls.append(1)
+        _fail()
+    
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            caller.call(failing)
+    with pytest.raises(CircuitOpenError):
+        caller.call(failing)
+    
+    assert len(calls) == 2
+
+def test_call_deadline_does_not_wait_for_slow_provider():
+    caller = _caller(timeout=0.05)
+    release = threading.Event()
+    
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        caller.call(lambda: release.wait(2))
+    elapsed = time.monotonic() - started
+    release.set()
+    
+    assert elapsed < 0.5
+    assert caller.stats()['timeouts'] == 1
+    assert caller.breaker.stats()['consecutive_failures'] == 1
+
+def test_hedged_request_wins_over_slow_first_attempt():
+    caller = _caller(hedge_enabled=True, hedge_delay=0.02)
+    attempts = []
+    lock = threading.Lock()
+    
+    def call():
+        with lock:
+            attempts.append(1)
+            attempt = len(attempts)
+        time.sleep(0.5 if attempt == 1 else 0.01)
+        return attempt
+    
+    assert caller.call(call) == 2
+    stats = caller.stats()
+    assert stats['hedged'] == 1 and stats['hedge_wins'] == 1
+
+def test_stream_deadline_and_breaker():
+    caller = _caller(timeout=0.05, failure_threshold=1)
+    
+    def stalled_stream():
+        yield 'first'
+        time.sleep(0.5)
+        yield 'never'
+    
+    received = []
+    with pytest.raises(DeadlineExceeded):
+        for chunk in caller.stream(stalled_stream):
+            received.append(chunk)
+    
+    assert received == ['first']
+    with pytest.raises(CircuitOpenError):
+        list(caller.stream(stalled_stream))
+
+def _unavailable(monkeypatch):
+    def call_model(*args, **kwargs):
+        raise CircuitOpenError(5.0)
+    monkeypatch.setattr(ai_service, 'call_model', call_model)
+
+def _generate(client, headers, prompt):
+    return client.post('/api/generate-ideas', json={'prompt': prompt, 'count': 2}, headers=headers)
+
+def test_fallback_serves_only_the_same_requests_meals(app, client, auth_headers, monkeypatch):
+    monkeypatch.setattr(recipe_library, 'enabled', False)
+    cached = _generate(client, auth_headers, 'hearty winter stews').get_json()['meals']
+    with app.app_context():
+        db.session.execute(db.update(AIResponseCacheEntry).values(expires_at=datetime.utcnow() - timedelta(days=1)))
+        db.session.commit()
+    ai_cache.clear_memory()
+    _unavailable(monkeypatch)
+
+    # Expired, but generated for this request
+    response = _generate(client, auth_headers, 'Hearty winter stews')
+    assert response.status_code == 200
+    assert response.get_json() == {'meals': cached, 'fallback': True}
+
+    # Another prompt's meals are never served
+    response = _generate(client, auth_headers, 'light summer salads')
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+
+def test_fallback_uses_library_matches_at_relaxed_threshold(app, client, auth_headers, monkeypatch):
+    meals = [{'name': name, 'notes': 'Warming', 'ingredients': [{'name': 'Beans', 'quantity': '400g'}]}
+             for name in ('Bean Stew', 'Beef Stew')]
+    with app.app_context():
+        recipe_library.add_meals(meals, prompt='hearty winter stews')
+    monkeypatch.setattr(recipe_library, 'refresh_interval', 0)
+    monkeypatch.setattr(recipe_library, 'threshold', 1.01)  # never answers before the model call
+    _unavailable(monkeypatch)
+
+    response = _generate(client, auth_headers, 'winter stews')
+    assert response.status_code == 200
+    assert response.get_json()['fallback'] is True
+    assert {meal['name'] for meal in response.get_json()['meals']} == {'Bean Stew', 'Beef Stew'}
+
+    app.config['AI_FALLBACK_LIBRARY_THRESHOLD'] = 1.01
+    assert _generate(client, auth_headers, 'winter stews').status_code == 503
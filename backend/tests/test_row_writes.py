@@ -0,0 +1,76 @@
+"""
+Tests for single-statement meal and grocery item writes: one meal per day,
+ownership checks and If-Match row versions
+"""
+from models import db, Meal, Ingredient
+
+def test_second_meal_for_a_day_conflicts(client, seed_user):
+    headers, ids = seed_user(meals=1)
+    response = client.post('/api/meals', json={'day_of_week': 'Monday', 'name': 'Curry'}, headers=headers)
+    assert response.status_code == 409
+
+    response = client.post('/api/meals', json={'day_of_week': 'Tuesday', 'name': 'Curry',
+                                               'ingredients': [{'name': 'Rice', 'quantity': '200g'}]}, headers=headers)
+    assert response.status_code == 201
+    meal = response.get_json()['meal']
+    assert meal['version'] == 1
+    assert [i['name'] for i in meal['ingredients']] == ['Rice']
+
+    # Moving a meal onto a taken day conflicts as well
+    response = client.put(f"/api/meals/{ids['meals'][0]}", json={'day_of_week': 'Tuesday'}, headers=headers)
+    assert response.status_code == 409
+
+def test_meal_updates_check_if_match(client, seed_user):
+    headers, ids = seed_user(meals=1, ingredients=2)
+    meal_id = ids['meals'][0]
+
+    response = client.put(f'/api/meals/{meal_id}', json={'name': 'Risotto'}, headers=dict(headers, **{'If-Match': '"1"'}))
+    assert response.status_code == 200
+    assert response.get_json()['meal']['version'] == 2
+
+    # A client still holding version 1 cannot overwrite the change
+    response = client.put(f'/api/meals/{meal_id}', json={'name': 'Paella'}, headers=dict(headers, **{'If-Match': '"1"'}))
+    assert response.status_code == 412
+    assert response.get_json()['version'] == 2
+
+    response = client.delete(f'/api/meals/{meal_id}', headers=dict(headers, **{'If-Match': '"1"'}))
+    assert response.status_code == 412
+
+    response = client.delete(f'/api/meals/{meal_id}', headers=dict(headers, **{'If-Match': '"2"'}))
+    assert response.status_code == 200
+    with client.application.app_context():
+        assert db.session.get(Meal, meal_id) is None
+        assert not Ingredient.query.filter_by(meal_id=meal_id).count()
+
+def test_writes_to_other_users_rows_are_not_found(client, seed_user):
+    _, owner = seed_user(meals=1, groceries=1)
+    headers, _ = seed_user()
+
+    for method, path in (('PUT', f"/api/meals/{owner['meals'][0]}"), ('DELETE', f"/api/meals/{owner['meals'][0]}"),
+                         ('PUT', f"/api/groceries/{owner['groceries'][0]}"),
+                         ('DELETE', f"/api/groceries/{owner['groceries'][0]}")):
+        # Also with If-Match: another user's row must not be reported as stale
+        response = client.open(path, method=method, json={'name': 'Mine'}, headers=dict(headers, **{'If-Match': '"1"'}))
+        assert response.status_code == 404, (method, path)
+
+def test_grocery_item_versions(client, seed_user):
+    headers, ids = seed_user(groceries=3)
+    item_id = ids['groceries'][1]
+
+    response = client.put(f'/api/groceries/{item_id}', json={'purchased': True}, headers=headers)
+    assert response.status_code == 200
+    item = response.get_json()['item']
+    assert (item['purchased'], item['version']) == (True, 2)
+
+    response = client.post('/api/groceries/batch', headers=headers, json={'operations': [
+        {'op': 'update', 'id': item_id, 'quantity': '5'},
+        {'op': 'toggle', 'id': ids['groceries'][2]},
+    ]})
+    results = response.get_json()['results']
+    assert (results[0]['item']['name'], results[0]['item']['quantity'], results[0]['item']['version']) == ('Item 1', '5', 3)
+    assert results[1]['item']['version'] == 2
+
+    response = client.delete(f'/api/groceries/{item_id}', headers=dict(headers, **{'If-Match': '"2"'}))
+    assert response.status_code == 412
+    response = client.delete(f'/api/groceries/{item_id}', headers=dict(headers, **{'If-Match': '"3"'}))
+    assert response.status_code == 200
@@ -0,0 +1,176 @@
+"""
+Tests for single-flight coalescing of identical concurrent calls
+"""
+import threading
+import time
+
+import pytest
+
+import ai_service
+from resilience import DeadlineExceeded
+from singleflight import SingleFlight, ai_singleflight, fcntl
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'condition not reached'
+        time.sleep(0.005)
+
+def _run_concurrently(flight, key, func, callers):
+    results, errors = [], []
+    lock = threading.Lock()
+
+    def caller():
+        try:
+            outcome = flight.do(key, func)
+            with lock:
+                results.append(outcome)
+        except Exception as e:
+            with lock:
+                errors.append(e)
+
+    threads = [threading.Thread(target=caller) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    executions = []
+
+    def slow():
+        executions.append(1)
+        release.wait(2)
+        return ['meal']
+
+    threads, results, errors = _run_concurrently(flight, 'key', slow, 5)
+    _wait_for(lambda: flight.stats()['coalesced'] == 4)
+    assert flight.stats()['in_flight'] == 1
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(executions) == 1
+    assert not errors
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(result == ['meal'] for result, _ in results)
+    stats = flight.stats()
+    assert (stats['calls'], stats['leaders'], stats['in_flight']) == (5, 1, 0)
+
+    # Once finished, the next call runs again
+    assert flight.do('key', lambda: ['fresh']) == (['fresh'], False)
+
+def test_leader_error_reaches_every_waiter():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(2)
+        raise RuntimeError('provider error')
+
+    threads, results, errors = _run_concurrently(flight, 'key', failing, 3)
+    _wait_for(lambda: flight.stats()['coalesced'] == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert not results
+    assert [str(e) for e in errors] == ['provider error'] * 3
+
+def test_different_keys_do_not_wait_for_each_other():
+    flight = SingleFlight()
+    release = threading.Event()
+    threads, _, _ = _run_concurrently(flight, 'slow', lambda: release.wait(2), 1)
+    _wait_for(lambda: flight.stats()['in_flight'] == 1)
+
+    assert flight.do('other', lambda: 'done') == ('done', False)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+def test_waiter_gives_up_after_wait_timeout():
+    flight = SingleFlight()
+    flight.wait_timeout = 0.05
+    release = threading.Event()
+    threads, _, _ = _run_concurrently(flight, 'key', lambda: release.wait(2), 1)
+    _wait_for(lambda: flight.stats()['in_flight'] == 1)
+
+    with pytest.raises(DeadlineExceeded):
+        flight.do('key', lambda: 'never')
+    assert flight.stats()['wait_timeouts'] == 1
+    release.set()
+    for thread in threads:
+        thread.join()
+
+@pytest.mark.skipif(fcntl is None, reason='file mode needs fcntl')
+def test_file_mode_queues_leaders_of_separate_workers(tmp_path):
+    # Two instances stand in for two worker processes on one host
+    workers = []
+    for _ in range(2):
+        flight = SingleFlight()
+        flight.mode = 'file'
+        flight.lock_dir = str(tmp_path)
+        workers.append(flight)
+
+    release = threading.Event()
+    order = []
+    first = threading.Thread(target=workers[0].do, args=('key', lambda: (order.append('first'), release.wait(2))))
+    first.start()
+    _wait_for(lambda: order == ['first'])
+
+    second = threading.Thread(target=workers[1].do, args=('key', lambda: order.append('second')))
+    second.start()
+    _wait_for(lambda: workers[1].stats()['lock_waits'] == 1)
+    assert order == ['first']
+
+    release.set()
+    first.join()
+    second.join()
+    assert order == ['first', 'second']
+
+@pytest.mark.skipif(fcntl is None, reason='file mode needs fcntl')
+def test_file_mode_gives_up_on_a_held_lock_after_wait_timeout(tmp_path):
+    workers = []
+    for _ in range(2):
+        flight = SingleFlight()
+        flight.mode = 'file'
+        flight.lock_dir = str(tmp_path)
+        flight.wait_timeout = 0.1
+        workers.append(flight)
+
+    holding, release = threading.Event(), threading.Event()
+    holder = threading.Thread(target=workers[0].do, args=('key', lambda: (holding.set(), release.wait(2))))
+    holder.start()
+    holding.wait(2)
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        workers[1].do('key', lambda: 'never')
+    assert time.monotonic() - started < 1.0
+    assert workers[1].stats()['wait_timeouts'] == 1
+    release.set()
+    holder.join()
+
+def test_waiter_timeout_is_answered_as_unavailable(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(ai_singleflight, 'wait_timeout', 0.05)
+    monkeypatch.setitem(client.application.config, 'AI_FALLBACK_ENABLED', False)
+    started, release = threading.Event(), threading.Event()
+    generate = ai_service._provider.generate
+
+    def slow_generate(*args, **kwargs):
+        started.set()
+        release.wait(2)
+        return generate(*args, **kwargs)
+    monkeypatch.setattr(ai_service._provider, 'generate', slow_generate)
+
+    request = {'prompt': 'slow soups', 'count': 2}
+    leader = threading.Thread(target=client.post, args=('/api/generate-ideas',),
+                              kwargs={'json': request, 'headers': auth_headers})
+    leader.start()
+    started.wait(2)
+
+    response = client.post('/api/generate-ideas', json=request, headers=auth_headers)
+    assert response.status_code == 503
+    release.set()
+    leader.join()
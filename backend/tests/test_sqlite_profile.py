@@ -0,0 +1,66 @@
+"""
+Tests for the production SQLite profile
+"""
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from app import create_app
+from config import config, TestingConfig
+from models import db, User, GroceryItem
+
+@pytest.fixture
+def production_app(tmp_path):
+    class ProfileTestingConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "profile.db"}'
+        SQLITE_PROFILE = 'production'
+        AI_PROVIDER = 'local'
+
+    config['sqlite-profile-testing'] = ProfileTestingConfig
+    app = create_app('sqlite-profile-testing')
+    with app.app_context():
+        db.create_all()
+        user = User(email='user@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(GroceryItem(user_id=user.id, name='Milk', quantity='1L'))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+def _pragma(app, name):
+    with app.app_context():
+        return db.session.execute(db.text(f'PRAGMA {name}')).scalar()
+
+def test_pragmas_are_applied_to_every_connection(production_app):
+    assert _pragma(production_app, 'journal_mode') == 'wal'
+    assert _pragma(production_app, 'synchronous') == 1  # NORMAL
+    assert _pragma(production_app, 'foreign_keys') == 1
+    assert _pragma(production_app, 'busy_timeout') == 5000
+
+def test_default_profile_keeps_sqlite_settings(app):
+    if app.config['SQLITE_PROFILE'] != 'default':
+        pytest.skip('suite running under SQLITE_PROFILE=' + app.config['SQLITE_PROFILE'])
+    assert _pragma(app, 'journal_mode') == 'delete'
+    assert _pragma(app, 'foreign_keys') == 0
+
+def test_write_views_begin_immediate(production_app):
+    statements = []
+    with production_app.app_context():
+        engine = db.engine
+        engine.dispose()
+        event.listen(engine, 'connect', lambda dbapi_connection, record: dbapi_connection.set_trace_callback(statements.append))
+        headers = {'Authorization': f'Bearer {create_access_token(identity="1")}'}
+    client = production_app.test_client()
+
+    assert client.get('/api/groceries', headers=headers).status_code == 200
+    begins = [statement for statement in statements if statement.startswith('BEGIN')]
+    assert begins and 'BEGIN IMMEDIATE' not in begins
+
+    statements.clear()
+    assert client.put('/api/groceries/1', json={'purchased': True}, headers=headers).status_code == 200
+    begins = [statement for statement in statements if statement.startswith('BEGIN')]
+    # The update runs under BEGIN IMMEDIATE; reloading the item for the response does not
+    assert begins[0] == 'BEGIN IMMEDIATE'
+    assert all(begin == 'BEGIN' for begin in begins[1:])
@@ -0,0 +1,125 @@
+import hashlib
+from datetime import datetime, timezone
+from flask import request, make_response, jsonify
+from models import db, User
+
+# Per-user change markers: scope -> (version column, last-modified column)
+SCOPES = {
+    'plan': (User.plan_version, User.plan_modified_at),
+    'groceries': (User.groceries_version, User.groceries_modified_at),
+}
+
+def bump_version(user_id, scope):
+    """
+    Mark the user's plan or grocery list as changed
+    
+    Runs as part of the caller's transaction, so the new version becomes
+    visible together with the write that caused it.
+    """
+    version_col, modified_col = SCOPES[scope]
+    db.session.execute(
+        db.update(User)
+        .where(User.id == user_id)
+        .values({version_col: version_col + 1, modified_col: datetime.utcnow()})
+    )
+
+def get_version(user_id, scope):
+    """Return (version, last_modified) for the scope with a single primary key lookup"""
+    version_col, modified_col = SCOPES[scope]
+    row = db.session.execute(
+        db.select(version_col, modified_col).where(User.id == user_id)
+    ).first()
+    if row is None:
+        return 0, None
+    return row[0], row[1]
+
+def query_digest(args):
+    """
+    Short digest of normalized query arguments, or '' when there are none
+    
+    Keys and their values are sorted, so argument order does not matter; a
+    full list, each page and the stream still get different digests.
+    """
+    items = sorted((key, sorted(args.getlist(key))) for key in args)
+    if not items:
+        return ''
+    return hashlib.sha256(repr(items).encode()).hexdigest()[:16]
+
+def make_etag(user_id, scope, version, variant=''):
+    """Build the (unquoted) strong entity tag for a user's scope version and representation"""
+    etag = f'{scope}-{user_id}-{version}'
+    return f'{etag}-{variant}' if variant else etag
+
+def is_not_modified(etag, last_modified):
+    """
+    Evaluate the request's conditional headers against the current markers
+    
+    If-None-Match takes precedence; If-Modified-Since is only consulted when
+    the client sent no entity tags. HTTP dates have whole seconds, so the
+    stored timestamp is compared at full precision: a change later in the
+    second the client's Last-Modified names is never answered with 304.
+    The ETag is the only validator that is exact for every write.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    
+    if request.if_modified_since and last_modified:
+        return last_modified.replace(tzinfo=timezone.utc) <= request.if_modified_since
+    
+    return False
+
+def set_cache_headers(response, etag, last_modified):
+    """Attach ETag and Last-Modified headers to a response"""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # Clients must revalidate every time, but may reuse the body on a 304
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def if_match_versions():
+    """
+    Row versions the request's If-Match header accepts, or None for any
+    
+    Writes to a single meal or grocery item add the versions to their
+    UPDATE/DELETE ... WHERE clause, so a client that sends the version it
+    last read cannot overwrite a newer change. Tags that are not version
+    numbers match no row.
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    return {int(tag) for tag in request.if_match.as_set() if tag.isdigit()}
+
+def missing_or_stale(model, row_id, user_id, versions, not_found_error):
+    """
+    Response for a single-row write that matched no row
+    
+    412 if the row is the user's but its version failed If-Match, 404
+    otherwise. Only this failure path pays for the extra lookup.
+    """
+    if versions is not None:
+        current = db.session.scalar(
+            db.select(model.version).where(model.id == row_id, model.user_id == user_id)
+        )
+        if current is not None:
+            return jsonify({'error': 'Changed by another request', 'version': current}), 412
+    return jsonify({'error': not_found_error}), 404
+
+def conditional_get(user_id, scope, build_response):
+    """
+    Serve a read endpoint with ETag/Last-Modified validation
+    
+    build_response is only called when the client's copy is stale, so a
+    matching If-None-Match costs one indexed lookup and no row loading.
+    The tag includes a digest of the query arguments: each page or format
+    of the same data is a different representation.
+    """
+    version, last_modified = get_version(user_id, scope)
+    etag = make_etag(user_id, scope, version, query_digest(request.args))
+    
+    if is_not_modified(etag, last_modified):
+        response = make_response('', 304)
+    else:
+        response = make_response(build_response())
+    
+    return set_cache_headers(response, etag, last_modified)